@@ -2,23 +2,39 @@
 import sys
 import os
 import uuid
-from flask import Flask, request, jsonify, render_template, send_file, session, redirect, url_for
-import io
+import hashlib
+from flask import Flask, Response, request, jsonify, render_template, session, redirect, url_for, stream_with_context, g
 import json
+import time
+import logging
 from datetime import datetime
 import numpy as np
-from tensorflow import keras
+
+# ---------------- Logging ----------------
+# LOG_LEVEL=DEBUG muestra también los mensajes del camino caliente (uno por predicción)
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+logger = logging.getLogger(__name__)
 
 # ---------------- Configurar rutas absolutas ----------------
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))  # carpeta notebooks
 if BASE_DIR not in sys.path:
     sys.path.append(BASE_DIR)
-print(f"📂 BASE_DIR añadido a sys.path: {BASE_DIR}")
+logger.info("📂 BASE_DIR añadido a sys.path: %s", BASE_DIR)
 
 # ---------------- Importar utilidades ----------------
-from utils.preprocessing import preprocess_image
-from utils.qr_utils import generate_qr_from_url
-from utils.export_utils import export_predictions_to_csv
+from utils.preprocessing import preprocess_batch, model_views, decode_image, decode_pixel_buffer
+from utils.qr_utils import QRCache, QR_FORMATS
+from utils.export_utils import iter_predictions_csv, gzip_chunks
+from utils.prediction_store import PredictionStore, page_limit
+from utils.inference_scheduler import MicroBatchScheduler
+from utils.inference_engine import DEFAULT_BACKEND
+from utils.model_registry import ModelRegistry, file_version
+from utils.prediction_cache import PredictionCache, tensor_digest
+from utils.realtime_channel import RealtimeHub
+from utils.persistence_queue import WriteBehindQueue, LocalStoreSink
+from utils.instrumentation import instrumentation
+from utils.user_store import UserStore, SqliteSessionInterface, DEFAULT_HASH_METHOD, regenerate_session
 
 # ---------------- Inicializar Flask ----------------
 app = Flask(__name__)
@@ -26,51 +42,181 @@ app.secret_key = "super_secret_key"
 app.config['UPLOAD_FOLDER'] = os.path.join(BASE_DIR, 'app', 'uploads')
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
-# ---------------- Cargar modelos ----------------
+# ---------------- Registro de modelos (carga perezosa) ----------------
+# Los modelos se cargan solo para inferencia (sin compilar) la primera vez que se usan,
+# o en segundo plano con MODEL_WARMUP=1. TensorFlow no se importa hasta entonces.
+# MLP_BACKEND=numpy sirve el MLP con utils/mlp_numpy.py (pesos importados del .keras, sin TensorFlow).
+# INFERENCE_BACKEND: predict | direct | function (ver utils/inference_engine.py); se aplica a la CNN
+# y al MLP cuando MLP_BACKEND no es 'numpy'.
+app.config['MLP_BACKEND'] = os.environ.get('MLP_BACKEND', 'numpy')
+app.config['INFERENCE_BACKEND'] = os.environ.get('INFERENCE_BACKEND', DEFAULT_BACKEND)
 MODEL_PATH = os.path.join(BASE_DIR, 'models', 'mnist_compiled_model.keras')
-if os.path.exists(MODEL_PATH):
-    mlp_model = keras.models.load_model(MODEL_PATH, compile=False, safe_mode=False)
-    mlp_model.compile(optimizer="adam", loss="categorical_crossentropy", metrics=["accuracy"])
-    print("✅ Modelo MLP cargado correctamente")
-else:
-    mlp_model = None
-    print("⚠️ Warning: modelo MLP no encontrado.")
-
 CNN_MODEL_PATH = os.path.join(BASE_DIR, 'models', 'cnn_model.keras')
-if os.path.exists(CNN_MODEL_PATH):
-    cnn_model = keras.models.load_model(CNN_MODEL_PATH)
-    print("✅ Modelo CNN cargado correctamente")
-else:
-    cnn_model = None
-    print("⚠️ Warning: modelo CNN no encontrado.")
-
-# ---------------- Métricas CNN ----------------
+# Versiones reentrenadas (ver FineTuner): si existen se sirven en lugar de los ficheros originales,
+# que no se modifican; borrarlas vuelve al modelo original
+FINETUNED_DIR = os.path.join(BASE_DIR, 'models', 'finetuned')
+
+def finetuned_path(path):
+    return os.path.join(FINETUNED_DIR, os.path.basename(path))
+
+model_registry = ModelRegistry()
+model_registry.register('MLP', MODEL_PATH,
+                        'numpy' if app.config['MLP_BACKEND'] == 'numpy' else app.config['INFERENCE_BACKEND'],
+                        input_shape=(784,), override_path=finetuned_path(MODEL_PATH))
+model_registry.register('CNN', CNN_MODEL_PATH, app.config['INFERENCE_BACKEND'], input_shape=(28, 28, 1),
+                        override_path=finetuned_path(CNN_MODEL_PATH))
+for name in model_registry.names():
+    if not model_registry.available(name):
+        logger.warning("⚠️ Modelo %s no encontrado.", name)
+if os.environ.get('MODEL_WARMUP', '0') == '1':
+    model_registry.warm_up(background=True)
+
+# Recarga en caliente: al cambiar un .keras en models/ la nueva versión se carga y calienta
+# en segundo plano y se sustituye al terminar (MODEL_WATCH_INTERVAL=0: solo se comprueba al predecir).
+# POST /models/<nombre>/reload fuerza la recarga; con ADMIN_TOKEN se exige en la cabecera X-Admin-Token.
+app.config['MODEL_WATCH_INTERVAL'] = float(os.environ.get('MODEL_WATCH_INTERVAL', 2))
+app.config['ADMIN_TOKEN'] = os.environ.get('ADMIN_TOKEN')
+if app.config['MODEL_WATCH_INTERVAL'] > 0:
+    model_registry.watch(app.config['MODEL_WATCH_INTERVAL'])
+
+# ---------------- Planificador de inferencia (micro-batching) ----------------
+# Las peticiones concurrentes (y todas las imágenes de un /predict_batch) se agrupan en un batch por modelo
+app.config['INFERENCE_MAX_BATCH'] = int(os.environ.get('INFERENCE_MAX_BATCH', 32))
+app.config['INFERENCE_MAX_WAIT_MS'] = float(os.environ.get('INFERENCE_MAX_WAIT_MS', 5))
+def run_model(name, x):
+    # Todo el batch se ejecuta con el mismo motor; su versión viaja con las salidas
+    engine = model_registry.get(name)
+    if engine is None:
+        raise RuntimeError(f"Modelo {name} no disponible")
+    with instrumentation.span('inference', model=name):
+        return engine(x), engine.version
+
+schedulers = {
+    name: MicroBatchScheduler(lambda x, name=name: run_model(name, x),
+                              app.config['INFERENCE_MAX_BATCH'], app.config['INFERENCE_MAX_WAIT_MS'], name=name)
+    for name in model_registry.names()
+}
+
+# ---------------- Caché de predicciones ----------------
+# Indexada por huella del tensor 28x28, modelo y versión del fichero del modelo (0 la desactiva)
+app.config['PREDICTION_CACHE_SIZE'] = int(os.environ.get('PREDICTION_CACHE_SIZE', 4096))
+app.config['PREDICTION_CACHE_TTL'] = float(os.environ.get('PREDICTION_CACHE_TTL', 3600))
+prediction_cache = PredictionCache(app.config['PREDICTION_CACHE_SIZE'], app.config['PREDICTION_CACHE_TTL'])
+
+# ---------------- Caché de QR ----------------
+# La URL del QR de un usuario no cambia: se renderiza una vez y se sirve desde memoria
+# (QR_CACHE_SIZE imágenes) o desde disco si se indica QR_CACHE_DIR (compartido entre workers)
+app.config['QR_CACHE_SIZE'] = int(os.environ.get('QR_CACHE_SIZE', 256))
+app.config['QR_CACHE_DIR'] = os.environ.get('QR_CACHE_DIR') or None
+app.config['QR_MAX_AGE'] = int(os.environ.get('QR_MAX_AGE', 86400))
+qr_cache = QRCache(app.config['QR_CACHE_SIZE'], app.config['QR_CACHE_DIR'])
+
+# ---------------- Canales en tiempo real ----------------
+# Cada stream SSE ocupa un hilo del worker mientras la pestaña está abierta: REALTIME_MAX_STREAMS
+# limita cuántos hay a la vez (por encima, 503 y el navegador usa /predict_pixels; 0 sin límite).
+# Los canales viven en el proceso que abrió el stream, así que con varios workers se desactivan
+# (REALTIME_SSE=0, lo fija gunicorn.conf.py): un frame que llegara a otro worker no encontraría su canal.
+app.config['REALTIME_SSE'] = os.environ.get('REALTIME_SSE', '1') == '1'
+app.config['REALTIME_MAX_STREAMS'] = int(os.environ.get('REALTIME_MAX_STREAMS', 4))
+realtime_hub = RealtimeHub(max_channels=app.config['REALTIME_MAX_STREAMS'] or None)
+REALTIME_KEEPALIVE_S = 15
+
+# ---------------- Métricas de evaluación ----------------
+# models/metrics.json lo escribe app/evaluate_models.py (se relee si cambia);
+# cnn_metrics.json (save_cnn_metrics.py) queda como respaldo para la CNN
+MODEL_METRICS_PATH = os.path.join(BASE_DIR, 'models', 'metrics.json')
 CNN_METRICS_PATH = os.path.join(BASE_DIR, 'models', 'cnn_metrics.json')
 cnn_metrics = {}
 if os.path.exists(CNN_METRICS_PATH):
     with open(CNN_METRICS_PATH, 'r') as f:
         cnn_metrics = json.load(f)
+_model_metrics = {'version': None, 'data': {}}
 
 # ---------------- Log predicciones ----------------
+# Log antiguo (array JSON): solo se lee una vez para migrarlo al almacén SQLite
 PRED_LOG = os.path.join(BASE_DIR, 'app', 'predictions.json')
-if not os.path.exists(PRED_LOG):
-    with open(PRED_LOG, 'w', encoding='utf-8') as f:
-        json.dump([], f)
+PRED_DB = os.environ.get('PREDICTIONS_DB', os.path.join(BASE_DIR, 'app', 'predictions.db'))
+prediction_store = PredictionStore(PRED_DB)
+migrated = prediction_store.migrate_from_json(PRED_LOG)
+if migrated:
+    logger.info("✅ Migradas %d predicciones de %s a %s", migrated, PRED_LOG, PRED_DB)
+
+# ---------------- Persistencia en segundo plano ----------------
+# Las predicciones se encolan y un hilo las escribe por lotes fuera de la latencia de /predict.
+# PERSIST_ASYNC=0 vuelve a la escritura síncrona; FIRESTORE_SYNC=1 añade Firestore como destino.
+app.config['PERSIST_ASYNC'] = os.environ.get('PERSIST_ASYNC', '1') == '1'
+app.config['PERSIST_QUEUE_SIZE'] = int(os.environ.get('PERSIST_QUEUE_SIZE', 10000))
+persistence_sinks = [LocalStoreSink(prediction_store)]
+if os.environ.get('FIRESTORE_SYNC', '0') == '1':
+    # Espejo local + subida en lotes de hasta 500 (utils/firestore_mirror.py)
+    from utils.firebase_utils import get_mirror
+    persistence_sinks.append(get_mirror())
+persistence_queue = WriteBehindQueue(persistence_sinks, max_size=app.config['PERSIST_QUEUE_SIZE'])
+
+# ---------------- Reentrenamiento incremental ----------------
+# Los usuarios con sesión iniciada etiquetan/corrigen dígitos con POST /label. Con FINETUNE=1 un hilo
+# de fondo ajusta los modelos con esas muestras (más repaso de MNIST), mide la exactitud en un conjunto
+# de validación (FINETUNE_HOLDOUT) y, si no empeora, publica el checkpoint en models/finetuned/, que el
+# registro recarga en caliente. El hilo no se arranca al importar la app (con gunicorn preload_app
+# se crearía en el maestro): lo arranca `python app.py` o gunicorn.conf.py con un solo worker.
+# Con varios workers, usar app/finetune.py aparte.
+app.config['FINETUNE'] = os.environ.get('FINETUNE', '0') == '1'
+fine_tuner = None
+if app.config['FINETUNE']:
+    from utils.training_utils import FineTuner
+    from utils.datasets import open_dataset
+    replay_spec = os.environ.get('FINETUNE_REPLAY', 'mnist-train')
+    holdout_spec = os.environ.get('FINETUNE_HOLDOUT', 'mnist-test')
+    fine_tuner = FineTuner(
+        prediction_store,
+        {name: model_registry.status()[name]['base_path']
+         for name in os.environ.get('FINETUNE_MODELS', 'MLP,CNN').split(',') if name in model_registry.names()},
+        checkpoint_dir=os.path.join(BASE_DIR, 'models', 'checkpoints'),
+        publish_dir=FINETUNED_DIR,
+        min_samples=int(os.environ.get('FINETUNE_MIN_SAMPLES', 50)),
+        interval=float(os.environ.get('FINETUNE_INTERVAL', 300)),
+        replay=(lambda: open_dataset(replay_spec)) if replay_spec else None,
+        holdout=(lambda: open_dataset(holdout_spec)) if holdout_spec else None,
+        max_regression=float(os.environ.get('FINETUNE_MAX_REGRESSION', 0.0)),
+        on_checkpoint=model_registry.reload,
+    )
+
+# ---------------- Usuarios y sesiones ----------------
+# Cuentas en SQLite (USERS_DB), compartidas entre workers y con la contraseña hasheada;
+# PASSWORD_HASH_METHOD fija el método y su coste (p. ej. scrypt:16384:8:1, pbkdf2:sha256:600000).
+# SESSION_BACKEND: sqlite (sesiones de servidor en la misma base de datos; la cookie solo lleva el id),
+# cookie (cookie firmada de Flask) o flask-session (configurada con SESSION_TYPE y sus variables).
+USERS_DB = os.environ.get('USERS_DB', os.path.join(BASE_DIR, 'app', 'users.db'))
+USERS_JSON = os.path.join(BASE_DIR, 'app', 'users.json')  # cuentas antiguas de app/auth.py
+user_store = UserStore(USERS_DB, os.environ.get('PASSWORD_HASH_METHOD', DEFAULT_HASH_METHOD))
+migrated_users = user_store.migrate_from_json(USERS_JSON)
+if migrated_users:
+    logger.info("✅ Migrados %d usuarios de %s a %s", migrated_users, USERS_JSON, USERS_DB)
+app.extensions['user_store'] = user_store
+
+app.config['SESSION_BACKEND'] = os.environ.get('SESSION_BACKEND', 'sqlite')
+if app.config['SESSION_BACKEND'] == 'sqlite':
+    app.session_interface = SqliteSessionInterface(user_store)
+elif app.config['SESSION_BACKEND'] == 'flask-session':
+    from flask_session import Session
+    app.config['SESSION_TYPE'] = os.environ.get('SESSION_TYPE', 'filesystem')
+    Session(app)
 
-# ---------------- Usuarios demo ----------------
-USERS = {}
+if __package__:  # gunicorn app.app:app / from app.app import app
+    from app.auth import auth_bp
+else:            # python app/app.py
+    from auth import auth_bp
+app.register_blueprint(auth_bp)
 
 # ---------------- Helpers ----------------
-def save_prediction_local(record: dict):
-    with open(PRED_LOG, 'r+', encoding='utf-8') as fh:
-        try:
-            data = json.load(fh)
-        except json.JSONDecodeError:
-            data = []
-        data.insert(0, record)
-        fh.seek(0)
-        json.dump(data, fh, ensure_ascii=False, indent=2)
-        fh.truncate()
+def save_predictions(records: list):
+    """
+    Persiste predicciones: encoladas (por defecto) o síncronas si PERSIST_ASYNC=0.
+    """
+    if app.config['PERSIST_ASYNC']:
+        persistence_queue.put_many(records)
+    else:
+        persistence_queue.write(records)
 
 def get_current_user():
     if session.get('user'):
@@ -85,52 +231,216 @@ def sanitize_history(data):
         rec.setdefault('confidence', 0.0)
     return data
 
-def calculate_mlp_accuracy(user_history):
-    mlp_confs = [rec['confidence'] for rec in user_history if rec['model'] == 'MLP']
-    return round(float(np.mean(mlp_confs)) if mlp_confs else 0, 4)
+def load_model_metrics() -> dict:
+    version = file_version(MODEL_METRICS_PATH)
+    if version != _model_metrics['version']:
+        data = {}
+        if version is not None:
+            try:
+                with open(MODEL_METRICS_PATH, 'r') as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning("⚠️ No se pudo leer %s: %s", MODEL_METRICS_PATH, e)
+        _model_metrics.update(version=version, data=data)
+    return _model_metrics['data']
+
+def model_accuracy(name):
+    """
+    Precisión del modelo sobre el conjunto de evaluación, o None si no se ha evaluado.
+    """
+    metrics = load_model_metrics().get('models', {}).get(name)
+    if metrics and metrics.get('accuracy') is not None:
+        return round(metrics['accuracy'], 4)
+    if name == 'CNN' and cnn_metrics.get('cnn_test_accuracy') is not None:
+        return round(cnn_metrics['cnn_test_accuracy'], 4)
+    return None
+
+def parse_history_args(args, default_limit=50):
+    """
+    Lee de la query string los parámetros comunes de consulta de historial:
+    limit, before (cursor), model (MLP/CNN) y rango de tiempo start/end (ISO 8601).
+    Lanza ValueError si algún valor no es válido.
+    """
+    model = args.get('model')
+    if model:
+        model = model.upper()
+        if model not in ('MLP', 'CNN'):
+            raise ValueError(f"Modelo no soportado: {model}")
+    before = args.get('before')
+    return {
+        'limit': int(args.get('limit', default_limit)),
+        'before': int(before) if before else None,
+        'model': model,
+        'start': args.get('start'),
+        'end': args.get('end'),
+    }
+
+def get_history_page(user_id, args, default_limit=50):
+    """
+    Devuelve (página, cursor_siguiente) del historial del usuario.
+    El cursor es None cuando no hay más registros.
+    """
+    query = parse_history_args(args, default_limit)
+    page = sanitize_history(prediction_store.query(user_id, **query))
+    # El almacén limita la página a MAX_PAGE_SIZE: una página llena tiene page_limit(limit) filas
+    next_cursor = page[-1]['id'] if page and len(page) >= page_limit(query['limit']) else None
+    return page, next_cursor
+
+# ---------------- Sondeo condicional (ETag / long-poll) ----------------
+# La versión del usuario (id de su última predicción) decide si /history y /stats/summary
+# cambiaron: con If-None-Match se responde 304 sin consultar nada más, y con ?wait=<s> la
+# petición espera (hasta HISTORY_LONGPOLL_MAX s) a que llegue una predicción nueva.
+app.config['HISTORY_LONGPOLL_MAX'] = float(os.environ.get('HISTORY_LONGPOLL_MAX', 25))
+
+def user_etag(user_id, version) -> str:
+    # El usuario forma parte de la etiqueta: la misma URL con otra sesión no debe dar 304
+    digest = hashlib.blake2b(str(user_id).encode(), digest_size=6).hexdigest()
+    return f'{digest}-{version}'
+
+def wait_user_version(user_id, since=None):
+    """
+    Devuelve (versión, etag) del historial del usuario. Si la petición trae ?wait=<s> y el
+    cliente ya tiene la versión actual (por If-None-Match o por el cursor `since`), espera
+    antes a que cambie. Lanza ValueError si `wait` no es un número.
+    """
+    version = prediction_store.user_version(user_id)
+    wait = min(float(request.args.get('wait', 0)), app.config['HISTORY_LONGPOLL_MAX'])
+    up_to_date = user_etag(user_id, version) in request.if_none_match or (since is not None and since >= version)
+    if wait > 0 and up_to_date:
+        version = prediction_store.wait_for_change(user_id, version, wait)
+    return version, user_etag(user_id, version)
+
+def conditional_json(payload, etag):
+    response = jsonify(payload)
+    response.set_etag(etag)
+    # Privada (depende de la sesión) y siempre revalidada
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response
+
+def not_modified(etag):
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response
 
 # ---------------- Predicción ----------------
-def predict_image(image_input, user_id, filename=None):
-    results = []
+def make_record(output, user_id, filename, model_name, model_version=None):
+    return {
+        'time': datetime.utcnow().isoformat(),
+        'user': user_id,
+        'filename': filename,
+        'pred': int(np.argmax(output)),
+        'confidence': float(np.max(output)),
+        'model': model_name,
+        'model_version': model_version
+    }
+
+def predict_images(image_inputs, user_id, filenames=None):
+    """
+    Predice varias imágenes con ambos modelos usando un único batch por modelo.
+
+    Devuelve una lista con un elemento por imagen: la lista de registros (MLP, CNN)
+    o la excepción producida al preprocesar esa imagen.
+    """
+    # --- Preprocesado: cada imagen se decodifica y redimensiona una sola vez ---
+    batch, errors = preprocess_batch(image_inputs, target_size=(28,28))
+    return predict_arrays(batch, user_id, filenames or [None] * len(image_inputs), errors)
+
+def predict_arrays(batch, user_id, filenames, errors=None, persist=True):
+    """
+    Ejecuta ambos modelos sobre un batch ya preprocesado (N, 28, 28) float32.
+
+    errors (opcional) está alineado con filenames: las posiciones con excepción
+    no tienen fila en batch y se devuelven tal cual.
+    persist=False no guarda los registros en el historial (vista previa en tiempo real).
+    """
+    errors = errors or [None] * len(filenames)
+    flat, spatial = model_views(batch)
+    feeds = {}
+    if model_registry.available('MLP'):
+        feeds['MLP'] = flat
+    if model_registry.available('CNN'):
+        feeds['CNN'] = spatial
 
-    # --- MLP ---
-    if mlp_model:
-        print("✅ Ejecutando predicción MLP")
-        arr_mlp = preprocess_image(image_input, target_size=(28,28), flatten=True)
-        pred_mlp = mlp_model.predict(arr_mlp.reshape(1, -1))
-        print("Predicción MLP:", pred_mlp)
-        record_mlp = {
-            'time': datetime.utcnow().isoformat(),
-            'user': user_id,
-            'filename': filename,
-            'pred': int(np.argmax(pred_mlp)),
-            'confidence': float(np.max(pred_mlp)),
-            'model': 'MLP'
-        }
-        results.append(record_mlp)
-        save_prediction_local(record_mlp)
-
-    # --- CNN ---
-    if cnn_model:
-        print("✅ Ejecutando predicción CNN")
-        arr_cnn = preprocess_image(image_input, target_size=(28,28), flatten=False)
-        if arr_cnn.ndim == 3:
-            arr_cnn = np.expand_dims(arr_cnn, axis=0)
-        pred_cnn = cnn_model.predict(arr_cnn)
-        print("Predicción CNN:", pred_cnn)
-        record_cnn = {
-            'time': datetime.utcnow().isoformat(),
-            'user': user_id,
-            'filename': filename,
-            'pred': int(np.argmax(pred_cnn)),
-            'confidence': float(np.max(pred_cnn)),
-            'model': 'CNN'
-        }
-        results.append(record_cnn)
-        save_prediction_local(record_cnn)
+    # --- Caché: las imágenes ya vistas (mismo tensor 28x28 y versión del modelo) no se recalculan ---
+    digests = [tensor_digest(img) for img in batch] if prediction_cache.enabled else None
+    outputs = {}
+    for name, feed in feeds.items():
+        if not len(feed):
+            continue
+        engine = model_registry.get(name)
+        if engine is None:
+            # El fichero desapareció antes de llegar a cargarse: se responde sin ese modelo
+            logger.warning("⚠️ Modelo %s no disponible, se omite de la predicción", name)
+            continue
+        version = engine.version
+        keys, cached = [], []
+        if digests is not None:
+            keys = [PredictionCache.make_key(d, name, version) for d in digests]
+            cached = [prediction_cache.get(key) for key in keys]
+        else:
+            cached = [None] * len(feed)
+        missing = [i for i, out in enumerate(cached) if out is None]
+        versions = [version] * len(feed)
 
+        # --- Inferencia: las imágenes no cacheadas van en el mismo batch por modelo ---
+        # Cada salida se etiqueta con la versión que la calculó (puede cambiar si hay una recarga en medio)
+        if missing:
+            logger.debug("Ejecutando predicción %s (%d imágenes)", name, len(missing))
+            computed, tags = schedulers[name].predict_many([feed[i] for i in missing], with_tags=True)
+            for i, out, tag in zip(missing, computed, tags):
+                cached[i] = out
+                versions[i] = tag
+                if digests is not None:
+                    prediction_cache.put(PredictionCache.make_key(digests[i], name, tag), out)
+        outputs[name] = iter(zip(cached, versions))
+
+    results = []
+    for error, filename in zip(errors, filenames):
+        if error is not None:
+            results.append(error)
+            continue
+        records = []
+        for name in ('MLP', 'CNN'):
+            if name in outputs:
+                output, version = next(outputs[name])
+                records.append(make_record(output, user_id, filename, name, version))
+        if persist:
+            with instrumentation.span('persist'):
+                save_predictions(records)
+        results.append(records)
     return results
 
+def serialize(payload):
+    with instrumentation.span('serialize'):
+        return jsonify(payload)
+
+def predict_image(image_input, user_id, filename=None):
+    result = predict_images([image_input], user_id, [filename])[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+# ---------------- Instrumentación ----------------
+# INSTRUMENTATION=1 activa los spans (decode, resize, inference, persist, serialize, request);
+# desactivada no se mide nada. Los histogramas se exponen en GET /metrics.
+if os.environ.get('INSTRUMENTATION', '0') == '1':
+    instrumentation.enable()
+
+@app.before_request
+def start_request_span():
+    if instrumentation.enabled:
+        g.request_started = time.perf_counter()
+
+@app.after_request
+def end_request_span(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        instrumentation.record('request', time.perf_counter() - started, {'endpoint': request.endpoint or 'unknown'})
+    return response
+
 # ---------------- Rutas ----------------
 @app.route('/')
 def index(): return render_template('index.html')
@@ -140,7 +450,8 @@ def login():
     if request.method == 'POST':
         username = request.form.get('username')
         password = request.form.get('password')
-        if USERS.get(username) == password:
+        if username and password and app.extensions['user_store'].verify(username, password):
+            regenerate_session(app, session)
             session['user'] = username
             return redirect(url_for('index'))
         return render_template('login.html', error="Usuario o contraseña incorrectos")
@@ -151,16 +462,19 @@ def register():
     if request.method == 'POST':
         username = request.form.get('username')
         password = request.form.get('password')
-        if username in USERS:
+        if not username or not password:
+            return render_template('register.html', error="Usuario y contraseña requeridos")
+        if not app.extensions['user_store'].create_user(username, password):
             return render_template('register.html', error="Usuario ya existe")
-        USERS[username] = password
+        regenerate_session(app, session)
         session['user'] = username
         return redirect(url_for('index'))
     return render_template('register.html')
 
 @app.route('/logout')
 def logout():
-    session.pop('user', None)
+    # Sesión vacía: se borra del almacén y el navegador pierde la cookie
+    session.clear()
     return redirect(url_for('index'))
 
 @app.route('/profile')
@@ -172,9 +486,11 @@ def profile():
 @app.route('/my_predictions')
 def my_predictions():
     user_id = get_current_user()
-    with open(PRED_LOG, 'r', encoding='utf-8') as fh:
-        data = sanitize_history([d for d in json.load(fh) if d.get('user') == user_id])
-    return render_template('my_predictions.html', history=data)
+    try:
+        data, next_cursor = get_history_page(user_id, request.args, default_limit=100)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return render_template('my_predictions.html', history=data, next_cursor=next_cursor)
 
 @app.route('/predict', methods=['POST'])
 def predict():
@@ -184,62 +500,338 @@ def predict():
     user_id = get_current_user()
     try:
         results = predict_image(data['image'], user_id)
-        return jsonify(results)
+        return serialize(results)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/label', methods=['POST'])
+def label_sample():
+    """
+    Guarda un dígito etiquetado por el usuario para el reentrenamiento incremental.
+    JSON {'image': base64, 'label': 0-9, 'prediction_id': opcional} o píxeles crudos
+    (application/octet-stream, como /predict_pixels) con ?label=&width=&height=.
+    Solo para usuarios con sesión iniciada: las muestras acaban en el entrenamiento.
+    """
+    if not session.get('user'):
+        return jsonify({'error': 'Inicia sesión para enviar correcciones'}), 401
+    try:
+        if request.mimetype == 'application/octet-stream':
+            label = int(request.args['label'])
+            prediction_id = request.args.get('prediction_id', type=int)
+            arr = decode_pixel_buffer(request.get_data(cache=False), int(request.args.get('width', 28)),
+                                      int(request.args.get('height', 28)), target_size=(28,28))
+        else:
+            data = request.get_json() or {}
+            label = int(data['label'])
+            prediction_id = data.get('prediction_id')
+            prediction_id = int(prediction_id) if prediction_id is not None else None
+            arr = decode_image(data['image'], target_size=(28,28))
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'error': f'Muestra inválida: {e}'}), 400
+    if not 0 <= label <= 9:
+        return jsonify({'error': 'La etiqueta debe ser un dígito 0-9'}), 400
+    pixels = np.clip(np.rint(arr * 255.0), 0, 255).astype(np.uint8).tobytes()
+    sample_id = prediction_store.add_labelled_sample(session['user'], label, pixels, prediction_id)
+    return jsonify({'id': sample_id, 'label': label}), 201
+
+@app.route('/finetune/status', methods=['GET'])
+def finetune_status():
+    if fine_tuner is None:
+        return jsonify({'enabled': False, 'labelled_samples': prediction_store.count_labelled()})
+    return jsonify({'enabled': True, 'models': fine_tuner.status()})
+
+@app.route('/predict_pixels', methods=['POST'])
+def predict_pixels():
+    """
+    Vía rápida del canvas: el cuerpo son píxeles crudos (application/octet-stream),
+    width*height bytes en gris o width*height*4 en RGBA. Sin PNG ni base64.
+    """
+    body = request.get_data(cache=False)
+    if not body:
+        return jsonify({'error': 'No pixels provided'}), 400
+    try:
+        width = int(request.args.get('width', 28))
+        height = int(request.args.get('height', 28))
+        arr = decode_pixel_buffer(body, width, height, target_size=(28,28))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    persist = request.args.get('persist', '1') not in ('0', 'false')
+    user_id = get_current_user()
+    try:
+        return serialize(predict_arrays(arr[np.newaxis], user_id, [None], persist=persist)[0])
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# ---------------- Canal en tiempo real (SSE + POST) ----------------
+@app.route('/realtime/stream', methods=['GET'])
+def realtime_stream():
+    """
+    Abre un canal Server-Sent Events. El primer evento ('ready') trae el id del canal;
+    el cliente envía los frames a /realtime/frame/<id> y recibe aquí cada predicción.
+    Solo se procesa el frame más reciente y nada se guarda en el historial.
+    Responde 503 si los canales están desactivados o ya hay REALTIME_MAX_STREAMS abiertos;
+    el navegador usa entonces POST /predict_pixels.
+    """
+    if not app.config['REALTIME_SSE']:
+        return jsonify({'error': 'Canal en tiempo real desactivado'}), 503
+    user_id = get_current_user()
+    opened = realtime_hub.open(user_id)
+    if opened is None:
+        response = jsonify({'error': 'Demasiados canales en tiempo real abiertos'})
+        response.headers['Retry-After'] = '60'
+        return response, 503
+    channel_id, slot = opened
+
+    def events():
+        try:
+            yield f"event: ready\ndata: {json.dumps({'channel': channel_id})}\n\n"
+            while not slot.closed:
+                item = slot.take(timeout=REALTIME_KEEPALIVE_S)
+                slot.touched_at = time.monotonic()
+                if item is None:
+                    yield ": keepalive\n\n"
+                    continue
+                seq, (body, width, height) = item
+                try:
+                    arr = decode_pixel_buffer(body, width, height, target_size=(28,28))
+                    payload = {'seq': seq, 'predictions': predict_arrays(arr[np.newaxis], slot.user_id, [None], persist=False)[0]}
+                except Exception as e:
+                    payload = {'seq': seq, 'error': str(e)}
+                yield f"event: prediction\ndata: {json.dumps(payload)}\n\n"
+        finally:
+            realtime_hub.close(channel_id)
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/realtime/frame/<channel_id>', methods=['POST'])
+def realtime_frame(channel_id):
+    """
+    Recibe un frame del canvas (píxeles crudos, igual que /predict_pixels) para un canal abierto.
+    No toca la sesión: el id aleatorio del canal identifica al usuario.
+    """
+    slot = realtime_hub.get(channel_id)
+    if slot is None:
+        return jsonify({'error': 'Canal no encontrado'}), 404
+    try:
+        seq = int(request.args.get('seq', 0))
+        width = int(request.args.get('width', 28))
+        height = int(request.args.get('height', 28))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    accepted = slot.put(seq, (request.get_data(cache=False), width, height))
+    return '', 204 if accepted else 409
+
 @app.route('/predict_batch', methods=['POST'])
 def predict_batch():
     files = request.files.getlist('files')
     if not files:
         return jsonify({'error': 'No files provided'}), 400
     user_id = get_current_user()
+    filenames = [getattr(f, 'filename', None) for f in files]
+    try:
+        outcomes = predict_images([f.read() for f in files], user_id, filenames)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
     results = []
-    for f in files:
+    for filename, outcome in zip(filenames, outcomes):
+        if isinstance(outcome, Exception):
+            results.append({'filename': filename, 'error': str(outcome)})
+        else:
+            results.extend(outcome)
+    return serialize(results)
+
+@app.route('/inference/stats', methods=['GET'])
+def inference_stats():
+    return jsonify({name: sched.stats() for name, sched in schedulers.items()})
+
+@app.route('/realtime/stats', methods=['GET'])
+def realtime_stats():
+    return jsonify(realtime_hub.stats())
+
+@app.route('/persistence/stats', methods=['GET'])
+def persistence_stats():
+    return jsonify(persistence_queue.stats())
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(prediction_cache.stats())
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    cache = prediction_cache.stats()
+    persistence = persistence_queue.stats()
+    gauges = {
+        'cache_hits': cache['hits'],
+        'cache_misses': cache['misses'],
+        'cache_hit_rate': cache['hit_rate'],
+        'cache_entries': cache['entries'],
+        'inference_queue_depth': {(('model', name),): sched.queue_depth() for name, sched in schedulers.items()},
+        'inference_batches': {(('model', name),): sched.stats()['batches'] for name, sched in schedulers.items()},
+        'persistence_queue_depth': persistence['queue_depth'],
+        'persistence_written': persistence['written'],
+        'persistence_dropped': persistence['dropped'],
+        'realtime_channels': realtime_hub.stats()['channels'],
+    }
+    return Response(instrumentation.render_prometheus(gauges), mimetype='text/plain; version=0.0.4')
+
+@app.route('/models/metrics', methods=['GET'])
+def models_metrics():
+    return jsonify(load_model_metrics())
+
+@app.route('/models/status', methods=['GET'])
+def models_status():
+    return jsonify(model_registry.status())
+
+@app.route('/models/<name>/reload', methods=['POST'])
+def models_reload(name):
+    token = app.config['ADMIN_TOKEN']
+    if token and request.headers.get('X-Admin-Token') != token:
+        return jsonify({'error': 'No autorizado'}), 403
+    if not token and request.remote_addr not in ('127.0.0.1', '::1'):
+        return jsonify({'error': 'Sin ADMIN_TOKEN solo se admite desde localhost'}), 403
+    if name not in model_registry.names():
+        return jsonify({'error': f'Modelo desconocido: {name}'}), 404
+    if not model_registry.available(name):
+        return jsonify({'error': f'No existe el fichero del modelo {name}'}), 404
+    # ?wait=1 espera a que la nueva versión esté cargada; si no, se recarga en segundo plano
+    if request.args.get('wait') == '1':
         try:
-            results.extend(predict_image(f.read(), user_id, filename=f.filename))
+            model_registry.reload(name)
         except Exception as e:
-            results.append({'filename': getattr(f, 'filename', None), 'error': str(e)})
-    return jsonify(results)
+            return jsonify({'error': str(e), 'status': model_registry.status()[name]}), 500
+        return jsonify(model_registry.status()[name])
+    model_registry.reload_async(name)
+    return jsonify(model_registry.status()[name]), 202
 
 @app.route('/history', methods=['GET'])
 def history():
+    """
+    Página del historial (más recientes primero, cursor en X-Next-Cursor).
+
+    Modo delta: ?since=<cursor> devuelve solo las predicciones con id > cursor, de la más
+    antigua a la más reciente, y el cursor para la siguiente llamada en X-Cursor.
+    Con If-None-Match responde 304 si no hay nada nuevo; ?wait=<s> hace long-poll.
+    """
     user_id = get_current_user()
-    limit = int(request.args.get('limit', 50))
-    with open(PRED_LOG, 'r', encoding='utf-8') as fh:
-        data = sanitize_history([d for d in json.load(fh) if d.get('user') == user_id])
-    return jsonify(data[:limit])
+    try:
+        since = int(request.args['since']) if request.args.get('since') else None
+        version, etag = wait_user_version(user_id, since)
+        if etag in request.if_none_match:
+            return not_modified(etag)
+        if since is not None:
+            query = parse_history_args(request.args)
+            query.update(after=since, before=None)
+            data = sanitize_history(prediction_store.query(user_id, **query)) if since < version else []
+            # Si la página se llenó (con el tamaño que aplica el almacén, como mucho MAX_PAGE_SIZE)
+            # quedan más registros: el cursor avanza solo hasta el último devuelto
+            if data and len(data) >= page_limit(query['limit']):
+                cursor = data[-1]['id']
+            else:
+                cursor = max([since, version] + [r['id'] for r in data[-1:]])
+            response = conditional_json(data, etag)
+            response.headers['X-Cursor'] = str(cursor)
+            return response
+        data, next_cursor = get_history_page(user_id, request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    response = conditional_json(data, etag)
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = str(next_cursor)
+    response.headers['X-Cursor'] = str(max([version] + [r['id'] for r in data[:1]]))
+    return response
 
 @app.route('/export', methods=['GET'])
 def export():
     user_id = get_current_user()
-    with open(PRED_LOG, 'r', encoding='utf-8') as fh:
-        data = [d for d in json.load(fh) if d.get('user') == user_id]
-    csv_bytes = export_predictions_to_csv(data)
-    return send_file(io.BytesIO(csv_bytes), mimetype='text/csv', as_attachment=True, download_name='predictions_export.csv')
+    try:
+        filters = parse_history_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    columns = [c.strip() for c in request.args.get('columns', '').split(',') if c.strip()] or None
+    use_gzip = request.args.get('gzip', '0') in ('1', 'true')
+
+    # Las filas se leen del almacén página a página y se envían según se generan; las columnas
+    # (todas las claves del rango, también las que solo tienen registros antiguos) se piden antes
+    scope = {'model': filters['model'], 'start': filters['start'], 'end': filters['end']}
+    columns = columns or prediction_store.columns(user_id, **scope)
+    records = prediction_store.iter_history(user_id, **scope)
+    chunks = iter_predictions_csv(records, columns=columns)
+    download_name = 'predictions_export.csv'
+    if use_gzip:
+        chunks = gzip_chunks(chunks)
+        download_name += '.gz'
+    response = Response(stream_with_context(chunks), mimetype='application/gzip' if use_gzip else 'text/csv')
+    response.headers['Content-Disposition'] = f'attachment; filename={download_name}'
+    return response
 
 @app.route('/stats')
 def stats():
     user_id = get_current_user()
-    with open(PRED_LOG, 'r', encoding='utf-8') as fh:
-        user_data = sanitize_history([d for d in json.load(fh) if d.get('user') == user_id])
-    mlp_acc = calculate_mlp_accuracy(user_data) if mlp_model else None
-    cnn_acc = cnn_metrics.get("cnn_test_accuracy") or 0
-    return render_template("stats.html", history=user_data, mlp_accuracy=mlp_acc, cnn_accuracy=cnn_acc)
+    try:
+        user_data, next_cursor = get_history_page(user_id, request.args, default_limit=100)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    mlp_acc = model_accuracy('MLP')
+    cnn_acc = model_accuracy('CNN')
+    summary = prediction_store.user_summary(user_id)
+    return render_template("stats.html", history=user_data, next_cursor=next_cursor, summary=summary,
+                           mlp_accuracy=mlp_acc, cnn_accuracy=cnn_acc)
+
+@app.route('/stats/summary', methods=['GET'])
+def stats_summary():
+    """
+    Agregados precalculados del usuario (por modelo, por dígito y por día) para las gráficas.
+    Admite If-None-Match (304 si no hay predicciones nuevas) y long-poll con ?wait=<s>.
+    """
+    user_id = get_current_user()
+    try:
+        _, etag = wait_user_version(user_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if etag in request.if_none_match:
+        return not_modified(etag)
+    return conditional_json(prediction_store.user_summary(user_id), etag)
 
 @app.route('/generate_qr', methods=['GET'])
 def generate_qr_route():
+    """
+    QR con el enlace al historial del usuario, en PNG o SVG (?format=svg).
+    La ETag es la clave de la caché (hash del contenido): se responde 304 sin renderizar.
+    """
+    fmt = request.args.get('format', 'png').lower()
+    if fmt not in QR_FORMATS:
+        return jsonify({'error': f'Formato no soportado: {fmt}'}), 400
     user_id = get_current_user()
     url = url_for('qr_view', user_id=user_id, _external=True)
-    img_bytes = generate_qr_from_url(url)
-    return send_file(io.BytesIO(img_bytes), mimetype='image/png')
+    etag = QRCache.make_key(url, fmt)
+    cache_control = f"private, max-age={app.config['QR_MAX_AGE']}"
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        image, etag = qr_cache.get_or_render(url, fmt)
+        response = Response(image, mimetype=QR_FORMATS[fmt])
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    response.vary.add('Cookie')
+    return response
+
+@app.route('/qr/stats', methods=['GET'])
+def qr_stats():
+    return jsonify(qr_cache.stats())
 
 @app.route('/qr_view/<user_id>')
 def qr_view(user_id):
-    with open(PRED_LOG, 'r', encoding='utf-8') as fh:
-        user_history = sanitize_history([d for d in json.load(fh) if d.get('user') == user_id])
+    try:
+        user_history, _ = get_history_page(user_id, request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     return render_template('qr_view.html', history=user_history)
 
 # ---------------- Main ----------------
 if __name__ == '__main__':
+    model_registry.warm_up(background=True)
+    # Con debug=True el recargador ejecuta este bloque también en el proceso vigilante: un solo hilo
+    if fine_tuner is not None and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        fine_tuner.start()
     app.run(host='0.0.0.0', port=5000, debug=True)
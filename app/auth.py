@@ -1,64 +1,51 @@
 # app/auth.py
+# API JSON de autenticación (/auth/...). Usa el mismo almacén de usuarios que los
+# formularios de app.py (utils/user_store.py, registrado en app.extensions['user_store']).
 
-from flask import Blueprint, request, jsonify, session
-from werkzeug.security import generate_password_hash, check_password_hash
-import os
-import json
+from flask import Blueprint, request, jsonify, session, current_app
 
-auth_bp = Blueprint("auth", __name__, url_prefix="/auth")
-
-USERS_FILE = os.path.join("app", "users.json")
+from utils.user_store import regenerate_session
 
-# Asegurar archivo de usuarios
-if not os.path.exists(USERS_FILE):
-    with open(USERS_FILE, "w", encoding="utf-8") as f:
-        json.dump({}, f)
-
-def load_users():
-    with open(USERS_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+auth_bp = Blueprint("auth", __name__, url_prefix="/auth")
 
-def save_users(users):
-    with open(USERS_FILE, "w", encoding="utf-8") as f:
-        json.dump(users, f, indent=2)
+def get_user_store():
+    return current_app.extensions["user_store"]
 
 @auth_bp.route("/register", methods=["POST"])
 def register():
-    data = request.get_json()
+    data = request.get_json(silent=True) or {}
     username = data.get("username")
     password = data.get("password")
 
     if not username or not password:
         return jsonify({"error": "Usuario y contraseña requeridos"}), 400
 
-    users = load_users()
-    if username in users:
+    if not get_user_store().create_user(username, password):
         return jsonify({"error": "Usuario ya existe"}), 400
 
-    users[username] = generate_password_hash(password)
-    save_users(users)
     return jsonify({"msg": "Usuario registrado exitosamente"})
 
 @auth_bp.route("/login", methods=["POST"])
 def login():
-    data = request.get_json()
+    data = request.get_json(silent=True) or {}
     username = data.get("username")
     password = data.get("password")
 
     if not username or not password:
         return jsonify({"error": "Usuario y contraseña requeridos"}), 400
 
-    users = load_users()
-    if username not in users:
+    users = get_user_store()
+    if not users.exists(username):
         return jsonify({"error": "Usuario no encontrado"}), 404
 
-    if not check_password_hash(users[username], password):
+    if not users.verify(username, password):
         return jsonify({"error": "Contraseña incorrecta"}), 401
 
+    regenerate_session(current_app, session)
     session["user"] = username
     return jsonify({"msg": "Login exitoso", "user": username})
 
 @auth_bp.route("/logout", methods=["POST"])
 def logout():
-    session.pop("user", None)
+    session.clear()
     return jsonify({"msg": "Logout exitoso"})
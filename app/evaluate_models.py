@@ -0,0 +1,151 @@
+# evaluate_models.py
+"""
+Evaluación offline de los modelos registrados sobre un conjunto etiquetado.
+
+Recorre el dataset una sola vez en batches de tamaño fijo, leídos de la caché
+memmap de utils/datasets.py: cada batch se normaliza una vez y se pasa a todos los modelos. Por modelo calcula
+precisión, matriz de confusión y reporte de clasificación (utils/analysis.py) y
+la latencia por batch, y lo guarda en models/metrics.json, que lee la app (/stats).
+
+Fuentes de datos (--dataset):
+- mnist: conjunto de test de MNIST (se descarga y convierte solo la primera vez)
+- fichero .npz con arrays x/y (o x_test/y_test), imágenes uint8 (N, 28, 28)
+- carpeta con una subcarpeta por dígito (0/, 1/, ... 9/) con imágenes
+
+Uso:
+    python app/evaluate_models.py --dataset mnist --models MLP CNN --batch-size 512
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+
+import numpy as np
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+from utils.preprocessing import model_views
+from utils.datasets import open_dataset
+from utils.model_registry import ModelRegistry
+from utils.inference_engine import DEFAULT_BACKEND
+from utils.analysis import compute_confusion, print_classification_report
+
+METRICS_PATH = os.path.join(BASE_DIR, 'models', 'metrics.json')
+MODEL_PATHS = {
+    'MLP': os.path.join(BASE_DIR, 'models', 'mnist_compiled_model.keras'),
+    'CNN': os.path.join(BASE_DIR, 'models', 'cnn_model.keras'),
+}
+LABELS = list(range(10))
+
+
+# ---------------- Evaluación ----------------
+def latency_stats(samples_ms, n_images: int) -> dict:
+    arr = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        'batches': int(arr.size),
+        'mean_ms': round(float(arr.mean()), 4),
+        'p50_ms': round(float(np.percentile(arr, 50)), 4),
+        'p95_ms': round(float(np.percentile(arr, 95)), 4),
+        'max_ms': round(float(arr.max()), 4),
+        'images_per_s': round(n_images / (arr.sum() / 1000.0), 1) if arr.sum() else None,
+    }
+
+
+def evaluate(registry: ModelRegistry, names: list, batches) -> dict:
+    """
+    Evalúa varios modelos en una sola pasada sobre `batches` ((x, y) con x (B, 28, 28) float32).
+    """
+    engines = {name: registry.get(name) for name in names}
+    flat_input = {name: len(registry.input_shape(name)) == 1 for name in names}
+    preds = {name: [] for name in names}
+    latencies = {name: [] for name in names}
+    y_true = []
+    for x, y in batches:
+        flat, spatial = model_views(x)
+        for name, engine in engines.items():
+            feed = flat if flat_input[name] else spatial
+            started = time.perf_counter()
+            out = engine(feed)
+            latencies[name].append((time.perf_counter() - started) * 1000.0)
+            preds[name].append(np.argmax(out, axis=1))
+        y_true.append(y)
+
+    y_true = np.concatenate(y_true) if y_true else np.empty(0, dtype=int)
+    results = {}
+    for name in names:
+        y_pred = np.concatenate(preds[name]) if preds[name] else np.empty(0, dtype=int)
+        cm = compute_confusion(y_true, y_pred, labels=LABELS)
+        results[name] = {
+            'accuracy': round(float(np.mean(y_pred == y_true)), 6) if len(y_true) else None,
+            'samples': int(len(y_true)),
+            'version': registry.version(name),
+            'backend': registry.status()[name]['backend'],
+            'confusion_matrix': cm.tolist(),
+            'report': print_classification_report(y_true, y_pred, labels=LABELS),
+            'latency': latency_stats(latencies[name], len(y_true)),
+        }
+    return results
+
+
+def write_metrics(results: dict, dataset: str, batch_size: int, path: str = METRICS_PATH):
+    """
+    Fusiona los resultados con los de otros modelos ya guardados y escribe el fichero de forma atómica.
+    """
+    metrics = {'models': {}}
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            metrics = json.load(f)
+    evaluated_at = datetime.utcnow().isoformat()
+    for name, result in results.items():
+        metrics.setdefault('models', {})[name] = dict(result, dataset=dataset, batch_size=batch_size,
+                                                       evaluated_at=evaluated_at)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(metrics, f, indent=2)
+    os.replace(tmp_path, path)
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dataset', default='mnist', help="'mnist', fichero .npz o carpeta con subcarpetas 0-9")
+    parser.add_argument('--models', nargs='+', default=['MLP', 'CNN'])
+    parser.add_argument('--batch-size', type=int, default=512)
+    parser.add_argument('--mlp-path', default=MODEL_PATHS['MLP'])
+    parser.add_argument('--cnn-path', default=MODEL_PATHS['CNN'])
+    parser.add_argument('--mlp-backend', default=os.environ.get('MLP_BACKEND', 'numpy'))
+    parser.add_argument('--backend', default=os.environ.get('INFERENCE_BACKEND', DEFAULT_BACKEND))
+    parser.add_argument('--output', default=METRICS_PATH)
+    args = parser.parse_args()
+
+    registry = ModelRegistry()
+    registry.register('MLP', args.mlp_path, args.mlp_backend if args.mlp_backend == 'numpy' else args.backend,
+                      input_shape=(784,))
+    registry.register('CNN', args.cnn_path, args.backend, input_shape=(28, 28, 1))
+    names = []
+    for name in args.models:
+        if name not in registry.names():
+            parser.error(f"Modelo desconocido: {name}")
+        if registry.available(name):
+            names.append(name)
+        else:
+            print(f"⚠️ Modelo {name} no encontrado, se omite")
+    if not names:
+        sys.exit(1)
+
+    dataset = open_dataset(args.dataset)
+    results = evaluate(registry, names, dataset.iter_batches(args.batch_size))
+    write_metrics(results, args.dataset, args.batch_size, args.output)
+    for name, result in results.items():
+        print(f"✅ {name}: precisión {result['accuracy']} sobre {result['samples']} muestras, "
+              f"{result['latency']['p50_ms']} ms/batch (p50)")
+    print(f"✅ Métricas guardadas en {args.output}")
+
+
+if __name__ == '__main__':
+    main()
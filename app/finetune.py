@@ -0,0 +1,72 @@
+# finetune.py
+"""
+Reentrenamiento incremental en un proceso aparte (recomendado con varios workers).
+
+Lee las muestras etiquetadas del almacén de predicciones (POST /label), ajusta los
+modelos servidos con ellas (más repaso de MNIST) y, si la exactitud en el conjunto de
+validación no empeora, publica el checkpoint en models/finetuned/ de forma atómica;
+cada worker detecta el cambio y lo recarga. Los models/*.keras originales no se tocan.
+
+Uso:
+    python app/finetune.py --once
+    python app/finetune.py --interval 300 --min-samples 50
+"""
+import os
+import sys
+import logging
+import argparse
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+from utils.prediction_store import PredictionStore
+from utils.training_utils import FineTuner
+from utils.datasets import open_dataset
+
+MODEL_PATHS = {
+    'MLP': os.path.join(BASE_DIR, 'models', 'mnist_compiled_model.keras'),
+    'CNN': os.path.join(BASE_DIR, 'models', 'cnn_model.keras'),
+}
+FINETUNED_DIR = os.path.join(BASE_DIR, 'models', 'finetuned')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=os.environ.get('PREDICTIONS_DB', os.path.join(BASE_DIR, 'app', 'predictions.db')))
+    parser.add_argument('--models', nargs='+', default=os.environ.get('FINETUNE_MODELS', 'MLP,CNN').split(','))
+    parser.add_argument('--min-samples', type=int, default=int(os.environ.get('FINETUNE_MIN_SAMPLES', 50)))
+    parser.add_argument('--interval', type=float, default=float(os.environ.get('FINETUNE_INTERVAL', 300)))
+    parser.add_argument('--epochs', type=int, default=1)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--replay', default=os.environ.get('FINETUNE_REPLAY', 'mnist-train'),
+                        help="Dataset de repaso ('' para desactivarlo)")
+    parser.add_argument('--holdout', default=os.environ.get('FINETUNE_HOLDOUT', 'mnist-test'),
+                        help='Dataset de validación; sin él no se publica ningún checkpoint')
+    parser.add_argument('--max-regression', type=float, default=float(os.environ.get('FINETUNE_MAX_REGRESSION', 0.0)),
+                        help='Caída de exactitud en validación que se tolera para publicar')
+    parser.add_argument('--once', action='store_true', help='Una sola ronda y salir')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    tuner = FineTuner(
+        PredictionStore(args.db),
+        {name: MODEL_PATHS[name] for name in args.models},
+        checkpoint_dir=os.path.join(BASE_DIR, 'models', 'checkpoints'),
+        publish_dir=FINETUNED_DIR,
+        min_samples=args.min_samples,
+        interval=args.interval,
+        epochs=args.epochs,
+        batch_size=args.batch_size,
+        replay=(lambda: open_dataset(args.replay)) if args.replay else None,
+        holdout=(lambda: open_dataset(args.holdout)) if args.holdout else None,
+        max_regression=args.max_regression,
+    )
+    if args.once:
+        print(tuner.run_once())
+        return
+    tuner.start().join()
+
+
+if __name__ == '__main__':
+    main()
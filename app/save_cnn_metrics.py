@@ -1,12 +1,15 @@
 # save_cnn_metrics.py
 import os
+import sys
 import json
 import numpy as np
 from tensorflow import keras
-from tensorflow.keras.datasets import mnist
 
 # --- Configurar rutas ---
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+sys.path.append(os.path.dirname(BASE_DIR))
+from utils.datasets import mnist_dataset
+
 MODEL_PATH = os.path.join(BASE_DIR, 'models', 'cnn_model.keras')
 METRICS_PATH = os.path.join(BASE_DIR, 'models', 'cnn_metrics.json')
 
@@ -14,14 +17,15 @@ METRICS_PATH = os.path.join(BASE_DIR, 'models', 'cnn_metrics.json')
 cnn_model = keras.models.load_model(MODEL_PATH)
 print("✅ CNN cargada correctamente")
 
-# --- Cargar datos MNIST ---
-(_, _), (x_test, y_test) = mnist.load_data()
-x_test = x_test.astype("float32") / 255.0
-x_test = np.expand_dims(x_test, axis=-1)  # CNN espera shape (n,28,28,1)
+# --- Datos MNIST (caché memmap: se descarga y convierte solo la primera vez) ---
+test_set = mnist_dataset('test')
 
-# --- Evaluar precisión ---
-y_test_cat = keras.utils.to_categorical(y_test, 10)
-loss, acc = cnn_model.evaluate(x_test, y_test_cat, verbose=0)
+# --- Evaluar precisión batch a batch ---
+correct = 0
+for x_batch, y_batch in test_set.iter_batches(1000):
+    probs = cnn_model.predict_on_batch(x_batch[..., np.newaxis])  # CNN espera shape (n,28,28,1)
+    correct += int(np.sum(np.argmax(probs, axis=1) == y_batch))
+acc = correct / len(test_set)
 print(f"Precisión CNN sobre test set: {acc:.4f}")
 
 # --- Guardar métricas ---
@@ -74,43 +74,72 @@ document.addEventListener("DOMContentLoaded", () => {
         }
     });
 
+    // --- Serie diaria de un modelo a partir de los agregados del servidor ---
+    function dailySeries(daily, model, labels) {
+        const byDay = {};
+        daily.filter(d => d.model === model).forEach(d => byDay[d.day] = d.confidence_mean);
+        return labels.map(day => byDay[day] ?? null);
+    }
+
     // --- Función para actualizar gráficas dinámicamente ---
-    async function updateCharts() {
-        try {
-            const res = await fetch("/history?limit=50");
-            if (!res.ok) {
-                console.warn("No se pudo obtener historial de predicciones:", res.status);
-                return;
-            }
+    // Petición condicional: con If-None-Match el servidor responde 304 si no hay predicciones
+    // nuevas, y con ?wait la mantiene abierta hasta que llegue una (long-poll)
+    let etag = null;
 
-            const data = await res.json();
-            if (!Array.isArray(data) || data.length === 0) {
-                console.info("No hay datos de historial disponibles para las gráficas.");
-                return;
-            }
+    async function updateCharts(wait) {
+        const headers = etag ? { "If-None-Match": etag } : {};
+        const res = await fetch(`/stats/summary?wait=${wait}`, { headers, cache: "no-store" });
+        if (res.status === 304) {
+            return;
+        }
+        if (!res.ok) {
+            throw new Error(`No se pudo obtener el resumen de predicciones: ${res.status}`);
+        }
+        etag = res.headers.get("ETag");
 
-            const labels = data.map((_, i) => i + 1);
+        const summary = await res.json();
+        if (!summary.daily || summary.daily.length === 0) {
+            console.info("No hay datos de historial disponibles para las gráficas.");
+            return;
+        }
 
-            const mlpAcc = data.map(d => d.model === 'MLP' ? (d.confidence ?? 0) : null);
-            const cnnAcc = data.map(d => d.model === 'CNN' ? (d.confidence ?? 0) : null);
+        const labels = [...new Set(summary.daily.map(d => d.day))];
 
-            const mlpLoss = mlpAcc.map(v => v !== null ? 1 - v : null);
-            const cnnLoss = cnnAcc.map(v => v !== null ? 1 - v : null);
+        const mlpAcc = dailySeries(summary.daily, 'MLP', labels);
+        const cnnAcc = dailySeries(summary.daily, 'CNN', labels);
 
-            accChart.data.labels = labels;
-            accChart.data.datasets[0].data = mlpAcc;
-            accChart.data.datasets[1].data = cnnAcc;
-            accChart.update();
+        const mlpLoss = mlpAcc.map(v => v !== null ? 1 - v : null);
+        const cnnLoss = cnnAcc.map(v => v !== null ? 1 - v : null);
 
-            lossChart.data.labels = labels;
-            lossChart.data.datasets[0].data = mlpLoss;
-            lossChart.data.datasets[1].data = cnnLoss;
-            lossChart.update();
-        } catch (err) {
-            console.error("Error actualizando gráficas:", err);
+        accChart.data.labels = labels;
+        accChart.data.datasets[0].data = mlpAcc;
+        accChart.data.datasets[1].data = cnnAcc;
+        accChart.update();
+
+        lossChart.data.labels = labels;
+        lossChart.data.datasets[0].data = mlpLoss;
+        lossChart.data.datasets[1].data = cnnLoss;
+        lossChart.update();
+    }
+
+    const sleep = ms => new Promise(resolve => setTimeout(resolve, ms));
+
+    async function pollCharts() {
+        let wait = 0;  // la primera carga no espera
+        while (true) {
+            try {
+                await updateCharts(wait);
+                wait = 25;
+                // Pestaña oculta: no se mantiene la conexión abierta
+                if (document.hidden) {
+                    await sleep(5000);
+                }
+            } catch (err) {
+                console.error("Error actualizando gráficas:", err);
+                await sleep(5000);
+            }
         }
     }
 
-    updateCharts();
-    setInterval(updateCharts, 5000); // Refrescar cada 5 segundos
+    pollCharts();
 });
@@ -41,24 +41,14 @@ document.addEventListener("DOMContentLoaded", () => {
 
     document.getElementById("clear-canvas").addEventListener("click", clearCanvas);
 
-    function getCanvasData() {
-        return canvas.toDataURL("image/png");
-    }
-
     // --- Predicción imagen dibujada ---
     const predictCanvasBtn = document.getElementById("predict-canvas-btn");
     const canvasResults = document.getElementById("canvas-results");
 
     predictCanvasBtn.addEventListener("click", async () => {
-        const imgData = getCanvasData();
-
         try {
-            const res = await fetch("/predict", {
-                method: "POST",
-                headers: {"Content-Type": "application/json"},
-                body: JSON.stringify({image: imgData})
-            });
-            const data = await res.json();
+            const data = await window.predictCanvasPixels(canvas);
+            if (!Array.isArray(data)) throw new Error(data.error || "respuesta inválida");
             canvasResults.innerHTML = "";
 
             // Mostrar predicciones de todos los modelos
@@ -74,6 +64,22 @@ document.addEventListener("DOMContentLoaded", () => {
         }
     });
 
+    // --- Corrección: guardar el dibujo con su dígito correcto ---
+    document.getElementById("label-canvas-btn").addEventListener("click", async () => {
+        const label = document.getElementById("label-digit").value;
+        if (label === "" || label < 0 || label > 9) {
+            alert("Indica el dígito correcto (0-9)");
+            return;
+        }
+        try {
+            const data = await window.labelCanvas(canvas, label);
+            if (data.error) throw new Error(data.error);
+            alert(`Gracias: guardado como ${data.label}`);
+        } catch (err) {
+            alert("Error al guardar la corrección: " + err.message);
+        }
+    });
+
     // --- Subida de imágenes ---
     const fileInput = document.getElementById("file-input");
     const predictBtn = document.getElementById("predict-files-btn");
@@ -127,7 +133,7 @@ document.addEventListener("DOMContentLoaded", () => {
 
     qrBtn.addEventListener("click", () => {
         const url = qrBtn.dataset.url;
-        qrImg.src = url + "?t=" + new Date().getTime();
+        qrImg.src = url;  // el QR no cambia: el navegador lo revalida con su ETag
     });
 
     // --- Actualizar colores si cambia el darkmode dinámicamente ---
@@ -0,0 +1,58 @@
+// static/pixels.js
+// Vía rápida del canvas: reduce el dibujo a 28x28 en gris y lo envía como bytes crudos
+// a /predict_pixels (sin toDataURL/PNG ni base64).
+(() => {
+    const SIZE = 28;
+    const small = document.createElement("canvas");
+    small.width = SIZE;
+    small.height = SIZE;
+    const smallCtx = small.getContext("2d", { willReadFrequently: true });
+
+    // Devuelve un Uint8Array de 784 valores (0-255) en escala de grises
+    function canvasToGrayPixels(canvas) {
+        smallCtx.imageSmoothingEnabled = true;
+        smallCtx.imageSmoothingQuality = "high";
+        smallCtx.drawImage(canvas, 0, 0, SIZE, SIZE);
+        const rgba = smallCtx.getImageData(0, 0, SIZE, SIZE).data;
+        const gray = new Uint8Array(SIZE * SIZE);
+        for (let i = 0, j = 0; i < gray.length; i++, j += 4) {
+            // Misma ponderación que PIL convert('L') en el servidor
+            gray[i] = Math.round(rgba[j] * 0.299 + rgba[j + 1] * 0.587 + rgba[j + 2] * 0.114);
+        }
+        return gray;
+    }
+
+    // persist=false: vista previa que no se guarda en el historial
+    async function predictCanvasPixels(canvas, persist = true) {
+        const res = await fetch(`/predict_pixels?width=${SIZE}&height=${SIZE}&persist=${persist ? 1 : 0}`, {
+            method: "POST",
+            headers: { "Content-Type": "application/octet-stream" },
+            body: canvasToGrayPixels(canvas)
+        });
+        return res.json();
+    }
+
+    // Envía un frame a un canal en tiempo real abierto (ver realtime.js); la respuesta llega por SSE
+    function sendCanvasFrame(canvas, channel, seq) {
+        return fetch(`/realtime/frame/${channel}?seq=${seq}&width=${SIZE}&height=${SIZE}`, {
+            method: "POST",
+            headers: { "Content-Type": "application/octet-stream" },
+            body: canvasToGrayPixels(canvas)
+        });
+    }
+
+    // Guarda el dibujo con su dígito correcto para el reentrenamiento incremental
+    async function labelCanvas(canvas, label) {
+        const res = await fetch(`/label?label=${label}&width=${SIZE}&height=${SIZE}`, {
+            method: "POST",
+            headers: { "Content-Type": "application/octet-stream" },
+            body: canvasToGrayPixels(canvas)
+        });
+        return res.json();
+    }
+
+    window.canvasToGrayPixels = canvasToGrayPixels;
+    window.labelCanvas = labelCanvas;
+    window.sendCanvasFrame = sendCanvasFrame;
+    window.predictCanvasPixels = predictCanvasPixels;
+})();
@@ -39,41 +39,74 @@ document.addEventListener("DOMContentLoaded", () => {
         ctx.beginPath();
         ctx.moveTo(x, y);
 
-        // Debounce 500ms para no saturar el servidor
+        // Debounce corto: el servidor solo procesa el frame más reciente de cada canal
         if (timeoutId) clearTimeout(timeoutId);
-        timeoutId = setTimeout(sendRealtimePrediction, 500);
+        timeoutId = setTimeout(sendRealtimePrediction, 100);
+    }
+
+    function showPredictions(json) {
+        if (Array.isArray(json) && json.length > 0) {
+            // Ordenar por modelo (MLP primero, CNN después)
+            const predictions = json
+                .sort((a, b) => a.model.localeCompare(b.model))
+                .map(p => {
+                    const conf = (p.confidence ?? 0) * 100;
+                    return `${p.model}: ${p.pred} (${conf.toFixed(2)}%)`;
+                })
+                .join(" | ");
+            feedbackEl.innerText = `Predicción en tiempo real: ${predictions}`;
+        } else if (json && json.error) {
+            feedbackEl.innerText = `Error: ${json.error}`;
+        } else {
+            feedbackEl.innerText = "Predicción no disponible";
+        }
+    }
+
+    // --- Canal persistente: frames por POST, predicciones por Server-Sent Events ---
+    // Si el canal falla (503 por límite o desactivado, caída, frame a otro worker) se cierra
+    // para no ocupar un hilo del servidor y la página sigue con la vía HTTP
+    let source = null;
+    let channel = null;
+    let seq = 0;
+    let lastShownSeq = -1;
+
+    function closeChannel() {
+        if (source) source.close();
+        source = null;
+        channel = null;
+    }
+
+    function openChannel() {
+        if (!window.EventSource) return;
+        source = new EventSource("/realtime/stream");
+        source.addEventListener("ready", (e) => {
+            channel = JSON.parse(e.data).channel;
+        });
+        source.addEventListener("prediction", (e) => {
+            const msg = JSON.parse(e.data);
+            if (msg.seq < lastShownSeq) return;  // respuesta de un trazo ya superado
+            lastShownSeq = msg.seq;
+            showPredictions(msg.error ? { error: msg.error } : msg.predictions);
+        });
+        source.onerror = closeChannel;
     }
 
     async function sendRealtimePrediction() {
-        const dataURL = canvas.toDataURL("image/png");
         try {
-            const res = await fetch("/predict", {
-                method: "POST",
-                headers: { "Content-Type": "application/json" },
-                body: JSON.stringify({ image: dataURL })
-            });
-            const json = await res.json();
-
-            if (Array.isArray(json) && json.length > 0) {
-                // Ordenar por modelo (MLP primero, CNN después)
-                const predictions = json
-                    .sort((a, b) => a.model.localeCompare(b.model))
-                    .map(p => {
-                        const conf = (p.confidence ?? 0) * 100;
-                        return `${p.model}: ${p.pred} (${conf.toFixed(2)}%)`;
-                    })
-                    .join(" | ");
-                feedbackEl.innerText = `Predicción en tiempo real: ${predictions}`;
-            } else if (json.error) {
-                feedbackEl.innerText = `Error: ${json.error}`;
-            } else {
-                feedbackEl.innerText = "Predicción no disponible";
+            if (channel) {
+                const res = await window.sendCanvasFrame(canvas, channel, seq++);
+                if (res.status !== 404) return;
+                closeChannel();  // canal caducado o en otro worker
             }
+            // Píxeles 28x28 crudos (ver pixels.js), sin guardar en el historial
+            showPredictions(await window.predictCanvasPixels(canvas, false));
         } catch (err) {
             feedbackEl.innerText = `Error conexión: ${err.message}`;
         }
     }
 
+    openChannel();
+
     // Botón para limpiar canvas y feedback
     document.getElementById("clear-canvas").addEventListener("click", () => {
         clearCanvas();
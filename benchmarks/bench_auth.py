@@ -0,0 +1,101 @@
+# benchmarks/bench_auth.py
+"""
+Coste del hash de contraseñas y throughput de login según PASSWORD_HASH_METHOD.
+
+Por cada método (--methods) mide generar y comprobar un hash, y después lanza
+--concurrency clientes contra POST /login en un servidor local (werkzeug multihilo
+en este proceso) con un almacén de usuarios nuevo de --users cuentas. También mide
+una petición con sesión (GET /profile) para ver el coste de leer la sesión del servidor.
+
+Uso:
+    python benchmarks/bench_auth.py --methods scrypt:32768:8:1 scrypt:16384:8:1 pbkdf2:sha256:600000
+"""
+import os
+import time
+import argparse
+import tempfile
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from common import latency_summary, time_calls, peak_rss_mb, write_report
+from bench_endpoints import start_server, session_cookie
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    # El login correcto responde 302: se mide solo esa respuesta
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def run_clients(make_request, iterations: int, concurrency: int) -> dict:
+    def timed(i):
+        t0 = time.perf_counter()
+        make_request(i)
+        return (time.perf_counter() - t0) * 1000.0
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        samples = list(pool.map(timed, range(iterations)))
+    elapsed = time.perf_counter() - started
+    return {'throughput_rps': round(iterations / elapsed, 2), 'latency': latency_summary(samples)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--methods', nargs='+', default=['scrypt:32768:8:1', 'scrypt:16384:8:1',
+                                                         'pbkdf2:sha256:600000', 'pbkdf2:sha256:100000'])
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--iterations', type=int, default=200, help='Logins por método')
+    parser.add_argument('--hash-iterations', type=int, default=10)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--output', help='Fichero JSON de salida')
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    os.environ['PREDICTIONS_DB'] = os.path.join(tmp_dir, 'bench.db')
+    os.environ['USERS_DB'] = os.path.join(tmp_dir, 'users.db')
+    from app.app import app
+    from utils.user_store import UserStore
+
+    server, base = start_server(app)
+    opener = urllib.request.build_opener(NoRedirect)
+    results = {}
+    for method in args.methods:
+        hashed = generate_password_hash('secreto', method)
+        store = UserStore(os.path.join(tmp_dir, f"users-{method.replace(':', '_')}.db"), method)
+        for i in range(args.users):
+            store.create_user(f'user{i}', f'pass{i}')
+        app.extensions['user_store'] = store
+
+        def login(i):
+            body = urllib.parse.urlencode({'username': f'user{i % args.users}', 'password': f'pass{i % args.users}'})
+            try:
+                opener.open(base + '/login', data=body.encode(), timeout=120).read()
+            except urllib.error.HTTPError as e:
+                if e.code != 302:
+                    raise
+
+        cookie = session_cookie(app, 'user0')
+
+        def profile(i):
+            req = urllib.request.Request(base + '/profile', headers={'Cookie': cookie})
+            urllib.request.urlopen(req, timeout=30).read()
+
+        results[method] = {
+            'hash': latency_summary(time_calls(lambda: generate_password_hash('secreto', method), args.hash_iterations, 1)),
+            'verify': latency_summary(time_calls(lambda: check_password_hash(hashed, 'secreto'), args.hash_iterations, 1)),
+            'login': run_clients(login, args.iterations, args.concurrency),
+            'session_request': run_clients(profile, args.iterations, args.concurrency),
+            'peak_rss_mb': peak_rss_mb(),
+        }
+    server.shutdown()
+    write_report('auth', {'session_backend': app.config['SESSION_BACKEND'], 'concurrency': args.concurrency,
+                          'methods': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+# benchmarks/bench_endpoints.py
+"""
+Latencia y throughput de los endpoints de Flask con historiales sintéticos.
+
+Por cada tamaño de historial (--history-sizes) se usa un usuario con ese número de
+predicciones sintéticas y se miden /history, /stats, /stats/summary y /export;
+/predict (canvas base64) y /predict_batch (multipart de N PNG 28x28) se miden con
+un usuario aparte. Cada caso se ejecuta con el test client de Flask y contra un
+servidor local real (werkzeug multihilo en este proceso, --concurrency clientes).
+
+El almacén se puede reutilizar entre ejecuciones con --db: solo se siembra lo que falte.
+
+Uso:
+    python benchmarks/bench_endpoints.py --history-sizes 1000 100000
+    python benchmarks/bench_endpoints.py --history-sizes 1000000 --db /tmp/bench.db --output endpoints.json
+"""
+import io
+import os
+import sys
+import time
+import base64
+import random
+import argparse
+import tempfile
+import threading
+import urllib.request
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageDraw
+
+from common import latency_summary, peak_rss_mb, write_report
+
+SEED_CHUNK = 5000
+
+
+def synthetic_records(user_id: str, n: int, offset: int = 0):
+    """
+    Genera `n` predicciones sintéticas de un usuario, una por minuto desde 2024-01-01.
+    """
+    rng = random.Random(offset)
+    origin = datetime(2024, 1, 1)
+    for i in range(offset, offset + n):
+        yield {
+            'time': (origin + timedelta(minutes=i)).isoformat(),
+            'user': user_id,
+            'filename': None,
+            'pred': rng.randrange(10),
+            'confidence': round(rng.random(), 4),
+            'model': 'MLP' if i % 2 == 0 else 'CNN',
+        }
+
+
+def seed_history(store, user_id: str, size: int):
+    existing = store.user_summary(user_id)['total']
+    if existing >= size:
+        return 0
+    records = synthetic_records(user_id, size - existing, offset=existing)
+    while True:
+        chunk = [rec for _, rec in zip(range(SEED_CHUNK), records)]
+        if not chunk:
+            break
+        store.append_many(chunk)
+    return size - existing
+
+
+def synthetic_digit(rng: random.Random, size: int):
+    img = Image.new('L', (size, size), 0)
+    draw = ImageDraw.Draw(img)
+    points = [(rng.uniform(0.2, 0.8) * size, rng.uniform(0.2, 0.8) * size) for _ in range(4)]
+    draw.line(points, fill=255, width=max(2, size // 14))
+    buf = io.BytesIO()
+    img.save(buf, format='PNG')
+    return buf.getvalue()
+
+
+def start_server(app):
+    from werkzeug.serving import make_server
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def session_cookie(app, user_id: str) -> str:
+    # Cookie de sesión de un usuario logueado, con cualquier backend de sesiones
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user'] = user_id
+    name = app.config.get('SESSION_COOKIE_NAME', 'session')
+    return f"{name}={client.get_cookie(name).value}"
+
+
+def run_test_client(make_request, iterations: int, warmup: int) -> dict:
+    for i in range(warmup):
+        make_request(i)
+    samples = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        make_request(warmup + i)
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    elapsed = time.perf_counter() - started
+    return {'throughput_rps': round(iterations / elapsed, 2), 'latency': latency_summary(samples),
+            'peak_rss_mb': peak_rss_mb()}
+
+
+def run_server(make_request, iterations: int, warmup: int, concurrency: int) -> dict:
+    for i in range(warmup):
+        make_request(i)
+
+    def timed(i):
+        t0 = time.perf_counter()
+        make_request(warmup + i)
+        return (time.perf_counter() - t0) * 1000.0
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        samples = list(pool.map(timed, range(iterations)))
+    elapsed = time.perf_counter() - started
+    return {'throughput_rps': round(iterations / elapsed, 2), 'latency': latency_summary(samples),
+            'peak_rss_mb': peak_rss_mb(), 'concurrency': concurrency}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--history-sizes', type=int, nargs='+', default=[1000, 100000])
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--export-iterations', type=int, default=3, help='Iteraciones de /export (lee el historial entero)')
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=16, help='PNG por petición a /predict_batch')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--modes', nargs='+', default=['test_client', 'server'], choices=['test_client', 'server'])
+    parser.add_argument('--db', help='Almacén SQLite a usar (y reutilizar); por defecto uno temporal')
+    parser.add_argument('--output', help='Fichero JSON de salida')
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    os.environ['PREDICTIONS_DB'] = args.db or os.path.join(tmp_dir, 'bench.db')
+    os.environ['USERS_DB'] = os.path.join(tmp_dir, 'users.db')
+    from app.app import app, prediction_store, persistence_queue
+
+    rss_start = peak_rss_mb()
+    seeding = {}
+    for size in args.history_sizes:
+        started = time.perf_counter()
+        added = seed_history(prediction_store, f'bench-{size}', size)
+        seeding[str(size)] = {'added': added, 'seconds': round(time.perf_counter() - started, 2)}
+
+    rng = random.Random(0)
+    n_canvas = args.iterations + args.warmup
+    canvases = ['data:image/png;base64,' + base64.b64encode(synthetic_digit(rng, 280)).decode() for _ in range(n_canvas)]
+    digits = [synthetic_digit(rng, 28) for _ in range(args.batch_size)]
+
+    # ---------------- Casos: (endpoint, usuario, iteraciones, petición con test client, petición HTTP) ----------------
+    def tc_get(path):
+        return lambda client, i: client.get(path).get_data()
+
+    def tc_predict(client, i):
+        return client.post('/predict', json={'image': canvases[i % n_canvas]}).get_data()
+
+    def tc_batch(client, i):
+        files = [(io.BytesIO(png), f'{k}.png') for k, png in enumerate(digits)]
+        return client.post('/predict_batch', data={'files': files}, content_type='multipart/form-data').get_data()
+
+    def http_get(path):
+        return lambda base, cookie, i: urllib.request.urlopen(
+            urllib.request.Request(base + path, headers={'Cookie': cookie}), timeout=300).read()
+
+    def http_predict(base, cookie, i):
+        body = ('{"image": "%s"}' % canvases[i % n_canvas]).encode()
+        req = urllib.request.Request(base + '/predict', data=body,
+                                     headers={'Cookie': cookie, 'Content-Type': 'application/json'})
+        return urllib.request.urlopen(req, timeout=60).read()
+
+    boundary = 'benchboundary'
+    multipart = b''.join(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="files"; filename="{k}.png"\r\n'
+        f'Content-Type: image/png\r\n\r\n'.encode() + png + b'\r\n'
+        for k, png in enumerate(digits)) + f'--{boundary}--\r\n'.encode()
+
+    def http_batch(base, cookie, i):
+        req = urllib.request.Request(base + '/predict_batch', data=multipart,
+                                     headers={'Cookie': cookie, 'Content-Type': f'multipart/form-data; boundary={boundary}'})
+        return urllib.request.urlopen(req, timeout=60).read()
+
+    cases = [('/predict', 'bench-writer', args.iterations, tc_predict, http_predict),
+             ('/predict_batch', 'bench-writer', max(1, args.iterations // 4), tc_batch, http_batch)]
+    for size in args.history_sizes:
+        user = f'bench-{size}'
+        for path, iterations in (('/history?limit=50', args.iterations),
+                                 ('/stats', args.iterations),
+                                 ('/stats/summary', args.iterations),
+                                 ('/export', args.export_iterations)):
+            cases.append((f'{path} [{size}]', user, iterations, tc_get(path), http_get(path)))
+
+    server, base = start_server(app) if 'server' in args.modes else (None, None)
+    results = {}
+    for name, user, iterations, tc_request, http_request in cases:
+        warmup = min(args.warmup, iterations)
+        results[name] = {}
+        if 'test_client' in args.modes:
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess['user'] = user
+            results[name]['test_client'] = run_test_client(lambda i: tc_request(client, i), iterations, warmup)
+        if server is not None:
+            cookie = session_cookie(app, user)
+            results[name]['server'] = run_server(lambda i: http_request(base, cookie, i), iterations, warmup,
+                                                 args.concurrency)
+        persistence_queue.flush(30)
+        print(f"✅ {name}: {results[name]}", file=sys.stderr, flush=True)
+    if server is not None:
+        server.shutdown()
+
+    write_report('endpoints', {
+        'history_sizes': args.history_sizes,
+        'seeding': seeding,
+        'rss_before_mb': rss_start,
+        'peak_rss_mb': peak_rss_mb(),
+        'endpoints': results,
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
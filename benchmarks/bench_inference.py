@@ -0,0 +1,67 @@
+# benchmarks/bench_inference.py
+"""
+Latencia por imagen (batch de 1) de cada backend de inferencia para el MLP y la CNN.
+
+Uso:
+    python benchmarks/bench_inference.py --iterations 500 --output inference.json
+"""
+import os
+import argparse
+
+import numpy as np
+
+from common import BASE_DIR, latency_summary, time_calls, write_report
+
+from utils.inference_engine import InferenceEngine, INFERENCE_BACKENDS
+
+DEFAULT_MODELS = {
+    'MLP': [os.path.join(BASE_DIR, 'models', 'mnist_compiled_model.keras')],
+    'CNN': [os.path.join(BASE_DIR, 'models', 'cnn_model.keras'),
+            os.path.join(BASE_DIR, 'notebooks', 'models', 'cnn_model.keras')],
+}
+
+
+def find_model(candidates):
+    return next((p for p in candidates if os.path.exists(p)), None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=300)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--backends', nargs='+', default=list(INFERENCE_BACKENDS))
+    parser.add_argument('--mlp-path', default=find_model(DEFAULT_MODELS['MLP']))
+    parser.add_argument('--cnn-path', default=find_model(DEFAULT_MODELS['CNN']))
+    parser.add_argument('--output', help='Fichero JSON de salida')
+    args = parser.parse_args()
+
+    from tensorflow import keras
+
+    rng = np.random.default_rng(0)
+    inputs = {
+        'MLP': (args.mlp_path, rng.random((1, 784), dtype=np.float32)),
+        'CNN': (args.cnn_path, rng.random((1, 28, 28, 1), dtype=np.float32)),
+    }
+
+    results = {}
+    for name, (path, x) in inputs.items():
+        if not path or not os.path.exists(path):
+            results[name] = {'error': 'modelo no encontrado'}
+            continue
+        model = keras.models.load_model(path, compile=False, safe_mode=False)
+        results[name] = {'path': os.path.relpath(path, BASE_DIR)}
+        for backend in args.backends:
+            if backend == 'numpy':
+                if name != 'MLP':
+                    continue
+                engine = InferenceEngine.from_path(path, 'numpy')
+            else:
+                engine = InferenceEngine(model, backend)
+            samples = time_calls(lambda: engine(x), args.iterations, args.warmup)
+            results[name][backend] = latency_summary(samples)
+
+    write_report('inference', results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+# benchmarks/bench_pixels.py
+"""
+Compara la vía base64 PNG (/predict) con la vía de píxeles crudos (/predict_pixels).
+
+Mide por separado el preprocesado en el servidor y la petición completa a través
+del test client de Flask, con un dígito sintético dibujado en un canvas de 280x280.
+
+Uso:
+    python benchmarks/bench_pixels.py --iterations 300
+"""
+import io
+import os
+import base64
+import argparse
+import tempfile
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from common import latency_summary, time_calls, write_report
+
+
+def synthetic_canvas(size=280):
+    img = Image.new('RGBA', (size, size), (0, 0, 0, 255))
+    draw = ImageDraw.Draw(img)
+    draw.line([(90, 60), (190, 60), (120, 230)], fill=(255, 255, 255, 255), width=15)
+    return img
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=300)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--output', help='Fichero JSON de salida')
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    os.environ.setdefault('PREDICTIONS_DB', os.path.join(tmp_dir, 'bench.db'))
+    os.environ.setdefault('USERS_DB', os.path.join(tmp_dir, 'users.db'))
+    from app.app import app
+    from utils.preprocessing import decode_image, decode_pixel_buffer
+
+    canvas = synthetic_canvas()
+    png = io.BytesIO()
+    canvas.save(png, format='PNG')
+    data_url = 'data:image/png;base64,' + base64.b64encode(png.getvalue()).decode()
+    rgba = np.asarray(canvas).tobytes()
+    gray28 = np.asarray(canvas.convert('L').resize((28, 28), Image.BILINEAR)).tobytes()
+
+    client = app.test_client()
+    cases = {
+        'base64_png': (
+            lambda: decode_image(data_url),
+            lambda: client.post('/predict', json={'image': data_url}),
+        ),
+        'pixels_gray_28x28': (
+            lambda: decode_pixel_buffer(gray28, 28, 28),
+            lambda: client.post('/predict_pixels?width=28&height=28', data=gray28,
+                                content_type='application/octet-stream'),
+        ),
+        'pixels_rgba_280x280': (
+            lambda: decode_pixel_buffer(rgba, 280, 280),
+            lambda: client.post('/predict_pixels?width=280&height=280', data=rgba,
+                                content_type='application/octet-stream'),
+        ),
+    }
+
+    results = {}
+    for name, (preprocess, request) in cases.items():
+        results[name] = {
+            'payload_bytes': len(data_url) if name == 'base64_png' else len(gray28 if '28x28' in name else rgba),
+            'preprocess': latency_summary(time_calls(preprocess, args.iterations, args.warmup)),
+            'request': latency_summary(time_calls(request, args.iterations, args.warmup)),
+        }
+
+    write_report('pixels', results, args.output)
+
+
+if __name__ == '__main__':
+    main()
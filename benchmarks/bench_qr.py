@@ -0,0 +1,88 @@
+# benchmarks/bench_qr.py
+"""
+Tiempo de renderizado de QR según el tamaño del contenido.
+
+Por cada tamaño (--sizes, en caracteres) compara el renderizado anterior
+(qrcode + PilImage módulo a módulo, PNG), el compacto de utils/qr_utils.py en PNG
+y SVG, y un acierto de la caché en memoria. Incluye el HTML de historial de
+generate_qr_from_data con --rows predicciones. Mide también el tamaño de la imagen.
+
+Uso:
+    python benchmarks/bench_qr.py --sizes 50 200 800 1500 --iterations 50
+"""
+import io
+import random
+import string
+import argparse
+
+import qrcode
+
+from common import latency_summary, time_calls, write_report
+from utils.qr_utils import QRCache, render_qr, predictions_html
+
+
+def legacy_png(data: str) -> bytes:
+    # Camino anterior de generate_qr_from_url / generate_qr_from_data
+    qr = qrcode.QRCode(version=None, error_correction=qrcode.constants.ERROR_CORRECT_Q, box_size=8, border=2)
+    qr.add_data(data)
+    qr.make(fit=True)
+    buf = io.BytesIO()
+    qr.make_image(fill_color="black", back_color="white").save(buf, format='PNG')
+    return buf.getvalue()
+
+
+def synthetic_history(n: int) -> list:
+    rng = random.Random(0)
+    return [{'time': f'2024-01-01T00:{i % 60:02d}:00.000000', 'filename': None,
+             'pred': rng.randrange(10), 'confidence': rng.random()} for i in range(n)]
+
+
+def bench_payload(data: str, iterations: int, warmup: int, error_correction: str = 'Q') -> dict:
+    cache = QRCache(max_entries=16)
+    cache.get_or_render(data, 'png', error_correction=error_correction)
+    try:
+        legacy_bytes = len(legacy_png(data))
+    except ValueError as e:
+        # Con corrección Q el contenido puede no caber ni en la versión 40
+        legacy_bytes = None
+        legacy_error = str(e)
+    cases = {
+        'legacy_png': lambda: legacy_png(data),
+        'png': lambda: render_qr(data, 'png', error_correction=error_correction),
+        'svg': lambda: render_qr(data, 'svg', error_correction=error_correction),
+        'cache_hit': lambda: cache.get_or_render(data, 'png', error_correction=error_correction),
+    }
+    result = {'chars': len(data), 'bytes': {
+        'legacy_png': legacy_bytes,
+        'png': len(render_qr(data, 'png', error_correction=error_correction)),
+        'svg': len(render_qr(data, 'svg', error_correction=error_correction)),
+    }}
+    if legacy_bytes is None:
+        del cases['legacy_png']
+        result['legacy_png'] = {'error': legacy_error}
+    for name, fn in cases.items():
+        result[name] = latency_summary(time_calls(fn, iterations, warmup))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50, 200, 800, 1500])
+    parser.add_argument('--rows', type=int, default=20, help='Filas del HTML de generate_qr_from_data')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--output', help='Fichero JSON de salida')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    results = {}
+    for size in args.sizes:
+        data = ''.join(rng.choice(string.ascii_letters + string.digits) for _ in range(size))
+        results[str(size)] = bench_payload(data, args.iterations, args.warmup)
+    html = predictions_html(synthetic_history(args.rows), args.rows)
+    results[f'history_html_{args.rows}'] = bench_payload(html, args.iterations, args.warmup, error_correction='L')
+    write_report('qr', results, args.output)
+
+
+if __name__ == '__main__':
+    main()
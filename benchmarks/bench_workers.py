@@ -0,0 +1,143 @@
+# benchmarks/bench_workers.py
+"""
+Escalado del servidor multiproceso (gunicorn.conf.py) con 1, 2, 4 y 8 workers.
+
+Para cada número de workers arranca gunicorn, calienta, lanza `--clients` clientes
+concurrentes contra /predict_pixels durante `--duration` segundos y mide peticiones
+por segundo, latencias y memoria por worker (RSS y PSS, que reparte las páginas
+compartidas por copy-on-write entre los procesos que las usan). Solo Linux.
+
+Uso:
+    python benchmarks/bench_workers.py --workers 1 2 4 8 --duration 20
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import json
+import threading
+import subprocess
+import urllib.request
+
+from common import BASE_DIR, latency_summary, write_report
+
+
+def read_memory_mb(pid: int) -> dict:
+    """
+    RSS y PSS (MB) de un proceso según /proc/<pid>/smaps_rollup.
+    """
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as fh:
+        for line in fh:
+            key, _, rest = line.partition(':')
+            if key in ('Rss', 'Pss'):
+                values[key.lower() + '_mb'] = round(int(rest.split()[0]) / 1024, 2)
+    return values
+
+
+def child_pids(pid: int) -> list:
+    pids = []
+    for task in os.listdir(f'/proc/{pid}/task'):
+        with open(f'/proc/{pid}/task/{task}/children') as fh:
+            pids.extend(int(p) for p in fh.read().split())
+    return pids
+
+
+def wait_ready(url: str, timeout: float = 120.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=2).read()
+            return
+        except OSError:
+            time.sleep(0.25)
+    raise RuntimeError(f"El servidor no respondió en {timeout}s")
+
+
+def load(url: str, body: bytes, clients: int, duration: float) -> dict:
+    samples, errors = [], [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client():
+        local = []
+        while time.monotonic() < stop_at:
+            req = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/octet-stream'})
+            t0 = time.perf_counter()
+            try:
+                urllib.request.urlopen(req, timeout=30).read()
+                local.append((time.perf_counter() - t0) * 1000.0)
+            except OSError:
+                with lock:
+                    errors[0] += 1
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': len(samples),
+        'errors': errors[0],
+        'rps': round(len(samples) / elapsed, 2),
+        'latency': latency_summary(samples),
+    }
+
+
+def run(n_workers: int, args) -> dict:
+    port = args.port
+    base = f'http://127.0.0.1:{port}'
+    tmp_dir = tempfile.mkdtemp()
+    env = dict(os.environ,
+               SERVE_WORKERS=str(n_workers),
+               SERVE_THREADS=str(args.threads),
+               SERVE_BIND=f'127.0.0.1:{port}',
+               PREDICTIONS_DB=os.path.join(tmp_dir, 'bench.db'),
+               USERS_DB=os.path.join(tmp_dir, 'users.db'))
+    proc = subprocess.Popen([sys.executable, '-m', 'gunicorn', 'app.app:app'], cwd=BASE_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(base + '/models/status')
+        # Deja que cada worker cargue los modelos Keras antes de medir
+        time.sleep(args.settle)
+        with urllib.request.urlopen(base + '/models/status', timeout=10) as resp:
+            status = json.load(resp)
+        url = base + '/predict_pixels?width=28&height=28&persist=0'
+        body = bytes(784)
+        load(url, body, args.clients, min(3.0, args.duration))
+        result = load(url, body, args.clients, args.duration)
+        workers = [read_memory_mb(pid) for pid in child_pids(proc.pid)]
+        # Modelos servidos (con su backend): el resultado depende de cuáles hay en models/
+        result['models'] = {name: st['backend'] for name, st in status.items() if st.get('available')}
+        result['master'] = read_memory_mb(proc.pid)
+        result['workers'] = workers
+        result['pss_per_worker_mb'] = round(sum(w['pss_mb'] for w in workers) / max(len(workers), 1), 2)
+        result['pss_total_mb'] = round(result['master']['pss_mb'] + sum(w['pss_mb'] for w in workers), 2)
+        return result
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=15.0)
+    parser.add_argument('--settle', type=float, default=10.0, help='Segundos de espera tras arrancar')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--output', help='Fichero JSON de salida')
+    args = parser.parse_args()
+
+    results = {str(n): run(n, args) for n in args.workers}
+    write_report('workers', results, args.output)
+
+
+if __name__ == '__main__':
+    main()
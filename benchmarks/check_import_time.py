@@ -0,0 +1,115 @@
+# benchmarks/check_import_time.py
+"""
+Presupuesto de tiempo de importación de los módulos de la app (python -X importtime).
+
+Cada objetivo se importa en un proceso nuevo con -X importtime: se toma su tiempo
+acumulado (el mínimo de --repeat ejecuciones, la primera calienta la caché de disco)
+y se comprueba que no carga librerías pesadas (gráficos, scikit-learn, Firebase,
+TensorFlow). Además se simula un worker que solo sirve /predict_pixels y se comprueba
+que tampoco carga librerías de gráficos ni de la nube. Sale con código 1 si algo falla.
+
+Uso:
+    python benchmarks/check_import_time.py
+    python benchmarks/check_import_time.py --budget-scale 2    # máquinas lentas
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+from common import BASE_DIR, write_report
+
+# Presupuesto (ms) de importación por módulo
+BUDGETS_MS = {
+    'utils.analysis': 50,
+    'utils.firebase_utils': 50,
+    'utils.qr_utils': 300,
+    'utils.datasets': 300,
+    'app.app': 1500,
+}
+PLOTTING_MODULES = ('matplotlib', 'seaborn', 'sklearn', 'scipy', 'pandas')
+CLOUD_MODULES = ('firebase_admin', 'google.cloud', 'grpc')
+HEAVY_MODULES = PLOTTING_MODULES + CLOUD_MODULES + ('tensorflow', 'keras')
+
+SERVE_SNIPPET = """
+import sys, json
+from app.app import app
+client = app.test_client()
+response = client.post('/predict_pixels?width=28&height=28&persist=0', data=bytes(784),
+                       content_type='application/octet-stream')
+assert response.status_code == 200, response.status_code
+print(json.dumps(sorted(sys.modules)))
+"""
+
+
+def loaded(modules, prefixes) -> list:
+    return sorted(m for m in modules if any(m == p or m.startswith(p + '.') for p in prefixes))
+
+
+def run_python(args, env) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable] + args, cwd=BASE_DIR, env=env, capture_output=True, text=True, check=True)
+
+
+def import_time_ms(stderr: str, module: str) -> float:
+    """
+    Tiempo acumulado (ms) de `module` en la salida de -X importtime.
+    """
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line.split('|')
+        if name.strip() == module:
+            return int(cumulative) / 1000.0
+    raise ValueError(f"{module} no aparece en la salida de -X importtime")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modules', nargs='+', default=list(BUDGETS_MS))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--budget-scale', type=float, default=1.0, help='Multiplica todos los presupuestos')
+    parser.add_argument('--output', help='Fichero JSON de salida')
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    env = dict(os.environ,
+               PYTHONPATH=BASE_DIR,
+               PREDICTIONS_DB=os.path.join(tmp_dir, 'bench.db'),
+               USERS_DB=os.path.join(tmp_dir, 'users.db'),
+               MODEL_WARMUP='0')
+    results, failures = {}, []
+    for module in args.modules:
+        code = f'import sys, json, {module}; print(json.dumps(sorted(sys.modules)))'
+        times, modules = [], []
+        for _ in range(args.repeat):
+            proc = run_python(['-X', 'importtime', '-c', code], env)
+            times.append(import_time_ms(proc.stderr, module))
+            modules = json.loads(proc.stdout.strip().splitlines()[-1])
+        budget = BUDGETS_MS.get(module, float('inf')) * args.budget_scale
+        heavy = loaded(modules, HEAVY_MODULES)
+        results[module] = {'import_ms': round(min(times), 2), 'budget_ms': budget, 'heavy_modules': heavy}
+        if min(times) > budget:
+            failures.append(f"{module}: {min(times):.1f} ms > {budget:.0f} ms")
+        if heavy:
+            failures.append(f"{module} carga {', '.join(heavy)}")
+
+    # Worker que solo predice: importa la app y sirve una petición
+    proc = run_python(['-c', SERVE_SNIPPET], env)
+    modules = json.loads(proc.stdout.strip().splitlines()[-1])
+    forbidden = loaded(modules, PLOTTING_MODULES + CLOUD_MODULES)
+    results['serve_predict'] = {'forbidden_modules': forbidden, 'modules_loaded': len(modules)}
+    if forbidden:
+        failures.append(f"/predict_pixels carga {', '.join(forbidden)}")
+
+    write_report('import_time', {'modules': results, 'failures': failures}, args.output)
+    for failure in failures:
+        print(f"❌ {failure}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+    print("✅ Tiempos de importación dentro del presupuesto", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
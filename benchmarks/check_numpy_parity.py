@@ -0,0 +1,61 @@
+# benchmarks/check_numpy_parity.py
+"""
+Comprueba que el MLP NumPy (utils/mlp_numpy.py) reproduce las salidas del modelo Keras.
+
+Compara probabilidades y clase predicha sobre el test set de MNIST (o entradas
+aleatorias con --random) en float32 y float16. Sale con código 1 si se supera la tolerancia.
+
+Uso:
+    python benchmarks/check_numpy_parity.py --samples 2000
+"""
+import os
+import sys
+import argparse
+
+import numpy as np
+
+from common import BASE_DIR, write_report
+
+from utils.mlp_numpy import MLP
+
+TOLERANCES = {'float32': 1e-4, 'float16': 2e-2}
+
+
+def load_inputs(samples, random):
+    if random:
+        return np.random.default_rng(0).random((samples, 784), dtype=np.float32)
+    from tensorflow.keras.datasets import mnist
+    (_, _), (x_test, _) = mnist.load_data()
+    return x_test[:samples].reshape(-1, 784).astype(np.float32) / 255.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model-path', default=os.path.join(BASE_DIR, 'models', 'mnist_compiled_model.keras'))
+    parser.add_argument('--samples', type=int, default=1000)
+    parser.add_argument('--random', action='store_true', help='Usar entradas aleatorias en vez de MNIST')
+    parser.add_argument('--output', help='Fichero JSON de salida')
+    args = parser.parse_args()
+
+    from tensorflow import keras
+
+    x = load_inputs(args.samples, args.random)
+    reference = keras.models.load_model(args.model_path, compile=False, safe_mode=False)(x, training=False).numpy()
+
+    results, ok = {}, True
+    for dtype_name, dtype in (('float32', np.float32), ('float16', np.float16)):
+        out = MLP.from_keras(args.model_path, dtype=dtype).predict(x)
+        max_abs = float(np.abs(out - reference).max())
+        results[dtype_name] = {
+            'max_abs_diff': max_abs,
+            'argmax_agreement': float((out.argmax(axis=1) == reference.argmax(axis=1)).mean()),
+            'tolerance': TOLERANCES[dtype_name],
+        }
+        ok = ok and max_abs <= TOLERANCES[dtype_name]
+
+    write_report('numpy_parity', results, args.output)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
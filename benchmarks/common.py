@@ -0,0 +1,82 @@
+# benchmarks/common.py
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+
+import numpy as np
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+
+def latency_summary(samples_ms) -> dict:
+    """
+    Resume una lista de latencias (ms) en p50/p95/p99, media y máximo.
+    """
+    arr = np.asarray(samples_ms, dtype=np.float64)
+    if arr.size == 0:
+        return {'n': 0}
+    return {
+        'n': int(arr.size),
+        'mean_ms': round(float(arr.mean()), 4),
+        'p50_ms': round(float(np.percentile(arr, 50)), 4),
+        'p95_ms': round(float(np.percentile(arr, 95)), 4),
+        'p99_ms': round(float(np.percentile(arr, 99)), 4),
+        'max_ms': round(float(arr.max()), 4),
+    }
+
+
+def time_calls(fn, iterations: int, warmup: int = 5) -> list:
+    """
+    Ejecuta `fn()` `warmup` veces sin medir y devuelve la latencia (ms) de cada una de las siguientes.
+    """
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    return samples
+
+
+def peak_rss_mb() -> float:
+    """
+    Pico de memoria residente del proceso en MB.
+    """
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 2)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return 'unknown'
+
+
+def write_report(name: str, results, output: str = None) -> dict:
+    """
+    Añade metadatos (commit, máquina) a los resultados y los imprime/guarda como JSON.
+    """
+    report = {
+        'benchmark': name,
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, 'w', encoding='utf-8') as fh:
+            fh.write(text)
+    print(text)
+    return report
@@ -0,0 +1,69 @@
+# gunicorn.conf.py
+"""
+Servidor de producción con varios procesos (workers gthread).
+
+Uso (desde la raíz del proyecto, que gunicorn añade a sys.path):
+    gunicorn app.app:app
+    SERVE_WORKERS=4 SERVE_THREADS=8 gunicorn app.app:app
+
+La app se importa una sola vez en el proceso maestro (preload_app): la migración
+del log JSON se hace allí y el MLP NumPy se carga antes del fork, así que todos
+los workers comparten sus pesos por copy-on-write. TensorFlow no debe importarse
+antes del fork, por eso los modelos Keras se cargan en cada worker, después del fork.
+Tampoco se arrancan hilos en el maestro (no sobreviven al fork): la vigilancia de
+models/ y el reentrenamiento se arrancan en cada worker, en post_worker_init.
+"""
+import os
+import gc
+
+bind = os.environ.get('SERVE_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('SERVE_WORKERS', 2))
+threads = int(os.environ.get('SERVE_THREADS', 8))  # cada canal SSE en tiempo real y cada long-poll ocupa un hilo
+worker_class = 'gthread'
+timeout = int(os.environ.get('SERVE_TIMEOUT', 120))
+preload_app = True
+
+# Con MODEL_WARMUP=1 la app cargaría TensorFlow en el maestro: aquí se carga por worker
+os.environ['MODEL_WARMUP'] = '0'
+
+# Canales SSE en tiempo real: viven en un solo worker, así que con varios se desactivan (el navegador
+# usa /predict_pixels); con uno, como mucho una cuarta parte de los hilos queda ocupada por ellos
+if workers > 1:
+    os.environ.setdefault('REALTIME_SSE', '0')
+os.environ.setdefault('REALTIME_MAX_STREAMS', str(max(1, threads // 4)))
+
+
+def _registry():
+    from app.app import model_registry
+    return model_registry
+
+
+def when_ready(server):
+    # Maestro, con la app ya importada y antes de crear los workers
+    registry = _registry()
+    shared = []
+    for name, status in registry.status().items():
+        if status['backend'] == 'numpy' and status['available']:
+            # Solo los pesos: el hilo que vigila models/ se arranca en cada worker
+            registry.preload(name)
+            shared.append(name)
+    server.log.info("Modelos compartidos entre workers: %s", shared or 'ninguno')
+    # Los objetos creados hasta aquí no los recorrerá el GC en los workers (no se copian sus páginas)
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    # Modelos Keras: uno por worker, en segundo plano para no retrasar la primera petición
+    registry = _registry()
+    registry.start_watching()
+    per_worker = [name for name, status in registry.status().items() if status['backend'] != 'numpy']
+    registry.warm_up(names=per_worker, background=True)
+    # Reentrenamiento (FINETUNE=1): con un solo worker en su propio hilo; con varios cada uno
+    # entrenaría y publicaría por su cuenta, así que se usa app/finetune.py en un proceso aparte
+    from app.app import fine_tuner
+    if fine_tuner is not None:
+        if worker.cfg.workers == 1:
+            fine_tuner.start()
+        else:
+            worker.log.warning("FINETUNE=1 con %d workers: el reentrenamiento no se arranca, usar app/finetune.py",
+                               worker.cfg.workers)
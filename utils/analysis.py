@@ -1,14 +1,22 @@
 # utils/analysis.py
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sklearn.metrics import confusion_matrix, classification_report
-import numpy as np
+# matplotlib, seaborn y scikit-learn se importan dentro de cada función: importar este
+# módulo (p. ej. desde app/evaluate_models.py) no carga ninguna librería de gráficos.
 import io
 
+def _pyplot():
+    """
+    Importa pyplot con el backend sin pantalla Agg (servidores, workers y CLIs sin display).
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
 def compute_confusion(y_true, y_pred, labels=None):
     """
     Calcula la matriz de confusión.
     """
+    from sklearn.metrics import confusion_matrix
     cm = confusion_matrix(y_true, y_pred, labels=labels)
     return cm
 
@@ -16,6 +24,8 @@ def plot_confusion_matrix(cm, labels=None):
     """
     Genera un heatmap de la matriz de confusión.
     """
+    plt = _pyplot()
+    import seaborn as sns
     plt.figure(figsize=(8,6))
     sns.heatmap(cm, annot=True, fmt='d', xticklabels=labels, yticklabels=labels, cmap='Blues')
     plt.ylabel('Actual')
@@ -31,6 +41,7 @@ def print_classification_report(y_true, y_pred, labels=None):
     """
     Retorna el reporte de clasificación tipo precision, recall y f1-score.
     """
+    from sklearn.metrics import classification_report
     report = classification_report(y_true, y_pred, labels=labels, output_dict=True)
     return report
 
@@ -39,6 +50,7 @@ def plot_training_history(history):
     history: objeto retornado por model.fit()
     Retorna figura matplotlib de accuracy y loss
     """
+    plt = _pyplot()
     plt.figure(figsize=(10,4))
 
     # Accuracy
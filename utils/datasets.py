@@ -0,0 +1,229 @@
+# utils/datasets.py
+import os
+import json
+import hashlib
+from datetime import datetime
+
+import numpy as np
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DATASET_CACHE_DIR = os.environ.get('DATASET_CACHE_DIR', os.path.join(BASE_DIR, 'data', 'cache'))
+IMAGE_SHAPE = (28, 28)
+
+
+class MemmapDataset:
+    """
+    Dataset de dígitos guardado como .npy uint8 (N, 28, 28) + etiquetas uint8 (N,),
+    abierto en modo memmap: solo se leen de disco las filas de cada batch.
+
+    El índice (<nombre>.json) guarda número de muestras, origen y recuento por etiqueta.
+    """
+
+    def __init__(self, name: str, cache_dir: str = DATASET_CACHE_DIR):
+        self.name = name
+        paths = cache_paths(name, cache_dir)
+        with open(paths['index'], 'r') as f:
+            self.index = json.load(f)
+        self.x = np.load(paths['x'], mmap_mode='r')
+        self.y = np.load(paths['y'], mmap_mode='r')
+
+    def __len__(self):
+        return int(self.x.shape[0])
+
+    def iter_batches(self, batch_size: int = 256, shuffle: bool = False, seed: int = None,
+                     flat: bool = False, one_hot: bool = False, reuse_buffer: bool = True):
+        """
+        Genera batches (x float32 normalizado a [0, 1], y) leyendo del memmap.
+
+        Params:
+        - flat: x con forma (B, 784) para el MLP; si no, (B, 28, 28)
+        - one_hot: y como float32 (B, 10) en lugar de enteros
+        - reuse_buffer: x se escribe siempre en el mismo buffer (válido hasta el siguiente
+          batch); usar False si el consumidor guarda los batches (p. ej. model.fit con cola)
+        """
+        n = len(self)
+        order = np.random.default_rng(seed).permutation(n) if shuffle else None
+        buf = np.empty((batch_size,) + IMAGE_SHAPE, dtype=np.float32) if reuse_buffer else None
+        for start in range(0, n, batch_size):
+            stop = min(start + batch_size, n)
+            if order is None:
+                x_u8, y = self.x[start:stop], np.asarray(self.y[start:stop])
+            else:
+                idx = np.sort(order[start:stop])  # lectura del memmap en orden
+                x_u8, y = self.x[idx], self.y[idx]
+            out = buf[:stop - start] if buf is not None else np.empty(x_u8.shape, dtype=np.float32)
+            np.divide(x_u8, 255.0, out=out, dtype=np.float32)
+            x = out.reshape(len(out), -1) if flat else out
+            if one_hot:
+                y = np.eye(10, dtype=np.float32)[y]
+            yield x, y
+
+    def repeat_batches(self, batch_size: int = 32, seed: int = None, **kwargs):
+        """
+        Batches barajados sin fin (una permutación por época), como espera model.fit con steps_per_epoch.
+        """
+        kwargs.setdefault('reuse_buffer', False)
+        epoch = 0
+        while True:
+            yield from self.iter_batches(batch_size, shuffle=True,
+                                         seed=None if seed is None else seed + epoch, **kwargs)
+            epoch += 1
+
+    def steps(self, batch_size: int) -> int:
+        return -(-len(self) // batch_size)
+
+
+# ---------------- Caché en disco ----------------
+def cache_paths(name: str, cache_dir: str = DATASET_CACHE_DIR) -> dict:
+    return {
+        'x': os.path.join(cache_dir, f'{name}_x.npy'),
+        'y': os.path.join(cache_dir, f'{name}_y.npy'),
+        'index': os.path.join(cache_dir, f'{name}.json'),
+    }
+
+
+def read_index(name: str, cache_dir: str = DATASET_CACHE_DIR):
+    path = cache_paths(name, cache_dir)['index']
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def write_cache(name: str, count: int, samples, source: str, source_version: str = None,
+                cache_dir: str = DATASET_CACHE_DIR) -> MemmapDataset:
+    """
+    Escribe `count` pares (imagen uint8 28x28, etiqueta) del iterable `samples` en la caché,
+    fila a fila sobre un memmap (sin cargar el conjunto en memoria). El índice se escribe
+    al final, así que una conversión interrumpida no deja una caché válida a medias.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    paths = cache_paths(name, cache_dir)
+    x = np.lib.format.open_memmap(paths['x'] + '.tmp', mode='w+', dtype=np.uint8, shape=(count,) + IMAGE_SHAPE)
+    y = np.lib.format.open_memmap(paths['y'] + '.tmp', mode='w+', dtype=np.uint8, shape=(count,))
+    n = 0
+    for image, label in samples:
+        x[n] = image
+        y[n] = label
+        n += 1
+    x.flush()
+    y.flush()
+    del x, y
+    if n != count:
+        raise ValueError(f"Se esperaban {count} muestras y se leyeron {n}")
+    os.replace(paths['x'] + '.tmp', paths['x'])
+    os.replace(paths['y'] + '.tmp', paths['y'])
+
+    labels = np.load(paths['y'], mmap_mode='r')
+    index = {
+        'name': name,
+        'count': count,
+        'shape': list(IMAGE_SHAPE),
+        'dtype': 'uint8',
+        'source': source,
+        'source_version': source_version,
+        'label_counts': np.bincount(labels, minlength=10).tolist(),
+        'created_at': datetime.utcnow().isoformat(),
+    }
+    tmp_index = paths['index'] + '.tmp'
+    with open(tmp_index, 'w') as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp_index, paths['index'])
+    return MemmapDataset(name, cache_dir)
+
+
+def _source_version(path: str) -> str:
+    st = os.stat(path)
+    return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+
+def _cache_name(prefix: str, path: str) -> str:
+    digest = hashlib.blake2b(os.path.abspath(path).encode(), digest_size=6).hexdigest()
+    return f"{prefix}-{os.path.basename(os.path.normpath(path)).split('.')[0]}-{digest}"
+
+
+# ---------------- Fuentes ----------------
+def mnist_dataset(split: str = 'test', cache_dir: str = DATASET_CACHE_DIR) -> MemmapDataset:
+    """
+    MNIST ('train' o 'test'). La primera vez se descarga con keras.datasets y se
+    convierten ambos splits a la caché; después se abre sin importar TensorFlow.
+    """
+    name = f'mnist-{split}'
+    if read_index(name, cache_dir) is None:
+        from tensorflow.keras.datasets import mnist
+        (x_train, y_train), (x_test, y_test) = mnist.load_data()
+        for split_name, x, y in (('train', x_train, y_train), ('test', x_test, y_test)):
+            write_cache(f'mnist-{split_name}', len(x), zip(x, y), source='keras.datasets.mnist', cache_dir=cache_dir)
+    return MemmapDataset(name, cache_dir)
+
+
+def npz_dataset(path: str, cache_dir: str = DATASET_CACHE_DIR) -> MemmapDataset:
+    """
+    Fichero .npz con x/y (o x_test/y_test): imágenes uint8 (N, 28, 28) o float en [0, 1].
+    Se reconvierte si el fichero cambió.
+    """
+    name = _cache_name('npz', path)
+    version = _source_version(path)
+    index = read_index(name, cache_dir)
+    if index is None or index.get('source_version') != version:
+        with np.load(path) as data:
+            x = data['x' if 'x' in data else 'x_test']
+            y = data['y' if 'y' in data else 'y_test']
+            if x.dtype != np.uint8:
+                x = np.clip(np.rint(np.asarray(x, dtype=np.float32) * 255.0), 0, 255).astype(np.uint8)
+            x = x.reshape((len(x),) + IMAGE_SHAPE)
+            write_cache(name, len(x), zip(x, y), source=os.path.abspath(path), source_version=version,
+                        cache_dir=cache_dir)
+    return MemmapDataset(name, cache_dir)
+
+
+def list_image_dir(path: str) -> list:
+    """
+    [(ruta, etiqueta)] de una carpeta con una subcarpeta por dígito (0/, 1/, ... 9/).
+    """
+    items = []
+    for label in range(10):
+        folder = os.path.join(path, str(label))
+        if os.path.isdir(folder):
+            items.extend((os.path.join(folder, name), label) for name in sorted(os.listdir(folder)))
+    return items
+
+
+def image_dir_dataset(path: str, cache_dir: str = DATASET_CACHE_DIR) -> MemmapDataset:
+    """
+    Carpeta de imágenes etiquetadas por subcarpeta. Las imágenes que no se pueden
+    decodificar se omiten. Se reconvierte si cambia el número o la fecha de los ficheros.
+    """
+    from utils.preprocessing import decode_image
+
+    items = list_image_dir(path)
+    newest = max((os.stat(p).st_mtime_ns for p, _ in items), default=0)
+    version = f"{len(items):x}-{newest:x}"
+    name = _cache_name('dir', path)
+    index = read_index(name, cache_dir)
+    if index is None or index.get('source_version') != version:
+        decoded = []
+        buf = np.empty(IMAGE_SHAPE, dtype=np.float32)
+        for file_path, label in items:
+            try:
+                with open(file_path, 'rb') as fh:
+                    decode_image(fh.read(), IMAGE_SHAPE, out=buf)
+            except Exception:
+                continue
+            decoded.append((np.rint(buf * 255.0).astype(np.uint8), label))
+        write_cache(name, len(decoded), decoded, source=os.path.abspath(path), source_version=version,
+                    cache_dir=cache_dir)
+    return MemmapDataset(name, cache_dir)
+
+
+def open_dataset(spec: str, cache_dir: str = DATASET_CACHE_DIR) -> MemmapDataset:
+    """
+    Abre un dataset a partir de 'mnist' / 'mnist-test' / 'mnist-train', un .npz o una carpeta.
+    """
+    if spec in ('mnist', 'mnist-test'):
+        return mnist_dataset('test', cache_dir)
+    if spec == 'mnist-train':
+        return mnist_dataset('train', cache_dir)
+    if os.path.isdir(spec):
+        return image_dir_dataset(spec, cache_dir)
+    return npz_dataset(spec, cache_dir)
@@ -1,23 +1,68 @@
 # utils/export_utils.py
 import csv
 import io
+import zlib
+from itertools import chain, islice
 
-def export_predictions_to_csv(predictions: list) -> bytes:
+def _union_keys(records) -> list:
     """
-    Recibe una lista de diccionarios con predicciones y devuelve los bytes de un CSV.
+    Unión de claves de todos los registros, en orden de primera aparición.
     """
-    if not predictions:
-        return b''
+    fieldnames = {}
+    for rec in records:
+        for key in rec:
+            fieldnames.setdefault(key, None)
+    return list(fieldnames)
+
+def iter_predictions_csv(predictions, columns=None, lookahead: int = 1000, chunk_rows: int = 500):
+    """
+    Genera el CSV de un iterable de predicciones por trozos (str), sin construirlo entero en memoria.
+
+    Params:
+    - predictions: iterable de diccionarios (puede ser un generador)
+    - columns: lista de columnas a exportar (las demás claves se omiten); por defecto la
+      unión de claves de los primeros `lookahead` registros, y una clave que solo aparezca
+      después lanza ValueError en lugar de perderse. Si se conocen todas las claves de
+      antemano (PredictionStore.columns), pasarlas aquí.
+    - chunk_rows: filas por trozo emitido
+    """
+    predictions = iter(predictions)
+    head = list(islice(predictions, lookahead))
+    if not head:
+        return
+    fieldnames = list(columns) if columns else _union_keys(head)
 
-    # Crear buffer en memoria
-    output = io.StringIO()
-    
-    # Obtener cabeceras del primer diccionario
-    fieldnames = list(predictions[0].keys())
-    writer = csv.DictWriter(output, fieldnames=fieldnames)
-    
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=fieldnames, extrasaction='ignore' if columns else 'raise')
     writer.writeheader()
-    for pred in predictions:
+    rows = 0
+    for pred in chain(head, predictions):
         writer.writerow(pred)
+        rows += 1
+        if rows % chunk_rows == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
 
-    return output.getvalue().encode('utf-8')
+def gzip_chunks(chunks, level: int = 6):
+    """
+    Comprime al vuelo un iterable de trozos (str o bytes) en formato gzip.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 -> cabecera gzip
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export_predictions_to_csv(predictions: list, columns=None) -> bytes:
+    """
+    Recibe una lista de diccionarios con predicciones y devuelve los bytes de un CSV.
+    Las cabeceras son la unión de claves de todos los registros (o `columns`).
+    """
+    if not predictions:
+        return b''
+    columns = columns or _union_keys(predictions)
+    return ''.join(iter_predictions_csv(predictions, columns=columns)).encode('utf-8')
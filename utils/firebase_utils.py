@@ -1,33 +1,68 @@
 # utils/firebase_utils.py
-import firebase_admin
-from firebase_admin import credentials, firestore
+# firebase_admin se importa y el cliente de Firestore se crea en el primer uso (get_db),
+# no al importar el módulo: los procesos que no sincronizan con Firebase no lo cargan.
+# Las predicciones se leen y escriben a través del espejo local de utils/firestore_mirror.py.
 import os
+import threading
 
-# Inicializar Firebase si no está ya inicializado
-if not firebase_admin._apps:
-    cred_path = os.path.join('firebase', 'serviceAccountKey.json')
-    cred = credentials.Certificate(cred_path)
-    firebase_admin.initialize_app(cred)
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+# Ruta de las credenciales, independiente del directorio de trabajo (FIREBASE_CREDENTIALS la cambia)
+CREDENTIALS_PATH = os.environ.get('FIREBASE_CREDENTIALS',
+                                  os.path.join(BASE_DIR, 'firebase', 'serviceAccountkey.json'))
 
-db = firestore.client()
+# Espejo SQLite de las predicciones de Firestore (FIRESTORE_MIRROR_DB lo cambia)
+MIRROR_PATH = os.environ.get('FIRESTORE_MIRROR_DB', os.path.join(BASE_DIR, 'app', 'firestore_mirror.db'))
+
+_db = None
+_db_lock = threading.Lock()
+_mirror = None
+
+def get_db():
+    """
+    Cliente de Firestore compartido; inicializa Firebase la primera vez que se pide.
+    """
+    global _db
+    if _db is None:
+        with _db_lock:
+            if _db is None:
+                import firebase_admin
+                from firebase_admin import credentials, firestore
+                # Inicializar Firebase si no está ya inicializado
+                if not firebase_admin._apps:
+                    cred = credentials.Certificate(CREDENTIALS_PATH)
+                    firebase_admin.initialize_app(cred)
+                _db = firestore.client()
+    return _db
+
+def get_mirror():
+    """
+    Espejo local compartido de las predicciones de Firestore (el cliente se crea al sincronizar).
+    """
+    global _mirror
+    if _mirror is None:
+        with _db_lock:
+            if _mirror is None:
+                from utils.firestore_mirror import FirestoreMirror
+                _mirror = FirestoreMirror(MIRROR_PATH, client=get_db)
+    return _mirror
+
+def __getattr__(name):
+    # Compatibilidad con `from utils.firebase_utils import db`: el cliente se crea al pedirlo
+    if name == 'db':
+        return get_db()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def save_prediction_to_firebase(user_id: str, record: dict):
     """
-    Guarda una predicción en Firestore bajo el usuario especificado.
+    Guarda una predicción en Firestore bajo el usuario especificado (y en el espejo local).
+    Si Firestore no responde queda pendiente y se sube en la siguiente escritura o lectura.
+    Para muchas predicciones, get_mirror().save_many(...) + flush() las sube en lotes de 500.
     """
-    user_ref = db.collection('users').document(user_id)
-    predictions_ref = user_ref.collection('predictions')
-    predictions_ref.add(record)
+    return get_mirror().save(user_id, record)
 
 def get_user_predictions(user_id: str, limit: int = 50):
     """
-    Obtiene las últimas `limit` predicciones de un usuario.
+    Obtiene las últimas `limit` predicciones de un usuario desde el espejo local,
+    que antes trae de Firestore solo los documentos nuevos si su sincronización caducó.
     """
-    user_ref = db.collection('users').document(user_id)
-    predictions_ref = (
-        user_ref.collection('predictions')
-        .order_by('time', direction=firestore.Query.DESCENDING)
-        .limit(limit)
-    )
-    results = [doc.to_dict() for doc in predictions_ref.stream()]
-    return results
+    return get_mirror().get_user_predictions(user_id, limit)
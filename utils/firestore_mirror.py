@@ -0,0 +1,362 @@
+# utils/firestore_mirror.py
+import os
+import json
+import time
+import uuid
+import logging
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+# Máximo de operaciones por WriteBatch de Firestore
+FIRESTORE_BATCH_LIMIT = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mirror_predictions (
+    user   TEXT NOT NULL,
+    doc_id TEXT NOT NULL,
+    time   TEXT,
+    data   TEXT NOT NULL,
+    PRIMARY KEY (user, doc_id)
+);
+CREATE INDEX IF NOT EXISTS idx_mirror_user_time ON mirror_predictions (user, time);
+-- Escrituras locales aún no confirmadas en Firestore
+CREATE TABLE IF NOT EXISTS mirror_outbox (
+    seq    INTEGER PRIMARY KEY AUTOINCREMENT,
+    user   TEXT NOT NULL,
+    doc_id TEXT NOT NULL,
+    data   TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_doc ON mirror_outbox (user, doc_id);
+-- Hasta dónde se ha sincronizado cada usuario
+CREATE TABLE IF NOT EXISTS mirror_sync (
+    user      TEXT PRIMARY KEY,
+    last_time TEXT,
+    synced_at REAL NOT NULL
+);
+"""
+
+
+class FirestoreMirror:
+    """
+    Espejo local (SQLite, indexado por usuario y tiempo) de las predicciones de cada
+    usuario en Firestore (users/<user>/predictions).
+
+    - Lecturas: se sirven del espejo; si la última sincronización del usuario tiene más
+      de `sync_interval` segundos, antes se traen de Firestore solo los documentos con
+      `time` posterior al último visto (con un margen de `overlap_s` segundos para no
+      perder los que llegan con el reloj algo atrasado).
+    - Escrituras: se guardan en el espejo y en una cola local (outbox) y se suben en
+      WriteBatch de hasta 500 operaciones. El id del documento se genera aquí, así que
+      reintentar un lote no duplica nada.
+    - Conflictos: un documento se identifica por su id. Lo que llega de Firestore
+      sustituye a la copia local salvo que esta tenga una escritura pendiente de subir,
+      que es más reciente y acabará sobrescribiendo la remota.
+
+    `client` es un cliente de Firestore (real, el del emulador con FIRESTORE_EMULATOR_HOST
+    o InMemoryFirestore) o una función que lo devuelve; por defecto utils.firebase_utils.get_db.
+    También sirve como destino (sink) de WriteBehindQueue.
+    """
+    name = 'firestore-mirror'
+
+    def __init__(self, db_path: str, client=None, sync_interval: float = 30.0, overlap_s: float = 5.0,
+                 batch_size: int = FIRESTORE_BATCH_LIMIT):
+        self.db_path = db_path
+        self._client = client
+        self.sync_interval = sync_interval
+        self.overlap_s = overlap_s
+        self.batch_size = max(1, min(int(batch_size), FIRESTORE_BATCH_LIMIT))
+        self._local = threading.local()
+        self._flush_lock = threading.Lock()
+        self._stats = {'reads': 0, 'syncs': 0, 'sync_errors': 0, 'fetched': 0, 'conflicts_kept_local': 0,
+                       'commits': 0, 'pushed': 0, 'push_errors': 0}
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._connect().executescript(_SCHEMA)
+
+    # ---------------- Conexiones ----------------
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Devuelve la conexión del hilo actual (una por hilo y por proceso).
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @property
+    def client(self):
+        if self._client is None:
+            from utils.firebase_utils import get_db
+            self._client = get_db
+        return self._client() if callable(self._client) else self._client
+
+    def _collection(self, user_id: str):
+        return self.client.collection('users').document(user_id).collection('predictions')
+
+    # ---------------- Escritura ----------------
+    def save_many(self, records: list) -> list:
+        """
+        Guarda predicciones en el espejo y las deja pendientes de subir. Devuelve sus ids.
+        """
+        rows = []
+        for record in records:
+            record = dict(record)
+            doc_id = record.pop('doc_id', None) or uuid.uuid4().hex
+            rows.append((record['user'], doc_id, record.get('time'), json.dumps(record, ensure_ascii=False)))
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany('INSERT OR REPLACE INTO mirror_predictions (user, doc_id, time, data) VALUES (?, ?, ?, ?)', rows)
+            conn.executemany('INSERT INTO mirror_outbox (user, doc_id, data) VALUES (?, ?, ?)',
+                             [(user, doc_id, data) for user, doc_id, _, data in rows])
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        return [row[1] for row in rows]
+
+    def save(self, user_id: str, record: dict, flush: bool = True) -> str:
+        doc_id = self.save_many([dict(record, user=user_id)])[0]
+        if flush:
+            self.flush()
+        return doc_id
+
+    def pending(self) -> int:
+        return self._connect().execute('SELECT COUNT(*) FROM mirror_outbox').fetchone()[0]
+
+    def flush(self) -> int:
+        """
+        Sube las escrituras pendientes en lotes de hasta `batch_size` operaciones y devuelve
+        cuántas se confirmaron. Si un lote falla, él y los siguientes quedan pendientes.
+        """
+        pushed = 0
+        with self._flush_lock:
+            conn = self._connect()
+            while True:
+                rows = conn.execute('SELECT seq, user, doc_id, data FROM mirror_outbox ORDER BY seq LIMIT ?',
+                                    (self.batch_size,)).fetchall()
+                if not rows:
+                    break
+                try:
+                    batch = self.client.batch()
+                    for _, user, doc_id, data in rows:
+                        batch.set(self._collection(user).document(doc_id), json.loads(data))
+                    batch.commit()
+                except Exception as e:
+                    self._stats['push_errors'] += 1
+                    logger.warning("⚠️ No se pudieron subir %d predicciones a Firestore: %s", len(rows), e)
+                    break
+                conn.execute('DELETE FROM mirror_outbox WHERE seq <= ?', (rows[-1][0],))
+                self._stats['commits'] += 1
+                self._stats['pushed'] += len(rows)
+                pushed += len(rows)
+        return pushed
+
+    def write_batch(self, records: list):
+        # Interfaz de destino de WriteBehindQueue. No se lanza excepción si Firestore falla:
+        # los registros ya están en la outbox y un reintento de la cola los duplicaría
+        self.save_many(records)
+        self.flush()
+
+    # ---------------- Sincronización ----------------
+    def _sync_state(self, user_id: str):
+        row = self._connect().execute('SELECT last_time, synced_at FROM mirror_sync WHERE user = ?', (user_id,)).fetchone()
+        return (row[0], row[1]) if row else (None, 0.0)
+
+    def _since(self, last_time: str):
+        # Margen hacia atrás sobre el último `time` visto; los repetidos se deduplican por id
+        if last_time is None:
+            return None
+        try:
+            return (datetime.fromisoformat(last_time) - timedelta(seconds=self.overlap_s)).isoformat()
+        except ValueError:
+            return last_time
+
+    def sync_user(self, user_id: str) -> int:
+        """
+        Sube lo pendiente y trae de Firestore los documentos del usuario posteriores a la
+        última sincronización. Devuelve cuántos documentos llegaron.
+        """
+        self.flush()
+        last_time, _ = self._sync_state(user_id)
+        query = self._collection(user_id)
+        since = self._since(last_time)
+        if since is not None:
+            query = query.where('time', '>=', since)
+        docs = [(doc.id, doc.to_dict()) for doc in query.order_by('time').stream()]
+
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            pending = {row[0] for row in conn.execute('SELECT doc_id FROM mirror_outbox WHERE user = ?', (user_id,))}
+            rows = []
+            for doc_id, data in docs:
+                if doc_id in pending:
+                    self._stats['conflicts_kept_local'] += 1
+                    continue
+                data = dict(data, user=user_id)
+                rows.append((user_id, doc_id, data.get('time'), json.dumps(data, ensure_ascii=False)))
+            conn.executemany('INSERT OR REPLACE INTO mirror_predictions (user, doc_id, time, data) VALUES (?, ?, ?, ?)', rows)
+            times = [data.get('time') for _, data in docs if data.get('time')]
+            newest = max(times + ([last_time] if last_time else []), default=None)
+            conn.execute('INSERT OR REPLACE INTO mirror_sync (user, last_time, synced_at) VALUES (?, ?, ?)',
+                         (user_id, newest, time.time()))
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        self._stats['syncs'] += 1
+        self._stats['fetched'] += len(docs)
+        return len(docs)
+
+    # ---------------- Lectura ----------------
+    def get_user_predictions(self, user_id: str, limit: int = 50, refresh: bool = None) -> list:
+        """
+        Últimas `limit` predicciones del usuario (de la más reciente a la más antigua),
+        leídas del espejo. refresh=None sincroniza solo si la última sincronización caducó;
+        si Firestore no responde se sirve lo que haya en el espejo.
+        """
+        if refresh is None:
+            refresh = time.time() - self._sync_state(user_id)[1] >= self.sync_interval
+        if refresh:
+            try:
+                self.sync_user(user_id)
+            except Exception as e:
+                self._stats['sync_errors'] += 1
+                logger.warning("⚠️ No se pudo sincronizar con Firestore (%s), se sirve el espejo local: %s", user_id, e)
+        self._stats['reads'] += 1
+        rows = self._connect().execute(
+            'SELECT doc_id, data FROM mirror_predictions WHERE user = ? ORDER BY time DESC LIMIT ?', (user_id, int(limit))
+        ).fetchall()
+        return [dict(json.loads(data), doc_id=doc_id) for doc_id, data in rows]
+
+    def stats(self) -> dict:
+        conn = self._connect()
+        return dict(self._stats,
+                    documents=conn.execute('SELECT COUNT(*) FROM mirror_predictions').fetchone()[0],
+                    users=conn.execute('SELECT COUNT(*) FROM mirror_sync').fetchone()[0],
+                    pending=self.pending())
+
+
+# ---------------- Cliente Firestore en memoria ----------------
+class _Snapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class _DocumentRef:
+    def __init__(self, db, path):
+        self._db = db
+        self.path = path
+        self.id = path[-1]
+
+    def collection(self, name):
+        return _Query(self._db, self.path + (name,))
+
+    def set(self, data):
+        self._db._write(self.path, data)
+
+    def get(self):
+        return _Snapshot(self.id, self._db._docs.get(self.path))
+
+
+class _Query:
+    def __init__(self, db, path, filters=(), order=None, limit=None):
+        self._db = db
+        self.path = path
+        self._filters = filters
+        self._order = order
+        self._limit = limit
+
+    _OPS = {'==': lambda a, b: a == b, '>': lambda a, b: a > b, '>=': lambda a, b: a >= b,
+            '<': lambda a, b: a < b, '<=': lambda a, b: a <= b}
+
+    def document(self, doc_id=None):
+        return _DocumentRef(self._db, self.path + (doc_id or uuid.uuid4().hex,))
+
+    def add(self, data):
+        ref = self.document()
+        ref.set(data)
+        return None, ref
+
+    def where(self, field, op, value):
+        return _Query(self._db, self.path, self._filters + ((field, self._OPS[op], value),), self._order, self._limit)
+
+    def order_by(self, field, direction='ASCENDING'):
+        return _Query(self._db, self.path, self._filters, (field, direction == 'DESCENDING'), self._limit)
+
+    def limit(self, n):
+        return _Query(self._db, self.path, self._filters, self._order, n)
+
+    def stream(self):
+        self._db.reads += 1
+        depth = len(self.path) + 1
+        docs = [(path[-1], data) for path, data in list(self._db._docs.items())
+                if len(path) == depth and path[:-1] == self.path]
+        for field, op, value in self._filters:
+            docs = [(i, d) for i, d in docs if d.get(field) is not None and op(d.get(field), value)]
+        if self._order is not None:
+            field, reverse = self._order
+            docs = [(i, d) for i, d in docs if d.get(field) is not None]
+            docs.sort(key=lambda item: item[1][field], reverse=reverse)
+        if self._limit is not None:
+            docs = docs[:self._limit]
+        for doc_id, data in docs:
+            yield _Snapshot(doc_id, data)
+
+
+class _WriteBatch:
+    def __init__(self, db):
+        self._db = db
+        self._ops = []
+
+    def set(self, ref, data):
+        self._ops.append((ref.path, dict(data)))
+
+    def commit(self):
+        if len(self._ops) > FIRESTORE_BATCH_LIMIT:
+            raise ValueError(f"Un WriteBatch admite como mucho {FIRESTORE_BATCH_LIMIT} operaciones")
+        if self._db.fail_commits:
+            self._db.fail_commits -= 1
+            raise ConnectionError("Fallo simulado de Firestore")
+        for path, data in self._ops:
+            self._db._docs[path] = data
+        self._db.commits += 1
+        self._ops = []
+
+
+class InMemoryFirestore:
+    """
+    Cliente falso de Firestore en memoria con el subconjunto que usa la app: colecciones
+    y documentos anidados, set/add, where/order_by/limit/stream y WriteBatch (máx. 500).
+    Cuenta lecturas (`reads`) y commits, y `fail_commits` hace fallar los N siguientes commits.
+    """
+
+    def __init__(self):
+        self._docs = {}
+        self.reads = 0
+        self.commits = 0
+        self.writes = 0
+        self.fail_commits = 0
+
+    def _write(self, path, data):
+        self._docs[path] = dict(data)
+        self.writes += 1
+
+    def collection(self, name):
+        return _Query(self, (name,))
+
+    def batch(self):
+        return _WriteBatch(self)
@@ -0,0 +1,67 @@
+# utils/inference_engine.py
+import numpy as np
+
+# Backends disponibles:
+# - predict:  model.predict(...) de Keras (crea data adapter y step function en cada llamada)
+# - direct:   model(x, training=False), llamada directa en modo eager
+# - function: tf.function compilada una sola vez con batch variable
+# - numpy:    utils.mlp_numpy.MLP con los pesos Dense importados del .keras (solo MLP, sin TensorFlow)
+INFERENCE_BACKENDS = ('predict', 'direct', 'function', 'numpy')
+DEFAULT_BACKEND = 'function'
+
+
+class InferenceEngine:
+    """
+    Envoltorio de inferencia sobre un modelo Keras (o un MLP NumPy) con backend seleccionable.
+
+    Se llama como una función: recibe un np.array (N, ...) y devuelve
+    np.array (N, n_clases) en float32.
+    """
+
+    def __init__(self, model, backend: str = DEFAULT_BACKEND):
+        if backend not in INFERENCE_BACKENDS:
+            raise ValueError(f"Backend de inferencia no soportado: {backend} (opciones: {', '.join(INFERENCE_BACKENDS)})")
+        self.model = model
+        self.backend = backend
+        self.version = None  # huella del fichero de origen; la asigna ModelRegistry
+        self._fn = getattr(self, f'_build_{backend}')()
+
+    @classmethod
+    def from_path(cls, model_path: str, backend: str = DEFAULT_BACKEND, dtype=np.float32):
+        """
+        Carga el modelo desde disco con el cargador adecuado al backend.
+        Con backend 'numpy' no se importa TensorFlow.
+        """
+        if backend == 'numpy':
+            from utils.mlp_numpy import MLP
+            return cls(MLP.from_keras(model_path, dtype=dtype), backend)
+        from tensorflow import keras
+        return cls(keras.models.load_model(model_path, compile=False, safe_mode=False), backend)
+
+    def _build_numpy(self):
+        if not hasattr(self.model, 'layers') or not hasattr(self.model, 'input_dim'):
+            raise ValueError("El backend 'numpy' necesita un utils.mlp_numpy.MLP (ver InferenceEngine.from_path)")
+        return self.model.predict
+
+    def _build_predict(self):
+        model = self.model
+        return lambda x: model.predict(x, verbose=0)
+
+    def _build_direct(self):
+        model = self.model
+        return lambda x: model(x, training=False).numpy()
+
+    def _build_function(self):
+        import tensorflow as tf
+
+        model = self.model
+        # Firma fija con batch variable: se traza una sola vez para cualquier tamaño de batch
+        input_shape = [None] + list(model.inputs[0].shape[1:])
+        compiled = tf.function(
+            lambda x: model(x, training=False),
+            input_signature=[tf.TensorSpec(input_shape, tf.float32)],
+        )
+        return lambda x: compiled(tf.convert_to_tensor(x, dtype=tf.float32)).numpy()
+
+    def __call__(self, x) -> np.ndarray:
+        return np.asarray(self._fn(np.asarray(x, dtype=np.float32)))
@@ -0,0 +1,176 @@
+# utils/inference_scheduler.py
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class MicroBatchScheduler:
+    """
+    Agrupa peticiones de inferencia concurrentes en un único batch por modelo.
+
+    Cada llamada a `submit` encola una muestra; un hilo de fondo junta hasta
+    `max_batch_size` muestras, llama una sola vez a `predict_fn` con el tensor apilado
+    y reparte las filas del resultado a cada llamador a través de su Future.
+    Una muestra que llega sola se procesa enseguida; si al recogerla ya hay otras en
+    cola (peticiones concurrentes, o las que llegaron durante el batch anterior), se
+    espera además a las que lleguen en `max_wait_ms` desde la primera.
+
+    Si `predict_fn` devuelve una tupla (salidas, etiqueta), la etiqueta (p. ej. la
+    versión del modelo que ejecutó el batch) se deja en `future.tag` de cada muestra.
+    """
+
+    def __init__(self, predict_fn, max_batch_size: int = 32, max_wait_ms: float = 5.0, name: str = 'model'):
+        """
+        Params:
+        - predict_fn: función que recibe un np.array (N, ...) y devuelve (N, n_clases),
+          o una tupla ((N, n_clases), etiqueta)
+        - max_batch_size: máximo de muestras por llamada a predict_fn
+        - max_wait_ms: tiempo máximo que espera la primera muestra a que se llene un batch ya empezado
+        - name: nombre para logs/estadísticas
+        """
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._submit_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._worker = None
+        self._pid = None
+        self._stats = {'batches': 0, 'requests': 0, 'max_batch_size_seen': 0,
+                       'queue_ms_total': 0.0, 'queue_ms_max': 0.0, 'predict_ms_total': 0.0}
+
+    # ---------------- Hilo de fondo ----------------
+    def _ensure_worker(self):
+        # El hilo se arranca en el primer uso (y de nuevo tras un fork)
+        if self._worker is not None and self._pid == os.getpid() and self._worker.is_alive():
+            return
+        with self._submit_lock:
+            if self._worker is None or self._pid != os.getpid() or not self._worker.is_alive():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._worker = threading.Thread(target=self._run, name=f'batcher-{self.name}', daemon=True)
+                self._worker.start()
+
+    def _drain(self, batch):
+        # Lo que ya está en cola; con el lock de submit_many, un grupo entra entero
+        with self._submit_lock:
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+    def _collect(self):
+        first = self._queue.get()
+        batch = [first]
+        self._drain(batch)
+        if len(batch) == 1:
+            # Petición sola (servidor sin carga): no se espera a nadie
+            return batch
+        # Hay un batch formándose: se espera a más muestras como mucho max_wait desde la primera
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get_nowait() if remaining <= 0 else self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            # Cualquier fallo (también al repartir las salidas) se entrega a los llamadores:
+            # si el hilo muriera, sus Future y los de las peticiones siguientes no se resolverían nunca
+            try:
+                outputs = self.predict_fn(np.stack([item[0] for item in batch]))
+                tag = None
+                if isinstance(outputs, tuple):
+                    outputs, tag = outputs
+                outputs = np.asarray(outputs)
+                n_outputs = len(outputs) if outputs.ndim else 0
+                if n_outputs != len(batch):
+                    raise ValueError(f"{self.name}: predict_fn devolvió {n_outputs} salidas para un batch de {len(batch)}")
+                finished = time.perf_counter()
+                for i, (_, fut, _) in enumerate(batch):
+                    fut.tag = tag
+                    fut.set_result(outputs[i])
+            except Exception as e:
+                for _, fut, _ in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            self._record(batch, started, finished)
+
+    def _record(self, batch, started, finished):
+        queue_ms = [(started - item[2]) * 1000.0 for item in batch]
+        with self._stats_lock:
+            st = self._stats
+            st['batches'] += 1
+            st['requests'] += len(batch)
+            st['max_batch_size_seen'] = max(st['max_batch_size_seen'], len(batch))
+            st['queue_ms_total'] += sum(queue_ms)
+            st['queue_ms_max'] = max(st['queue_ms_max'], max(queue_ms))
+            st['predict_ms_total'] += (finished - started) * 1000.0
+
+    # ---------------- API ----------------
+    def submit(self, x) -> Future:
+        """
+        Encola una muestra (sin dimensión de batch) y devuelve un Future con su salida.
+        """
+        return self.submit_many([x])[0]
+
+    def submit_many(self, xs) -> list:
+        """
+        Encola varias muestras de forma contigua para que compartan batch.
+        """
+        self._ensure_worker()
+        now = time.perf_counter()
+        futures = [Future() for _ in xs]
+        with self._submit_lock:
+            for x, fut in zip(xs, futures):
+                self._queue.put((x, fut, now))
+        return futures
+
+    def predict_many(self, xs, timeout: float = None, with_tags: bool = False):
+        """
+        Versión síncrona de `submit_many`: devuelve un array (N, n_clases),
+        o (array, [etiqueta por muestra]) con with_tags=True.
+        """
+        futures = self.submit_many(xs)
+        outputs = np.stack([fut.result(timeout=timeout) for fut in futures])
+        if with_tags:
+            return outputs, [getattr(fut, 'tag', None) for fut in futures]
+        return outputs
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        """
+        Estadísticas acumuladas de tamaño de batch y tiempo en cola.
+        """
+        with self._stats_lock:
+            st = dict(self._stats)
+        batches = st['batches'] or 1
+        requests = st['requests'] or 1
+        return {
+            'name': self.name,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'batches': st['batches'],
+            'requests': st['requests'],
+            'avg_batch_size': round(st['requests'] / batches, 3),
+            'max_batch_size_seen': st['max_batch_size_seen'],
+            'avg_queue_ms': round(st['queue_ms_total'] / requests, 3),
+            'max_queue_ms': round(st['queue_ms_max'], 3),
+            'avg_predict_ms': round(st['predict_ms_total'] / batches, 3),
+            'queue_depth': self.queue_depth(),
+        }
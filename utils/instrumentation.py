@@ -0,0 +1,167 @@
+# utils/instrumentation.py
+import time
+import threading
+
+# Límites superiores (segundos) de los buckets de los histogramas de spans
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class Histogram:
+    """
+    Histograma acumulativo al estilo Prometheus (buckets fijos, suma y cuenta).
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # el último es +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        """
+        Devuelve (buckets acumulados [(le, n)], suma, cuenta).
+        """
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative, running = [], 0
+        for le, n in zip(self.buckets + (float('inf'),), counts):
+            running += n
+            cumulative.append((le, running))
+        return cumulative, total, count
+
+
+class _NullSpan:
+    # Span que no hace nada: es lo que se devuelve con la instrumentación desactivada
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('_owner', '_name', '_labels', '_started')
+
+    def __init__(self, owner, name, labels):
+        self._owner = owner
+        self._name = name
+        self._labels = labels
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._owner.record(self._name, time.perf_counter() - self._started, self._labels)
+        return False
+
+
+class Instrumentation:
+    """
+    Spans de tiempo del camino caliente (decodificación, redimensionado, inferencia, ...).
+
+    Desactivada por defecto: `span()` devuelve un contexto vacío compartido y no se mide nada.
+    Al activarla, cada span termina llamando a los hooks registrados con
+    (nombre, segundos, etiquetas); el hook por defecto alimenta histogramas por span.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.enabled = False
+        self.buckets = buckets
+        self._histograms = {}
+        self._hooks = [self._observe]
+        self._lock = threading.Lock()
+
+    def enable(self, enabled: bool = True):
+        self.enabled = enabled
+
+    def add_hook(self, hook):
+        """
+        Registra un hook(nombre, segundos, etiquetas) que se llama al cerrar cada span.
+        """
+        self._hooks.append(hook)
+
+    def span(self, name: str, **labels):
+        """
+        Contexto que mide lo que tarda el bloque:  with instrumentation.span('decode'): ...
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(self, name, labels)
+
+    def record(self, name: str, seconds: float, labels: dict = None):
+        for hook in self._hooks:
+            hook(name, seconds, labels or {})
+
+    def _observe(self, name, seconds, labels):
+        key = (name, tuple(sorted(labels.items())))
+        hist = self._histograms.get(key)
+        if hist is None:
+            with self._lock:
+                hist = self._histograms.setdefault(key, Histogram(self.buckets))
+        hist.observe(seconds)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def render_prometheus(self, gauges: dict = None, prefix: str = 'mnist') -> str:
+        """
+        Texto en formato de exposición de Prometheus: un histograma `<prefix>_span_seconds`
+        (etiquetado por span y etiquetas propias) y un gauge por cada entrada de `gauges`,
+        cuyo valor es un número o un dict {etiquetas(tupla de pares): número}.
+        """
+        lines = []
+        metric = f'{prefix}_span_seconds'
+        lines.append(f'# HELP {metric} Duración de los spans instrumentados.')
+        lines.append(f'# TYPE {metric} histogram')
+        with self._lock:
+            items = sorted(self._histograms.items())
+        for (name, labels), hist in items:
+            base = [('span', name)] + list(labels)
+            buckets, total, count = hist.snapshot()
+            for le, n in buckets:
+                le_text = '+Inf' if le == float('inf') else repr(le)
+                lines.append(f'{metric}_bucket{_labels(base + [("le", le_text)])} {n}')
+            lines.append(f'{metric}_sum{_labels(base)} {total:.6f}')
+            lines.append(f'{metric}_count{_labels(base)} {count}')
+
+        for name, value in (gauges or {}).items():
+            gauge = f'{prefix}_{name}'
+            lines.append(f'# TYPE {gauge} gauge')
+            if isinstance(value, dict):
+                for labels, v in value.items():
+                    lines.append(f'{gauge}{_labels(list(labels))} {_number(v)}')
+            else:
+                lines.append(f'{gauge} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(pairs) -> str:
+    if not pairs:
+        return ''
+    escaped = ('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs)
+    return '{' + ','.join(escaped) + '}'
+
+
+def _number(value) -> str:
+    return repr(float(value)) if value is not None else 'NaN'
+
+
+# Instancia compartida por la app y los módulos de utils
+instrumentation = Instrumentation()
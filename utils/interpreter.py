@@ -1,9 +1,8 @@
 # app/app.py
 from flask import Flask, render_template, request, jsonify
 import numpy as np
-from tensorflow.keras.datasets import mnist
-from tensorflow.keras.utils import to_categorical
 from utils.interpreter import compile_model
+from utils.datasets import mnist_dataset
 
 app = Flask(__name__)
 
@@ -14,14 +13,14 @@ architecture = "Dense(128, relu) -> Dense(64, relu) -> Dense(10, softmax)"
 input_dim = 28*28
 model = compile_model(architecture, input_dim)
 
-# Cargar MNIST y entrenar rápido para demo
-(x_train, y_train), (x_test, y_test) = mnist.load_data()
-x_train = x_train.reshape(-1, 28*28) / 255.0
-y_train = to_categorical(y_train, 10)
-x_test = x_test.reshape(-1, 28*28) / 255.0
-y_test = to_categorical(y_test, 10)
-
-model.fit(x_train, y_train, epochs=3, batch_size=32, validation_data=(x_test, y_test))
+# Entrenar rápido para demo con batches leídos de la caché memmap de MNIST
+train_set = mnist_dataset('train')
+test_set = mnist_dataset('test')
+batch_size = 32
+model.fit(train_set.repeat_batches(batch_size, flat=True, one_hot=True),
+          steps_per_epoch=train_set.steps(batch_size), epochs=3,
+          validation_data=test_set.repeat_batches(batch_size, flat=True, one_hot=True),
+          validation_steps=test_set.steps(batch_size))
 
 # ------------------------------
 # 2️⃣ Rutas HTML
@@ -1,4 +1,7 @@
 # utils/mlp_numpy.py
+import io
+import json
+import zipfile
 import numpy as np
 
 def sigmoid(x):
@@ -7,41 +10,131 @@ def sigmoid(x):
 def relu(x):
     return np.maximum(0, x)
 
-class Neuron:
-    def __init__(self, n_inputs, activation='sigmoid'):
-        self.weights = np.random.randn(n_inputs) * 0.01
-        self.bias = 0.0
-        self.activation_name = activation
-        if activation == 'sigmoid':
-            self.activation = sigmoid
-        elif activation == 'relu':
-            self.activation = relu
-        else:
-            raise ValueError(f"Unsupported activation: {activation}")
+def linear(x):
+    return x
 
-    def forward(self, x):
-        z = np.dot(x, self.weights) + self.bias
-        return self.activation(z)
+def softmax(x):
+    # Se resta el máximo por fila para evitar overflow en exp
+    z = np.exp(x - x.max(axis=-1, keepdims=True))
+    return z / z.sum(axis=-1, keepdims=True)
+
+ACTIVATIONS = {
+    'sigmoid': sigmoid,
+    'relu': relu,
+    'linear': linear,
+    'softmax': softmax,
+}
+
+SUPPORTED_DTYPES = (np.float32, np.float16)
 
 class Layer:
-    def __init__(self, n_inputs, n_neurons, activation='sigmoid'):
-        self.neurons = [Neuron(n_inputs, activation) for _ in range(n_neurons)]
+    """
+    Capa densa: una matriz de pesos (n_inputs, n_neurons) y un vector de bias.
+    El forward de todo el batch es un único GEMM: activation(X @ W + b).
+    """
+    def __init__(self, n_inputs, n_neurons, activation='sigmoid', weights=None, bias=None, dtype=np.float32):
+        if activation not in ACTIVATIONS:
+            raise ValueError(f"Unsupported activation: {activation}")
+        if weights is None:
+            weights = np.random.randn(n_inputs, n_neurons) * 0.01
+        if bias is None:
+            bias = np.zeros(n_neurons)
+        weights = np.asarray(weights)
+        bias = np.asarray(bias)
+        if weights.shape != (n_inputs, n_neurons) or bias.shape != (n_neurons,):
+            raise ValueError(f"Pesos con forma {weights.shape}/{bias.shape}, se esperaba ({n_inputs}, {n_neurons})/({n_neurons},)")
+        self.activation_name = activation
+        self.activation = ACTIVATIONS[activation]
+        self.weights = np.ascontiguousarray(weights, dtype=dtype)
+        self.bias = np.ascontiguousarray(bias, dtype=dtype)
 
     def forward(self, X):
-        return np.array([neuron.forward(X) for neuron in self.neurons]).T
+        z = X @ self.weights
+        z += self.bias
+        return self.activation(z)
 
 class MLP:
-    def __init__(self, layer_sizes, activations):
+    def __init__(self, layer_sizes, activations, dtype=np.float32):
         """
         layer_sizes: lista de tamaño de capas, ej. [784, 128, 64, 10]
         activations: lista de activaciones para cada capa (excepto entrada)
+        dtype: np.float32 o np.float16 para pesos y cálculo
         """
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"Unsupported dtype: {dtype}")
+        self.dtype = dtype
         self.layers = []
         for i in range(1, len(layer_sizes)):
-            self.layers.append(Layer(layer_sizes[i-1], layer_sizes[i], activations[i-1]))
+            self.layers.append(Layer(layer_sizes[i-1], layer_sizes[i], activations[i-1], dtype=dtype))
+
+    @classmethod
+    def from_weights(cls, dense_layers, dtype=np.float32):
+        """
+        Construye el MLP a partir de una lista de (kernel, bias, activation).
+        """
+        mlp = cls([], [], dtype=dtype)
+        for kernel, bias, activation in dense_layers:
+            n_inputs, n_neurons = kernel.shape
+            mlp.layers.append(Layer(n_inputs, n_neurons, activation, kernel, bias, dtype=dtype))
+        return mlp
+
+    @classmethod
+    def from_keras(cls, model_path, dtype=np.float32):
+        """
+        Carga los pesos de las capas Dense de un modelo .keras (sin importar TensorFlow).
+        """
+        return cls.from_weights(load_keras_dense_weights(model_path), dtype=dtype)
+
+    @property
+    def input_dim(self):
+        return self.layers[0].weights.shape[0]
 
     def predict(self, X):
-        out = X
+        """
+        X: array (N, n_inputs) o (n_inputs,). Devuelve (N, n_salidas).
+        En float16 la salida se devuelve en float32 para no perder precisión en el softmax.
+        """
+        out = np.asarray(X, dtype=self.dtype).reshape(-1, self.input_dim)
         for layer in self.layers:
             out = layer.forward(out)
-        return out
+        return out.astype(np.float32, copy=False)
+
+# ---------------- Importar pesos de Keras ----------------
+# Capas sin pesos que no cambian el resultado en inferencia sobre entradas ya aplanadas
+_PASSTHROUGH_LAYERS = ('InputLayer', 'Flatten', 'Dropout')
+
+def load_keras_dense_weights(model_path):
+    """
+    Lee un fichero .keras (Keras 3: zip con config.json + model.weights.h5)
+    y devuelve [(kernel, bias, activation), ...] de sus capas Dense en orden.
+
+    Requiere h5py (ya incluido como dependencia de TensorFlow), pero no TensorFlow.
+    """
+    try:
+        import h5py
+    except ImportError as e:
+        raise ImportError("h5py es necesario para leer los pesos de un modelo .keras") from e
+
+    with zipfile.ZipFile(model_path) as zf:
+        config = json.loads(zf.read('config.json'))
+        weights_blob = zf.read('model.weights.h5')
+
+    layers = config['config']['layers']
+    dense_layers = []
+    with h5py.File(io.BytesIO(weights_blob), 'r') as h5:
+        for layer in layers:
+            class_name = layer['class_name']
+            if class_name in _PASSTHROUGH_LAYERS:
+                continue
+            if class_name != 'Dense':
+                raise ValueError(f"Capa no soportada por el motor NumPy: {class_name}")
+            cfg = layer['config']
+            # Keras 3 guarda los pesos por nombre de capa; si se renombró, usa el nombre automático (dense, dense_1, ...)
+            name = cfg['name'] if cfg['name'] in h5['layers'] else ('dense' if not dense_layers else f'dense_{len(dense_layers)}')
+            variables = h5['layers'][name]['vars']
+            kernel = variables['0'][()]
+            bias = variables['1'][()] if cfg.get('use_bias', True) else np.zeros(kernel.shape[1], dtype=kernel.dtype)
+            dense_layers.append((kernel, bias, cfg.get('activation', 'linear')))
+    if not dense_layers:
+        raise ValueError(f"El modelo {model_path} no contiene capas Dense")
+    return dense_layers
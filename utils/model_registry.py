@@ -0,0 +1,302 @@
+# utils/model_registry.py
+import os
+import sys
+import time
+import logging
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from utils.inference_engine import InferenceEngine
+
+logger = logging.getLogger(__name__)
+
+
+def current_rss_mb() -> float:
+    """
+    Memoria residente actual del proceso en MB (Linux: /proc; resto: pico vía resource).
+    """
+    try:
+        with open('/proc/self/statm') as fh:
+            pages = int(fh.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss está en KB en Linux y en bytes en macOS
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def file_version(path: str):
+    """
+    Huella barata de un fichero de modelo (mtime + tamaño); None si no existe.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+
+class ModelEntry:
+    def __init__(self, name, path, backend, input_shape, override_path=None):
+        self.name = name
+        self.base_path = path
+        self.override_path = override_path
+        self.backend = backend
+        self.input_shape = tuple(input_shape)
+        self.engine = None
+        self.version = None
+        self.checked_at = 0.0
+        self.error = None
+        self.load_time_s = None
+        self.rss_delta_mb = None
+        self.loaded_at = None
+        self.reloads = 0
+        self.reloading = False
+        self.lock = threading.Lock()
+
+    @property
+    def path(self) -> str:
+        # La versión publicada (p. ej. reentrenada) tiene prioridad sobre el fichero original
+        if self.override_path and os.path.exists(self.override_path):
+            return self.override_path
+        return self.base_path
+
+
+class ModelRegistry:
+    """
+    Registro de modelos con carga perezosa.
+
+    Los modelos se cargan (solo para inferencia, sin compilar) la primera vez que
+    se piden con `get`, o en un hilo de fondo con `warm_up`. Hasta entonces no se
+    importa TensorFlow, así que las rutas que no predicen arrancan sin pagar su coste.
+
+    Recarga en caliente: cuando el fichero de un modelo ya cargado cambia (lo detecta
+    `get` o el hilo de `watch`), la nueva versión se carga y calienta en segundo plano
+    y se sustituye de una vez al terminar. Mientras tanto `get` sigue devolviendo el
+    motor anterior, y quien ya lo tiene (un batch en curso) termina con él.
+    Cada motor lleva en `engine.version` la huella del fichero del que se cargó.
+    """
+
+    def __init__(self, check_interval: float = 1.0):
+        """
+        check_interval: cada cuántos segundos, como mucho, se comprueba si el fichero cambió.
+        """
+        self._entries = {}
+        self.check_interval = check_interval
+        self.watch_interval = None
+        self._watcher = None
+        self._watcher_pid = None
+        self._watcher_lock = threading.Lock()
+
+    def register(self, name: str, path: str, backend: str, input_shape, override_path: str = None):
+        """
+        Registra un modelo. input_shape es la forma de una muestra (sin batch),
+        usada para el batch de calentamiento. Si existe `override_path` se sirve ese
+        fichero en lugar de `path` (y al aparecer o cambiar se recarga en caliente).
+        """
+        self._entries[name] = ModelEntry(name, path, backend, input_shape, override_path)
+
+    def names(self) -> list:
+        return list(self._entries)
+
+    def available(self, name: str) -> bool:
+        """
+        True si el modelo está registrado y su fichero existe (no lo carga).
+        """
+        entry = self._entries.get(name)
+        return entry is not None and os.path.exists(entry.path)
+
+    def get(self, name: str):
+        """
+        Devuelve el InferenceEngine del modelo, cargándolo si es la primera vez.
+        Si su fichero cambió en disco lanza la recarga en segundo plano y devuelve
+        la versión actual hasta que la nueva esté lista. Devuelve None si nunca
+        pudo cargarse porque el fichero no existe.
+        """
+        entry = self._entries[name]
+        engine = entry.engine
+        if engine is not None:
+            if self.watch_interval:
+                self._ensure_watcher()
+            elif self._changed_on_disk(entry):
+                self.reload_async(name)
+            return engine
+        engine = self.preload(name)
+        if engine is not None and self.watch_interval:
+            self._ensure_watcher()
+        return engine
+
+    def preload(self, name: str):
+        """
+        Carga el modelo si aún no lo está, sin arrancar el hilo de vigilancia (p. ej. en
+        el maestro de gunicorn antes del fork). Devuelve None si el fichero no existe.
+        """
+        entry = self._entries[name]
+        if entry.engine is None:
+            if not os.path.exists(entry.path):
+                return None
+            with entry.lock:
+                if entry.engine is None:
+                    self._load(entry)
+        return entry.engine
+
+    def reload(self, name: str):
+        """
+        Carga el modelo de nuevo desde su fichero y lo sustituye al terminar; mientras
+        tanto (y si la carga falla) se sigue sirviendo la versión anterior.
+        """
+        entry = self._entries[name]
+        with entry.lock:
+            self._load(entry)
+        return entry.version
+
+    def reload_async(self, name: str):
+        """
+        Lanza `reload` en un hilo de fondo (salvo que ya haya una recarga en curso)
+        y devuelve el hilo, o None si no se lanzó.
+        """
+        entry = self._entries[name]
+        with self._watcher_lock:
+            if entry.reloading:
+                return None
+            entry.reloading = True
+
+        def run():
+            try:
+                self.reload(name)
+            except Exception as e:
+                # Fichero a medio escribir o inválido: se sigue sirviendo la versión anterior
+                logger.warning("⚠️ No se pudo recargar el modelo %s, se mantiene la versión %s: %s", name, entry.version, e)
+            finally:
+                entry.reloading = False
+
+        thread = threading.Thread(target=run, name=f'model-reload-{name}', daemon=True)
+        thread.start()
+        return thread
+
+    # ---------------- Vigilancia de ficheros ----------------
+    def watch(self, interval: float = 2.0):
+        """
+        Vigila los ficheros de los modelos ya cargados cada `interval` segundos desde un
+        hilo de fondo (que se arranca en el primer `get` de cada proceso, también tras un
+        fork) y recarga los que cambien. `get` deja entonces de mirar el disco.
+        """
+        self.watch_interval = interval
+
+    def start_watching(self):
+        """
+        Arranca ya el hilo de vigilancia de este proceso (si se llamó a `watch`), sin
+        esperar al primer `get`.
+        """
+        if self.watch_interval:
+            self._ensure_watcher()
+
+    def _ensure_watcher(self):
+        if self._watcher is not None and self._watcher_pid == os.getpid() and self._watcher.is_alive():
+            return
+        with self._watcher_lock:
+            if self._watcher is None or self._watcher_pid != os.getpid() or not self._watcher.is_alive():
+                self._watcher_pid = os.getpid()
+                self._watcher = threading.Thread(target=self._watch_loop, name='model-watcher', daemon=True)
+                self._watcher.start()
+
+    def _watch_loop(self):
+        while self.watch_interval:
+            time.sleep(self.watch_interval)
+            for name, entry in list(self._entries.items()):
+                if entry.engine is None or entry.reloading:
+                    continue
+                current = file_version(entry.path)
+                if current is not None and current != entry.version:
+                    logger.info("🔄 Nueva versión del modelo %s en disco (%s), recargando", name, current)
+                    self.reload_async(name)
+
+    def _changed_on_disk(self, entry: ModelEntry) -> bool:
+        now = time.monotonic()
+        if now - entry.checked_at < self.check_interval:
+            return False
+        entry.checked_at = now
+        current = file_version(entry.path)
+        return current is not None and current != entry.version
+
+    def version(self, name: str):
+        """
+        Versión (huella del fichero) del modelo cargado, o None si aún no se ha cargado.
+        """
+        return self._entries[name].version
+
+    def input_shape(self, name: str) -> tuple:
+        """
+        Forma de una muestra (sin batch) que espera el modelo.
+        """
+        return self._entries[name].input_shape
+
+    def _load(self, entry: ModelEntry):
+        rss_before = current_rss_mb()
+        started = time.perf_counter()
+        path = entry.path
+        version = file_version(path)
+        try:
+            engine = InferenceEngine.from_path(path, entry.backend)
+            # Una pasada con un batch ficticio: traza la tf.function y reserva buffers
+            engine(np.zeros((1,) + entry.input_shape, dtype=np.float32))
+        except Exception as e:
+            entry.error = str(e)
+            raise
+        entry.load_time_s = round(time.perf_counter() - started, 4)
+        entry.rss_delta_mb = round(current_rss_mb() - rss_before, 2)
+        entry.error = None
+        engine.version = version
+        if entry.engine is not None:
+            entry.reloads += 1
+        entry.version = version
+        entry.checked_at = time.monotonic()
+        entry.loaded_at = datetime.utcnow().isoformat()
+        # Sustitución atómica: las llamadas siguientes a get() ya reciben el motor nuevo
+        entry.engine = engine
+        logger.info("✅ Modelo %s cargado (%s, versión %s) en %ss, +%s MB",
+                    entry.name, entry.backend, version, entry.load_time_s, entry.rss_delta_mb)
+
+    def warm_up(self, names=None, background: bool = True):
+        """
+        Carga los modelos indicados (todos por defecto). En segundo plano devuelve el hilo.
+        """
+        def run():
+            for name in names or self.names():
+                if self.available(name):
+                    try:
+                        self.get(name)
+                    except Exception as e:
+                        logger.warning("⚠️ Error cargando modelo %s: %s", name, e)
+
+        if not background:
+            run()
+            return None
+        thread = threading.Thread(target=run, name='model-warmup', daemon=True)
+        thread.start()
+        return thread
+
+    def status(self) -> dict:
+        """
+        Estado por modelo: si está cargado, tiempo de carga y memoria añadida.
+        """
+        return {
+            name: {
+                'path': entry.path,
+                'base_path': entry.base_path,
+                'backend': entry.backend,
+                'available': os.path.exists(entry.path),
+                'loaded': entry.engine is not None,
+                'version': entry.version,
+                'loaded_at': entry.loaded_at,
+                'reloads': entry.reloads,
+                'reloading': entry.reloading,
+                'load_time_s': entry.load_time_s,
+                'rss_delta_mb': entry.rss_delta_mb,
+                'error': entry.error,
+            }
+            for name, entry in self._entries.items()
+        }
@@ -0,0 +1,216 @@
+# utils/persistence_queue.py
+import os
+import time
+import queue
+import atexit
+import logging
+import threading
+
+from utils.instrumentation import instrumentation
+
+logger = logging.getLogger(__name__)
+
+
+class LocalStoreSink:
+    """
+    Destino local: el almacén SQLite de predicciones (un INSERT por lote en una transacción).
+    """
+    name = 'local'
+
+    def __init__(self, store):
+        self.store = store
+
+    def write_batch(self, records: list):
+        self.store.append_many(records)
+
+
+# Firestore: utils.firestore_mirror.FirestoreMirror también es un destino (espejo local + outbox,
+# subida en WriteBatch de hasta 500 documentos)
+
+
+class WriteBehindQueue:
+    """
+    Cola de escritura diferida: las predicciones se encolan en la petición y un hilo
+    de fondo las escribe por lotes en cada destino (sink).
+
+    La cola está acotada: si se llena, `put` espera hasta `put_timeout` segundos
+    (contrapresión) y, si sigue llena, escribe en el propio hilo para no perder datos.
+    Al salir del proceso se vacía la cola (atexit).
+    """
+
+    def __init__(self, sinks, max_size: int = 10000, batch_size: int = 200,
+                 flush_interval: float = 0.05, put_timeout: float = 1.0, max_retries: int = 3):
+        """
+        Params:
+        - sinks: lista de destinos con método write_batch(records)
+        - max_size: capacidad máxima de la cola
+        - batch_size: máximo de registros por escritura
+        - flush_interval: segundos que se espera a completar un lote tras el primer registro
+        - put_timeout: espera máxima de `put` con la cola llena
+        - max_retries: reintentos por lote y destino antes de descartarlo
+        """
+        self.sinks = list(sinks)
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.max_retries = max_retries
+        self._queue = queue.Queue(maxsize=max_size)
+        self._pending = 0
+        self._cond = threading.Condition()
+        self._worker = None
+        self._pid = None
+        self._closed = False
+        # Los actualizan el hilo de fondo y los hilos de las peticiones (put_many, escritura síncrona)
+        self._counters = {'enqueued': 0, 'written': 0, 'batches': 0, 'failures': 0, 'dropped': 0,
+                          'sync_fallbacks': 0, 'flush_ms_total': 0.0, 'flush_ms_max': 0.0, 'flush_ms_last': 0.0}
+        self._counters_lock = threading.Lock()
+        atexit.register(self.close)
+
+    # ---------------- Hilo de fondo ----------------
+    def _ensure_worker(self):
+        # Se arranca en el primer uso (y de nuevo tras un fork)
+        if self._worker is not None and self._pid == os.getpid() and self._worker.is_alive():
+            return
+        with self._cond:
+            if self._worker is None or self._pid != os.getpid() or not self._worker.is_alive():
+                if self._pid is not None and self._pid != os.getpid():
+                    self._queue = queue.Queue(maxsize=self.max_size)
+                    self._pending = 0
+                self._pid = os.getpid()
+                self._worker = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                if self._closed:
+                    return
+                continue
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get_nowait() if remaining <= 0 else self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+            with self._cond:
+                self._pending -= len(batch)
+                self._cond.notify_all()
+
+    def _count(self, key: str, amount=1):
+        with self._counters_lock:
+            self._counters[key] += amount
+
+    def _write(self, batch: list):
+        """
+        Escribe el lote en cada destino. Cuenta como escrito solo si todos lo guardaron;
+        cada destino que agota los reintentos suma el lote a `dropped`.
+        """
+        started = time.perf_counter()
+        failed_sinks = 0
+        for sink in self.sinks:
+            for attempt in range(self.max_retries):
+                try:
+                    with instrumentation.span('persist_flush', sink=sink.name):
+                        sink.write_batch(batch)
+                    break
+                except Exception as e:
+                    self._count('failures')
+                    if attempt == self.max_retries - 1:
+                        failed_sinks += 1
+                        self._count('dropped', len(batch))
+                        logger.error("⚠️ No se pudieron guardar %d predicciones en '%s': %s", len(batch), sink.name, e)
+                    else:
+                        time.sleep(0.05 * (2 ** attempt))
+        elapsed = (time.perf_counter() - started) * 1000.0
+        with self._counters_lock:
+            c = self._counters
+            if not failed_sinks:
+                c['written'] += len(batch)
+            c['batches'] += 1
+            c['flush_ms_total'] += elapsed
+            c['flush_ms_last'] = elapsed
+            c['flush_ms_max'] = max(c['flush_ms_max'], elapsed)
+
+    # ---------------- API ----------------
+    def put(self, record: dict):
+        self.put_many([record])
+
+    def put_many(self, records: list):
+        """
+        Encola registros para escritura diferida (aplica contrapresión si la cola está llena).
+        """
+        if self._closed:
+            self._write(list(records))
+            return
+        self._ensure_worker()
+        with self._cond:
+            self._pending += len(records)
+        for i, record in enumerate(records):
+            try:
+                self._queue.put(record, timeout=self.put_timeout)
+                self._count('enqueued')
+            except queue.Full:
+                # Cola saturada: escribir el resto en este hilo antes que perderlo
+                rest = list(records[i:])
+                self._count('sync_fallbacks')
+                self._write(rest)
+                with self._cond:
+                    self._pending -= len(rest)
+                    self._cond.notify_all()
+                return
+
+    def write(self, records: list):
+        """
+        Escribe en este hilo, sin pasar por la cola (modo síncrono).
+        """
+        self._write(list(records))
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Espera a que todo lo encolado esté escrito. Devuelve False si vence el timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending > 0:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 10.0):
+        """
+        Vacía la cola y detiene el hilo (se llama también al salir del proceso).
+        """
+        if self._worker is not None and self._pid == os.getpid() and self._worker.is_alive():
+            self.flush(timeout)
+        self._closed = True
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        with self._counters_lock:
+            c = dict(self._counters)
+        batches = c['batches'] or 1
+        return {
+            'sinks': [sink.name for sink in self.sinks],
+            'queue_depth': self.queue_depth(),
+            'max_size': self.max_size,
+            'pending': self._pending,
+            'enqueued': c['enqueued'],
+            'written': c['written'],
+            'batches': c['batches'],
+            'failures': c['failures'],
+            'dropped': c['dropped'],
+            'sync_fallbacks': c['sync_fallbacks'],
+            'avg_flush_ms': round(c['flush_ms_total'] / batches, 3),
+            'max_flush_ms': round(c['flush_ms_max'], 3),
+            'last_flush_ms': round(c['flush_ms_last'], 3),
+        }
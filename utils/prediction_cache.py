@@ -0,0 +1,97 @@
+# utils/prediction_cache.py
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def tensor_digest(arr) -> bytes:
+    """
+    Huella de una imagen preprocesada: se cuantiza a uint8 (28x28 = 784 bytes) y se hashea.
+    Dos dibujos que producen el mismo tensor 28x28 comparten entrada de caché.
+    """
+    quantized = np.rint(np.asarray(arr, dtype=np.float32) * 255.0).astype(np.uint8)
+    return hashlib.blake2b(quantized.tobytes(), digest_size=16).digest()
+
+
+class PredictionCache:
+    """
+    Caché LRU con TTL de salidas de modelo, indexada por (huella de la imagen, modelo, versión).
+
+    Al cambiar el fichero de un modelo cambia su versión, así que las entradas
+    antiguas dejan de ser alcanzables y el LRU las expulsa.
+    """
+
+    def __init__(self, max_entries: int = 4096, ttl_seconds: float = 3600.0):
+        self.max_entries = int(max_entries)
+        self.ttl = float(ttl_seconds)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def make_key(digest: bytes, model_name: str, version: str) -> tuple:
+        return (digest, model_name, version)
+
+    def get(self, key):
+        """
+        Devuelve la salida cacheada o None (y actualiza los contadores).
+        """
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[1] >= now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return item[0]
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        value = np.array(value, copy=True)
+        value.flags.writeable = False
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, model_name: str = None):
+        """
+        Borra todas las entradas (o solo las de un modelo).
+        """
+        with self._lock:
+            if model_name is None:
+                self._data.clear()
+            else:
+                for key in [k for k in self._data if k[1] == model_name]:
+                    del self._data[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._data)
+        lookups = self.hits + self.misses
+        return {
+            'entries': size,
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
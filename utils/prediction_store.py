@@ -0,0 +1,449 @@
+# utils/prediction_store.py
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Columnas con índice propio; cualquier otra clave del registro se guarda en `extra`
+PREDICTION_COLUMNS = ('time', 'user', 'filename', 'pred', 'confidence', 'model')
+
+# Tamaño máximo de página para las consultas de historial
+MAX_PAGE_SIZE = 500
+
+def page_limit(limit) -> int:
+    """
+    Tamaño de página que usa realmente `query` para un `limit` pedido (entre 1 y MAX_PAGE_SIZE).
+    Una página llena es la que tiene exactamente este tamaño.
+    """
+    return max(1, min(int(limit), MAX_PAGE_SIZE))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    time       TEXT NOT NULL,
+    user       TEXT,
+    filename   TEXT,
+    pred       INTEGER,
+    confidence REAL NOT NULL DEFAULT 0.0,
+    model      TEXT NOT NULL DEFAULT 'MLP',
+    extra      TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_predictions_user_id ON predictions (user, id);
+CREATE INDEX IF NOT EXISTS idx_predictions_user_time ON predictions (user, time);
+CREATE INDEX IF NOT EXISTS idx_predictions_user_model_id ON predictions (user, model, id);
+CREATE TABLE IF NOT EXISTS store_meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+-- Agregados por usuario, actualizados en la misma transacción que cada INSERT
+CREATE TABLE IF NOT EXISTS user_model_stats (
+    user      TEXT NOT NULL,
+    model     TEXT NOT NULL,
+    n         INTEGER NOT NULL,
+    conf_mean REAL NOT NULL,
+    conf_m2   REAL NOT NULL,
+    PRIMARY KEY (user, model)
+);
+CREATE TABLE IF NOT EXISTS user_digit_counts (
+    user  TEXT NOT NULL,
+    model TEXT NOT NULL,
+    digit INTEGER NOT NULL,
+    n     INTEGER NOT NULL,
+    PRIMARY KEY (user, model, digit)
+);
+CREATE TABLE IF NOT EXISTS user_daily_stats (
+    user     TEXT NOT NULL,
+    model    TEXT NOT NULL,
+    day      TEXT NOT NULL,
+    n        INTEGER NOT NULL,
+    conf_sum REAL NOT NULL,
+    PRIMARY KEY (user, model, day)
+);
+-- Dígitos etiquetados por los usuarios (correcciones), para el reentrenamiento incremental
+CREATE TABLE IF NOT EXISTS labelled_samples (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    time          TEXT NOT NULL,
+    user          TEXT,
+    prediction_id INTEGER,
+    label         INTEGER NOT NULL,
+    pixels        BLOB NOT NULL  -- 28x28 uint8
+);
+"""
+
+# Media y varianza de la confianza con el algoritmo de Welford. En un UPDATE de SQLite
+# todas las expresiones usan los valores anteriores de la fila:
+#   delta = x - media;  media' = media + delta / (n + 1);  m2' = m2 + delta * (x - media')
+_UPDATE_MODEL_STATS = """
+INSERT INTO user_model_stats (user, model, n, conf_mean, conf_m2) VALUES (?, ?, 1, ?, 0.0)
+ON CONFLICT (user, model) DO UPDATE SET
+    n = n + 1,
+    conf_mean = conf_mean + (excluded.conf_mean - conf_mean) / (n + 1),
+    conf_m2 = conf_m2 + (excluded.conf_mean - conf_mean)
+                      * (excluded.conf_mean - (conf_mean + (excluded.conf_mean - conf_mean) / (n + 1)))
+"""
+_UPDATE_DIGIT_COUNTS = """
+INSERT INTO user_digit_counts (user, model, digit, n) VALUES (?, ?, ?, 1)
+ON CONFLICT (user, model, digit) DO UPDATE SET n = n + 1
+"""
+_UPDATE_DAILY_STATS = """
+INSERT INTO user_daily_stats (user, model, day, n, conf_sum) VALUES (?, ?, ?, 1, ?)
+ON CONFLICT (user, model, day) DO UPDATE SET n = n + 1, conf_sum = conf_sum + excluded.conf_sum
+"""
+
+
+class PredictionStore:
+    """
+    Almacén append-only de predicciones sobre SQLite en modo WAL.
+
+    Cada escritura es un INSERT al final de la tabla (no se reescribe el histórico)
+    y las lecturas por usuario usan el índice (user, id). WAL permite que varios
+    hilos o procesos lean mientras otro escribe sin corromper el fichero.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        # Se notifica tras cada escritura de este proceso (long-poll de /history y /stats/summary)
+        self._changed = threading.Condition()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._connect().executescript(_SCHEMA)
+        self._ensure_aggregates()
+
+    # ---------------- Conexión ----------------
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Devuelve la conexión del hilo actual (una por hilo y por proceso).
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    # ---------------- Escritura ----------------
+    @staticmethod
+    def _to_row(record: dict) -> tuple:
+        extra = {k: v for k, v in record.items() if k not in PREDICTION_COLUMNS and k != 'id'}
+        return (
+            record.get('time') or '',  # NOT NULL: registros antiguos sin fecha quedan con ''
+            record.get('user'),
+            record.get('filename'),
+            record.get('pred'),
+            float(record.get('confidence') or 0.0),
+            record.get('model') or 'MLP',
+            json.dumps(extra, ensure_ascii=False) if extra else None,
+        )
+
+    def _insert(self, conn, record: dict) -> int:
+        row = self._to_row(record)
+        cur = conn.execute(
+            'INSERT INTO predictions (time, user, filename, pred, confidence, model, extra) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            row,
+        )
+        time_, user, _, pred, confidence, model, _ = row
+        if user is None:
+            # Registros antiguos sin usuario: ninguna sesión puede consultarlos
+            return cur.lastrowid
+        conn.execute(_UPDATE_MODEL_STATS, (user, model, confidence))
+        if pred is not None:
+            conn.execute(_UPDATE_DIGIT_COUNTS, (user, model, pred))
+        conn.execute(_UPDATE_DAILY_STATS, (user, model, (time_ or '')[:10], confidence))
+        return cur.lastrowid
+
+    def append(self, record: dict) -> int:
+        """
+        Añade una predicción al final del log y devuelve su id.
+        """
+        with self._transaction() as conn:
+            row_id = self._insert(conn, record)
+        self._notify()
+        return row_id
+
+    def append_many(self, records: list) -> list:
+        """
+        Añade varias predicciones en una sola transacción.
+        """
+        with self._transaction() as conn:
+            ids = [self._insert(conn, rec) for rec in records]
+        self._notify()
+        return ids
+
+    def _notify(self):
+        with self._changed:
+            self._changed.notify_all()
+
+    # ---------------- Lectura ----------------
+    @staticmethod
+    def _to_record(row: sqlite3.Row) -> dict:
+        record = {'id': row['id']}
+        for col in PREDICTION_COLUMNS:
+            record[col] = row[col]
+        if row['extra']:
+            record.update(json.loads(row['extra']))
+        return record
+
+    def query(self, user_id: str, limit: int = 50, before: int = None, model: str = None,
+              start: str = None, end: str = None, after: int = None) -> list:
+        """
+        Devuelve una página del historial de un usuario, de la más reciente a la más antigua.
+
+        Params:
+        - limit: tamaño de página (máximo MAX_PAGE_SIZE)
+        - before: cursor; solo registros con id < before (el id del último registro de la página anterior)
+        - after: modo delta; solo registros con id > after, del más antiguo al más reciente
+        - model: 'MLP' o 'CNN' para filtrar por modelo
+        - start, end: rango de tiempo ISO 8601 (start <= time < end)
+        """
+        limit = page_limit(limit)
+        sql = 'SELECT * FROM predictions WHERE user = ?'
+        params = [user_id]
+        if before is not None:
+            sql += ' AND id < ?'
+            params.append(int(before))
+        if after is not None:
+            sql += ' AND id > ?'
+            params.append(int(after))
+        if model:
+            sql += ' AND model = ?'
+            params.append(model)
+        if start:
+            sql += ' AND time >= ?'
+            params.append(start)
+        if end:
+            sql += ' AND time < ?'
+            params.append(end)
+        sql += ' ORDER BY id ASC LIMIT ?' if after is not None else ' ORDER BY id DESC LIMIT ?'
+        params.append(limit)
+        return [self._to_record(row) for row in self._connect().execute(sql, params)]
+
+    def columns(self, user_id: str, model: str = None, start: str = None, end: str = None) -> list:
+        """
+        Claves de los registros de un usuario (con los mismos filtros que `query`): id, las
+        columnas fijas y todas las claves de `extra` que aparecen, en orden de primera aparición.
+        """
+        sql = ('SELECT j.key FROM predictions AS p, json_each(p.extra) AS j '
+               'WHERE p.user = ? AND p.extra IS NOT NULL')
+        params = [user_id]
+        if model:
+            sql += ' AND p.model = ?'
+            params.append(model)
+        if start:
+            sql += ' AND p.time >= ?'
+            params.append(start)
+        if end:
+            sql += ' AND p.time < ?'
+            params.append(end)
+        sql += ' GROUP BY j.key ORDER BY MIN(p.id)'
+        extra = [row[0] for row in self._connect().execute(sql, params)]
+        return ['id'] + list(PREDICTION_COLUMNS) + [k for k in extra if k != 'id' and k not in PREDICTION_COLUMNS]
+
+    def iter_history(self, user_id: str, page_size: int = MAX_PAGE_SIZE, **filters):
+        """
+        Recorre todo el historial de un usuario página a página (sin cargarlo entero).
+        """
+        before = None
+        while True:
+            page = self.query(user_id, limit=page_size, before=before, **filters)
+            yield from page
+            if len(page) < page_size:
+                return
+            before = page[-1]['id']
+
+    # ---------------- Versión por usuario ----------------
+    def user_version(self, user_id: str) -> int:
+        """
+        Versión del historial de un usuario: el id de su última predicción (0 si no tiene).
+        El log es append-only, así que cambia con cada predicción nueva y solo con ellas;
+        es una lectura O(log n) del índice (user, id).
+        """
+        row = self._connect().execute('SELECT MAX(id) FROM predictions WHERE user = ?', (user_id,)).fetchone()
+        return row[0] or 0
+
+    def wait_for_change(self, user_id: str, version: int, timeout: float, poll_interval: float = 1.0) -> int:
+        """
+        Espera hasta `timeout` segundos a que la versión del usuario deje de ser `version`
+        y devuelve la versión actual. Las escrituras de este proceso despiertan al instante;
+        las de otros procesos (otros workers) se ven al releer cada `poll_interval` segundos.
+        """
+        deadline = time.monotonic() + timeout
+        current = self.user_version(user_id)
+        while current == version:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            with self._changed:
+                self._changed.wait(min(remaining, poll_interval))
+            current = self.user_version(user_id)
+        return current
+
+    # ---------------- Agregados ----------------
+    def user_summary(self, user_id: str) -> dict:
+        """
+        Resumen precalculado de un usuario: totales, media y desviación de la confianza
+        y recuento por dígito para cada modelo, más la serie diaria por modelo.
+        El coste depende del número de modelos/días, no del tamaño del historial.
+        """
+        conn = self._connect()
+        models = {}
+        for row in conn.execute(
+            'SELECT model, n, conf_mean, conf_m2 FROM user_model_stats WHERE user = ? ORDER BY model', (user_id,)
+        ):
+            models[row['model']] = {
+                'count': row['n'],
+                'confidence_mean': row['conf_mean'],
+                'confidence_std': (row['conf_m2'] / row['n']) ** 0.5 if row['n'] else 0.0,
+                'digits': {str(d): 0 for d in range(10)},
+            }
+        for row in conn.execute(
+            'SELECT model, digit, n FROM user_digit_counts WHERE user = ?', (user_id,)
+        ):
+            models.setdefault(row['model'], {'digits': {}})['digits'][str(row['digit'])] = row['n']
+        daily = [
+            {'day': row['day'], 'model': row['model'], 'count': row['n'],
+             'confidence_mean': row['conf_sum'] / row['n']}
+            for row in conn.execute(
+                'SELECT day, model, n, conf_sum FROM user_daily_stats WHERE user = ? ORDER BY day, model', (user_id,)
+            )
+        ]
+        return {
+            'total': sum(m.get('count', 0) for m in models.values()),
+            'models': models,
+            'daily': daily,
+        }
+
+    def _ensure_aggregates(self):
+        """
+        Reconstruye los agregados una sola vez en bases de datos creadas antes de que existieran.
+        """
+        with self._transaction() as conn:
+            if conn.execute("SELECT 1 FROM store_meta WHERE key = 'aggregates'").fetchone():
+                return
+            for table in ('user_model_stats', 'user_digit_counts', 'user_daily_stats'):
+                conn.execute(f'DELETE FROM {table}')
+            conn.execute(
+                'INSERT INTO user_model_stats (user, model, n, conf_mean, conf_m2) '
+                'SELECT user, model, COUNT(*), AVG(confidence), '
+                '       MAX(SUM(confidence * confidence) - COUNT(*) * AVG(confidence) * AVG(confidence), 0.0) '
+                'FROM predictions WHERE user IS NOT NULL GROUP BY user, model'
+            )
+            conn.execute(
+                'INSERT INTO user_digit_counts (user, model, digit, n) '
+                'SELECT user, model, pred, COUNT(*) FROM predictions WHERE user IS NOT NULL AND pred IS NOT NULL GROUP BY user, model, pred'
+            )
+            conn.execute(
+                'INSERT INTO user_daily_stats (user, model, day, n, conf_sum) '
+                'SELECT user, model, substr(time, 1, 10), COUNT(*), SUM(confidence) '
+                'FROM predictions WHERE user IS NOT NULL GROUP BY user, model, substr(time, 1, 10)'
+            )
+            conn.execute("INSERT INTO store_meta (key, value) VALUES ('aggregates', '1')")
+
+    def count(self) -> int:
+        return self._connect().execute('SELECT COUNT(*) FROM predictions').fetchone()[0]
+
+    def get_meta(self, key: str, default=None):
+        row = self._connect().execute('SELECT value FROM store_meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key: str, value):
+        with self._transaction() as conn:
+            conn.execute('INSERT INTO store_meta (key, value) VALUES (?, ?) '
+                         'ON CONFLICT (key) DO UPDATE SET value = excluded.value', (key, str(value)))
+
+    # ---------------- Muestras etiquetadas ----------------
+    def add_labelled_sample(self, user_id: str, label: int, pixels: bytes, prediction_id: int = None,
+                            time: str = None) -> int:
+        """
+        Guarda un dígito etiquetado (28x28 uint8 en `pixels`) y devuelve su id.
+        """
+        if len(pixels) != 28 * 28:
+            raise ValueError(f"Se esperaban 784 bytes de píxeles, llegaron {len(pixels)}")
+        with self._transaction() as conn:
+            cur = conn.execute(
+                'INSERT INTO labelled_samples (time, user, prediction_id, label, pixels) VALUES (?, ?, ?, ?, ?)',
+                (time or datetime.utcnow().isoformat(), user_id, prediction_id, int(label), sqlite3.Binary(pixels)),
+            )
+            return cur.lastrowid
+
+    def count_labelled(self, after_id: int = 0) -> int:
+        return self._connect().execute(
+            'SELECT COUNT(*) FROM labelled_samples WHERE id > ?', (after_id,)
+        ).fetchone()[0]
+
+    def last_labelled_id(self) -> int:
+        return self._connect().execute('SELECT COALESCE(MAX(id), 0) FROM labelled_samples').fetchone()[0]
+
+    def iter_labelled(self, after_id: int = 0, until_id: int = None, page_size: int = MAX_PAGE_SIZE):
+        """
+        Recorre las muestras etiquetadas con after_id < id <= until_id como (id, etiqueta, píxeles).
+        """
+        until_id = self.last_labelled_id() if until_id is None else until_id
+        while True:
+            rows = self._connect().execute(
+                'SELECT id, label, pixels FROM labelled_samples WHERE id > ? AND id <= ? ORDER BY id LIMIT ?',
+                (after_id, until_id, page_size),
+            ).fetchall()
+            for row in rows:
+                yield row['id'], row['label'], bytes(row['pixels'])
+            if len(rows) < page_size:
+                return
+            after_id = rows[-1]['id']
+
+    # ---------------- Migración ----------------
+    def migrate_from_json(self, json_path: str) -> int:
+        """
+        Importa una sola vez el log antiguo (array JSON, más reciente primero).
+
+        El fichero original no se modifica; la marca en `store_meta` evita
+        importarlo dos veces aunque varios procesos arranquen a la vez.
+        Devuelve el número de registros importados.
+        """
+        if not os.path.exists(json_path):
+            return 0
+        with self._transaction() as conn:
+            done = conn.execute(
+                "SELECT value FROM store_meta WHERE key = 'migrated_json'"
+            ).fetchone()
+            if done:
+                return 0
+            try:
+                with open(json_path, 'r', encoding='utf-8') as fh:
+                    data = json.load(fh)
+            except json.JSONDecodeError:
+                data = []
+            # El array guarda lo más nuevo al principio: insertar al revés conserva el orden de ids
+            records = [rec for rec in reversed(data) if isinstance(rec, dict)]
+            if len(records) < len(data):
+                logger.warning("⚠️ %d entradas de %s no son predicciones y no se migran", len(data) - len(records), json_path)
+            undated = sum(1 for rec in records if not rec.get('time'))
+            if undated:
+                logger.warning("⚠️ %d predicciones de %s no tienen fecha; se migran con time=''", undated, json_path)
+            for rec in records:
+                self._insert(conn, rec)
+            conn.execute(
+                "INSERT INTO store_meta (key, value) VALUES ('migrated_json', ?)",
+                (os.path.abspath(json_path),),
+            )
+        return len(records)
@@ -4,23 +4,17 @@ from PIL import Image
 import base64
 import io
 
+from utils.instrumentation import instrumentation
+
 # Compatibilidad con diferentes versiones de Pillow
 try:
     resample_method = Image.Resampling.LANCZOS  # Pillow 10+
 except AttributeError:
     resample_method = Image.LANCZOS  # Pillow <10
 
-def preprocess_image(image_input, target_size=(28,28), flatten=True):
+def _to_grayscale(image_input):
     """
-    Convierte una imagen (bytes, PIL.Image o base64) a un array normalizado listo para Keras.
-
-    Params:
-    - image_input: bytes, PIL.Image o string base64 ('data:image/png;base64,...')
-    - target_size: tupla (alto, ancho)
-    - flatten: True para MLP (784,), False para CNN (28,28,1)
-
-    Returns:
-    - np.array listo para modelo MLP o CNN
+    Decodifica la entrada (bytes, PIL.Image o base64 'data:image/...') a una PIL.Image en escala de grises.
     """
     # --- Detectar base64 ---
     if isinstance(image_input, str) and image_input.startswith('data:image'):
@@ -29,22 +23,113 @@ def preprocess_image(image_input, target_size=(28,28), flatten=True):
 
     # --- Convertir bytes a PIL.Image ---
     if isinstance(image_input, bytes):
-        img = Image.open(io.BytesIO(image_input)).convert('L')
+        return Image.open(io.BytesIO(image_input)).convert('L')
     elif isinstance(image_input, Image.Image):
-        img = image_input.convert('L')
-    else:
-        raise ValueError("Tipo de entrada no soportado: debe ser bytes, PIL.Image o base64")
+        return image_input.convert('L')
+    raise ValueError("Tipo de entrada no soportado: debe ser bytes, PIL.Image o base64")
 
-    # --- Redimensionar ---
-    img = img.resize(target_size, resample_method)
+def decode_image(image_input, target_size=(28,28), out=None):
+    """
+    Decodifica y redimensiona una imagen una sola vez.
 
-    # --- Normalizar ---
-    arr = np.array(img, dtype=np.float32) / 255.0
+    Params:
+    - image_input: bytes, PIL.Image o string base64 ('data:image/png;base64,...')
+    - target_size: tupla (alto, ancho)
+    - out: buffer float32 (alto, ancho) opcional donde escribir el resultado
 
-    if flatten:
-        return arr.flatten()  # MLP
-    else:
-        return arr[..., np.newaxis]  # CNN (28,28,1)
+    Returns:
+    - np.array float32 (alto, ancho) normalizado a [0, 1]
+    """
+    with instrumentation.span('decode'):
+        img = _to_grayscale(image_input)
+    with instrumentation.span('resize'):
+        img = img.resize(target_size, resample_method)
+    if out is None:
+        out = np.empty(target_size[::-1], dtype=np.float32)
+    out[...] = np.asarray(img)
+    out /= 255.0
+    return out
+
+def model_views(arr):
+    """
+    Devuelve las entradas de ambos modelos como vistas (sin copia) del mismo buffer.
+
+    - arr (alto, ancho) -> MLP (alto*ancho,), CNN (alto, ancho, 1)
+    - arr (N, alto, ancho) -> MLP (N, alto*ancho), CNN (N, alto, ancho, 1)
+    """
+    lead = arr.shape[:-2]
+    return arr.reshape(lead + (-1,)), arr[..., np.newaxis]
+
+def preprocess_batch(image_inputs, target_size=(28,28)):
+    """
+    Preprocesa una lista de imágenes en un único array contiguo (N, alto, ancho) float32.
+
+    Returns:
+    - batch: array con las imágenes válidas, en el orden de entrada
+    - errors: lista alineada con image_inputs con None o la excepción de esa imagen
+    """
+    batch = np.empty((len(image_inputs),) + tuple(target_size[::-1]), dtype=np.float32)
+    errors = []
+    n_valid = 0
+    for image_input in image_inputs:
+        try:
+            decode_image(image_input, target_size, out=batch[n_valid])
+        except Exception as e:
+            errors.append(e)
+            continue
+        errors.append(None)
+        n_valid += 1
+    return batch[:n_valid], errors
+
+def decode_pixel_buffer(buffer, width=28, height=28, target_size=(28,28), out=None):
+    """
+    Convierte píxeles crudos del canvas (sin PNG ni base64) a un array float32 normalizado.
+
+    Params:
+    - buffer: bytes con width*height valores en gris (1 canal) o width*height*4 valores RGBA
+    - width, height: dimensiones de la imagen enviada
+    - target_size: tupla (alto, ancho) de salida; solo se redimensiona si no coincide
+    - out: buffer float32 (alto, ancho) opcional donde escribir el resultado
+
+    Returns:
+    - np.array float32 (alto, ancho) normalizado a [0, 1]
+    """
+    pixels = np.frombuffer(buffer, dtype=np.uint8)
+    n = width * height
+    with instrumentation.span('decode'):
+        if pixels.size == n * 4:
+            rgba = pixels.reshape(height, width, 4)
+            # Misma ponderación ITU-R 601 que PIL.Image.convert('L')
+            gray = rgba[..., 0] * 0.299 + rgba[..., 1] * 0.587 + rgba[..., 2] * 0.114
+        elif pixels.size == n:
+            gray = pixels.reshape(height, width)
+        else:
+            raise ValueError(f"Tamaño de buffer inválido: {pixels.size} bytes para {width}x{height} (gris o RGBA)")
+
+    if out is None:
+        out = np.empty(target_size[::-1], dtype=np.float32)
+    if gray.shape != out.shape:
+        with instrumentation.span('resize'):
+            img = Image.fromarray(np.clip(np.rint(gray), 0, 255).astype(np.uint8), mode='L')
+            gray = np.asarray(img.resize(target_size, resample_method))
+    out[...] = gray
+    out /= 255.0
+    return out
+
+def preprocess_image(image_input, target_size=(28,28), flatten=True):
+    """
+    Convierte una imagen (bytes, PIL.Image o base64) a un array normalizado listo para Keras.
+
+    Params:
+    - image_input: bytes, PIL.Image o string base64 ('data:image/png;base64,...')
+    - target_size: tupla (alto, ancho)
+    - flatten: True para MLP (784,), False para CNN (28,28,1)
+
+    Returns:
+    - np.array listo para modelo MLP o CNN
+    """
+    flat, cnn = model_views(decode_image(image_input, target_size))
+    return flat if flatten else cnn
 
 def preprocess_canvas_data(canvas_data, target_size=(28,28), flatten=True):
     """
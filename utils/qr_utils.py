@@ -1,76 +1,199 @@
-import qrcode
 import io
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import qrcode
+from PIL import Image
+
+QR_FORMATS = {'png': 'image/png', 'svg': 'image/svg+xml'}
+ERROR_CORRECTION = {
+    'L': qrcode.constants.ERROR_CORRECT_L,
+    'M': qrcode.constants.ERROR_CORRECT_M,
+    'Q': qrcode.constants.ERROR_CORRECT_Q,
+    'H': qrcode.constants.ERROR_CORRECT_H,
+}
 
-def generate_qr_from_data(data: list, max_rows: int = 20) -> bytes:
+
+# ---------------- Renderizado ----------------
+def qr_matrix(data: str, error_correction: str = 'Q', border: int = 2) -> np.ndarray:
     """
-    Genera un QR que contiene un HTML con las últimas predicciones.
-    Devuelve los bytes de la imagen PNG.
-    
-    Parámetros:
-        data (list): Lista de diccionarios con las predicciones.
-        max_rows (int): Número máximo de filas a incluir en el HTML.
+    Matriz booleana (True = módulo negro) del QR más pequeño que admite `data`, con el margen incluido.
     """
-    # Limitar filas para que el QR no sea demasiado grande
-    data = data[:max_rows]
-
-    # Crear filas HTML
-    rows_html = ""
-    for rec in data:
-        time = rec.get('time', '-')
-        filename = rec.get('filename') or "Canvas"
-        pred = rec.get('pred', '-')
-        conf = f"{(rec.get('confidence', 0)*100):.2f}%"
-        rows_html += f"<tr><td>{time}</td><td>{filename}</td><td>{pred}</td><td>{conf}</td></tr>"
-
-    html_content = f"""
-    <html>
-    <head><meta charset="UTF-8"><title>Mis Predicciones</title></head>
-    <body>
-    <h3>Últimas Predicciones</h3>
-    <table border="1" cellpadding="3" cellspacing="0">
-    <tr><th>Hora</th><th>Archivo/Canvas</th><th>Predicción</th><th>Confianza</th></tr>
-    {rows_html}
-    </table>
-    </body>
-    </html>
-    """
-
-    # Generar QR
-    qr = qrcode.QRCode(
-        version=None,  # autoajustable según la cantidad de datos
-        error_correction=qrcode.constants.ERROR_CORRECT_Q,
-        box_size=8,
-        border=2,
-    )
-    qr.add_data(html_content)
+    qr = qrcode.QRCode(version=None, error_correction=ERROR_CORRECTION[error_correction], border=border)
+    qr.add_data(data)
     qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
+    return np.array(qr.get_matrix(), dtype=bool)
+
 
-    # Convertir a bytes PNG
+def matrix_to_png(matrix: np.ndarray, box_size: int = 8) -> bytes:
+    """
+    PNG de 1 bit por píxel: la matriz se escala con np.repeat en vez de dibujar módulo a módulo.
+    """
+    pixels = np.repeat(np.repeat(~matrix, box_size, axis=0), box_size, axis=1)
     buf = io.BytesIO()
-    img.save(buf, format='PNG')
-    buf.seek(0)
+    Image.fromarray(pixels).save(buf, format='PNG', optimize=True)
     return buf.getvalue()
 
 
-def generate_qr_from_url(url: str) -> bytes:
+def matrix_to_svg(matrix: np.ndarray, box_size: int = 8) -> bytes:
+    """
+    SVG con un único <path>: un segmento de grosor 1 por cada tramo horizontal de módulos negros.
     """
-    Genera un QR a partir de una URL y devuelve los bytes PNG.
+    size = matrix.shape[0]
+    parts = []
+    for y, row in enumerate(matrix):
+        # Inicios y finales de los tramos de True en la fila
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], row.view(np.int8), [0]))))
+        for start, stop in zip(edges[::2], edges[1::2]):
+            parts.append(f'M{start} {y}.5h{stop - start}')
+    side = size * box_size
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{side}" height="{side}" '
+            f'viewBox="0 0 {size} {size}" shape-rendering="crispEdges">'
+            f'<rect width="100%" height="100%" fill="#fff"/>'
+            f'<path stroke="#000" d="{"".join(parts)}"/></svg>').encode()
 
-    Parámetros:
-        url (str): URL que se codificará en el QR.
+
+def render_qr(data: str, fmt: str = 'png', box_size: int = 8, border: int = 2, error_correction: str = 'Q') -> bytes:
+    """
+    Codifica `data` en un QR y lo devuelve como PNG o SVG (sin caché).
+    """
+    if fmt not in QR_FORMATS:
+        raise ValueError(f"Formato de QR no soportado: {fmt} (opciones: {', '.join(QR_FORMATS)})")
+    matrix = qr_matrix(data, error_correction, border)
+    return matrix_to_png(matrix, box_size) if fmt == 'png' else matrix_to_svg(matrix, box_size)
+
+
+# ---------------- Caché ----------------
+class QRCache:
+    """
+    Caché de QR renderizados, direccionada por contenido: la clave es un hash del texto
+    codificado y de las opciones de renderizado, así que también sirve de ETag.
+
+    Guarda hasta `max_entries` imágenes en un LRU en memoria y, si se indica `disk_dir`,
+    también en disco (un fichero por clave, escrito de forma atómica), que comparten
+    los workers y sobrevive a los reinicios.
+    """
+
+    def __init__(self, max_entries: int = 256, disk_dir: str = None):
+        self.max_entries = int(max_entries)
+        self.disk_dir = disk_dir
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.render_ms_total = 0.0
+
+    @staticmethod
+    def make_key(data: str, fmt: str = 'png', box_size: int = 8, border: int = 2, error_correction: str = 'Q') -> str:
+        options = f'{fmt}:{box_size}:{border}:{error_correction}:'
+        return hashlib.blake2b(options.encode() + data.encode(), digest_size=16).hexdigest()
+
+    def _disk_path(self, key: str, fmt: str) -> str:
+        return os.path.join(self.disk_dir, f'{key}.{fmt}')
+
+    def get_or_render(self, data: str, fmt: str = 'png', **options):
+        """
+        Devuelve (bytes, clave) del QR, renderizándolo solo si no está en memoria ni en disco.
+        """
+        key = self.make_key(data, fmt, **options)
+        with self._lock:
+            image = self._data.get(key)
+            if image is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return image, key
+
+        image = None
+        if self.disk_dir and os.path.exists(self._disk_path(key, fmt)):
+            with open(self._disk_path(key, fmt), 'rb') as fh:
+                image = fh.read()
+            self.disk_hits += 1
+        if image is None:
+            started = time.perf_counter()
+            image = render_qr(data, fmt, **options)
+            self.render_ms_total += (time.perf_counter() - started) * 1000.0
+            self.misses += 1
+            if self.disk_dir:
+                path = self._disk_path(key, fmt)
+                tmp_path = f'{path}.{os.getpid()}.tmp'
+                with open(tmp_path, 'wb') as fh:
+                    fh.write(image)
+                os.replace(tmp_path, path)
+
+        if self.max_entries > 0:
+            with self._lock:
+                self._data[key] = image
+                self._data.move_to_end(key)
+                while len(self._data) > self.max_entries:
+                    self._data.popitem(last=False)
+        return image, key
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = len(self._data)
+            memory_bytes = sum(len(v) for v in self._data.values())
+        return {
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'memory_bytes': memory_bytes,
+            'disk_dir': self.disk_dir,
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'avg_render_ms': round(self.render_ms_total / self.misses, 3) if self.misses else None,
+        }
+
+
+# Caché compartida por las funciones de conveniencia de este módulo
+qr_cache = QRCache()
+
+
+# ---------------- API ----------------
+def predictions_html(data: list, max_rows: int = 20) -> str:
+    """
+    HTML compacto (sin espacios ni atributos de presentación) con las últimas predicciones:
+    cuanto menos texto, menor la versión del QR y menos módulos que calcular.
     """
-    qr = qrcode.QRCode(
-        version=None,
-        error_correction=qrcode.constants.ERROR_CORRECT_Q,
-        box_size=8,
-        border=2,
+    rows = ''.join(
+        f"<tr><td>{rec.get('time', '-')}</td><td>{rec.get('filename') or 'Canvas'}</td>"
+        f"<td>{rec.get('pred', '-')}</td><td>{rec.get('confidence', 0) * 100:.2f}%</td></tr>"
+        for rec in data[:max_rows]
     )
-    qr.add_data(url)
-    qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
+    return ('<html><head><meta charset="UTF-8"><title>Mis Predicciones</title></head><body>'
+            '<h3>Últimas Predicciones</h3><table border="1">'
+            f'<tr><th>Hora</th><th>Archivo/Canvas</th><th>Predicción</th><th>Confianza</th></tr>{rows}'
+            '</table></body></html>')
 
-    buf = io.BytesIO()
-    img.save(buf, format='PNG')
-    buf.seek(0)
-    return buf.getvalue()
+
+def generate_qr_from_data(data: list, max_rows: int = 20, fmt: str = 'png') -> bytes:
+    """
+    Genera un QR que contiene un HTML con las últimas predicciones.
+    Devuelve los bytes de la imagen (PNG por defecto).
+
+    Parámetros:
+        data (list): Lista de diccionarios con las predicciones.
+        max_rows (int): Número máximo de filas a incluir en el HTML.
+        fmt (str): 'png' o 'svg'.
+    """
+    # Corrección de errores L: con un contenido tan largo, Q casi duplica el número de módulos
+    image, _ = qr_cache.get_or_render(predictions_html(data, max_rows), fmt, error_correction='L')
+    return image
+
+
+def generate_qr_from_url(url: str, fmt: str = 'png') -> bytes:
+    """
+    Genera un QR a partir de una URL y devuelve los bytes de la imagen (PNG por defecto).
+
+    Parámetros:
+        url (str): URL que se codificará en el QR.
+        fmt (str): 'png' o 'svg'.
+    """
+    image, _ = qr_cache.get_or_render(url, fmt)
+    return image
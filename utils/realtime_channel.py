@@ -0,0 +1,115 @@
+# utils/realtime_channel.py
+import time
+import uuid
+import threading
+
+
+class FrameSlot:
+    """
+    Buzón de un solo elemento para un canal en tiempo real: el último frame gana.
+
+    Si llega un frame nuevo antes de que se procese el anterior, el anterior se
+    descarta, así el servidor nunca calcula trazos ya obsoletos.
+    """
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self._cond = threading.Condition()
+        self._frame = None
+        self._last_seq = -1
+        self.closed = False
+        self.received = 0
+        self.dropped = 0
+        self.touched_at = time.monotonic()
+
+    def put(self, seq: int, frame) -> bool:
+        """
+        Guarda el frame si es más nuevo que el último recibido. Devuelve False si se ignoró.
+        """
+        with self._cond:
+            self.touched_at = time.monotonic()
+            if seq <= self._last_seq:
+                self.dropped += 1
+                return False
+            if self._frame is not None:
+                self.dropped += 1
+            self._last_seq = seq
+            self._frame = (seq, frame)
+            self.received += 1
+            self._cond.notify()
+            return True
+
+    def take(self, timeout: float = None):
+        """
+        Espera y devuelve (seq, frame) del frame pendiente, o None si vence el timeout o se cierra.
+        """
+        with self._cond:
+            if self._frame is None and not self.closed:
+                self._cond.wait(timeout)
+            item, self._frame = self._frame, None
+            return item
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class RealtimeHub:
+    """
+    Canales abiertos por las pestañas con canvas en tiempo real, indexados por un id aleatorio.
+
+    Cada canal ocupa un hilo del servidor mientras la pestaña sigue abierta, así que se
+    limitan a `max_channels` (None: sin límite) para que no se queden con todos.
+    """
+
+    def __init__(self, idle_timeout: float = 300.0, max_channels: int = None):
+        self.idle_timeout = idle_timeout
+        self.max_channels = max_channels
+        self.rejected = 0
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    def open(self, user_id: str):
+        """
+        Crea un canal para el usuario y devuelve (channel_id, slot), o None si ya hay
+        `max_channels` abiertos.
+        """
+        self._expire()
+        channel_id = uuid.uuid4().hex
+        slot = FrameSlot(user_id)
+        with self._lock:
+            if self.max_channels is not None and len(self._slots) >= self.max_channels:
+                self.rejected += 1
+                return None
+            self._slots[channel_id] = slot
+        return channel_id, slot
+
+    def get(self, channel_id: str):
+        with self._lock:
+            return self._slots.get(channel_id)
+
+    def close(self, channel_id: str):
+        with self._lock:
+            slot = self._slots.pop(channel_id, None)
+        if slot is not None:
+            slot.close()
+
+    def _expire(self):
+        # Canales cuyo cliente desapareció sin cerrar la conexión
+        now = time.monotonic()
+        with self._lock:
+            stale = [cid for cid, slot in self._slots.items() if now - slot.touched_at > self.idle_timeout]
+        for cid in stale:
+            self.close(cid)
+
+    def stats(self) -> dict:
+        with self._lock:
+            slots = list(self._slots.values())
+        return {
+            'channels': len(slots),
+            'max_channels': self.max_channels,
+            'rejected': self.rejected,
+            'frames_received': sum(s.received for s in slots),
+            'frames_dropped': sum(s.dropped for s in slots),
+        }
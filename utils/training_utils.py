@@ -1,8 +1,21 @@
 # utils/training_utils.py
 import os
-import tensorflow as tf
+import time
+import shutil
+import logging
+import threading
+from datetime import datetime
+
 import numpy as np
 
+logger = logging.getLogger(__name__)
+
+def _tf():
+    # TensorFlow se importa al entrenar, no al importar el módulo (la app lo importa con FINETUNE=1
+    # y, con gunicorn preload_app, TensorFlow no debe cargarse en el maestro antes del fork)
+    import tensorflow as tf
+    return tf
+
 def load_base_model(model_path: str):
     """
     Carga el modelo base MNIST entrenado, si existe.
@@ -14,7 +27,7 @@ def load_base_model(model_path: str):
         modelo Keras o None si no existe
     """
     if os.path.exists(model_path):
-        return tf.keras.models.load_model(model_path)
+        return _tf().keras.models.load_model(model_path)
     return None
 
 def incremental_train(model, x_new: np.ndarray, y_new: np.ndarray, epochs=1, batch_size=32):
@@ -37,10 +50,262 @@ def incremental_train(model, x_new: np.ndarray, y_new: np.ndarray, epochs=1, bat
 def save_model(model, save_path: str):
     """
     Guarda el modelo Keras en la ruta especificada.
-    
+
+    Se escribe primero en un fichero temporal del mismo directorio y se renombra
+    (os.replace), así quien lea la ruta nunca ve un modelo a medio escribir.
+
     Args:
         model: modelo Keras
         save_path: ruta para guardar el modelo
     """
     os.makedirs(os.path.dirname(save_path), exist_ok=True)
-    model.save(save_path)
+    root, ext = os.path.splitext(save_path)
+    tmp_path = f"{root}.tmp-{os.getpid()}{ext or '.keras'}"
+    model.save(tmp_path)
+    os.replace(tmp_path, save_path)
+
+def publish_checkpoint(checkpoint_path: str, serve_path: str):
+    """
+    Copia un checkpoint sobre la ruta publicada de forma atómica; el registro de
+    modelos detecta el cambio de versión y lo recarga sin reiniciar.
+    """
+    os.makedirs(os.path.dirname(serve_path), exist_ok=True)
+    root, ext = os.path.splitext(serve_path)
+    tmp_path = f"{root}.tmp-{os.getpid()}{ext}"
+    shutil.copyfile(checkpoint_path, tmp_path)
+    os.replace(tmp_path, serve_path)
+
+def labelled_batches(store, after_id: int = 0, until_id: int = None, batch_size: int = 32,
+                     replay=None, replay_ratio: float = 0.5, flat: bool = True, seed: int = None):
+    """
+    Generador sin fin de batches (x float32, y one-hot) para model.fit con steps_per_epoch.
+
+    Recorre las muestras etiquetadas del almacén (after_id < id <= until_id) página a
+    página, y completa cada batch con muestras al azar de `replay` (un MemmapDataset,
+    p. ej. MNIST train) para que el ajuste no olvide lo aprendido.
+
+    Args:
+        store: PredictionStore con las muestras etiquetadas
+        batch_size: tamaño total del batch (nuevas + replay)
+        replay: dataset de repaso o None
+        replay_ratio: fracción del batch que sale de `replay`
+        flat: x con forma (B, 784) para el MLP; si no, (B, 28, 28, 1) para la CNN
+    """
+    rng = np.random.default_rng(seed)
+    n_replay = int(round(batch_size * replay_ratio)) if replay is not None and len(replay) else 0
+    n_new = max(1, batch_size - n_replay)
+    eye = np.eye(10, dtype=np.float32)
+    while True:
+        pending_x, pending_y = [], []
+        for _, label, pixels in store.iter_labelled(after_id, until_id):
+            pending_x.append(np.frombuffer(pixels, dtype=np.uint8))
+            pending_y.append(label)
+            if len(pending_x) == n_new:
+                yield _mix_batch(pending_x, pending_y, replay, n_replay, rng, eye, flat)
+                pending_x, pending_y = [], []
+        if pending_x:
+            yield _mix_batch(pending_x, pending_y, replay, n_replay, rng, eye, flat)
+
+def _mix_batch(xs, ys, replay, n_replay, rng, eye, flat):
+    x = np.stack(xs).reshape(-1, 28, 28)
+    y = np.asarray(ys)
+    if n_replay:
+        idx = np.sort(rng.choice(len(replay), size=n_replay, replace=False))
+        x = np.concatenate([x, replay.x[idx]])
+        y = np.concatenate([y, replay.y[idx]])
+    x = x.astype(np.float32) / 255.0
+    x = x.reshape(len(x), -1) if flat else x[..., np.newaxis]
+    return x, eye[y]
+
+def evaluate_accuracy(model, dataset, limit: int = None, batch_size: int = 512, flat: bool = True) -> float:
+    """
+    Exactitud del modelo en las primeras `limit` muestras de un MemmapDataset.
+    """
+    n = min(len(dataset), limit or len(dataset))
+    correct = 0
+    for start in range(0, n, batch_size):
+        stop = min(start + batch_size, n)
+        x = np.asarray(dataset.x[start:stop], dtype=np.float32) / 255.0
+        x = x.reshape(len(x), -1) if flat else x[..., np.newaxis]
+        probs = np.asarray(model(x, training=False))
+        correct += int(np.sum(np.argmax(probs, axis=1) == np.asarray(dataset.y[start:stop])))
+    return correct / n if n else 0.0
+
+def incremental_train_stream(model, batches, steps_per_epoch: int, epochs: int = 1):
+    """
+    Entrenamiento incremental desde un generador de batches (sin cargar los datos en memoria).
+
+    Returns:
+        history de Keras (objeto con métricas)
+    """
+    return model.fit(batches, steps_per_epoch=steps_per_epoch, epochs=epochs, verbose=0)
+
+
+class FineTuner:
+    """
+    Reentrenamiento incremental en segundo plano con las muestras etiquetadas por los usuarios.
+
+    Cada `interval` segundos, para cada modelo con al menos `min_samples` muestras
+    nuevas: carga la versión servida (la última publicada o, si no hay, la original),
+    la ajusta con esas muestras (más repaso de `replay`) y mide la exactitud antes y
+    después sobre `holdout`. Solo si no empeora más de `max_regression` guarda un
+    checkpoint en `checkpoint_dir` y lo publica de forma atómica en
+    `publish_dir/<fichero original>`; el modelo original no se modifica nunca.
+    Sin conjunto de validación no se publica nada. `on_checkpoint(nombre)` permite
+    recargarlo en caliente. El último id entrenado de cada modelo se guarda en
+    store_meta, también en las rondas rechazadas (esas muestras no se reintentan).
+    """
+
+    def __init__(self, store, models: dict, checkpoint_dir: str, publish_dir: str, min_samples: int = 50,
+                 interval: float = 300.0, epochs: int = 1, batch_size: int = 32,
+                 learning_rate: float = 1e-4, replay=None, replay_ratio: float = 0.5, holdout=None,
+                 holdout_size: int = 10000, max_regression: float = 0.0, on_checkpoint=None):
+        """
+        models: {nombre: ruta del .keras original}
+        replay, holdout: MemmapDataset, o una función sin argumentos que lo devuelve (se abre en la primera ronda)
+        holdout_size: muestras de `holdout` que se evalúan (las primeras)
+        max_regression: caída de exactitud en `holdout` que se tolera para publicar
+        """
+        self.store = store
+        self.models = dict(models)
+        self.checkpoint_dir = checkpoint_dir
+        self.publish_dir = publish_dir
+        self.min_samples = min_samples
+        self.interval = interval
+        self.epochs = epochs
+        self.batch_size = batch_size
+        self.learning_rate = learning_rate
+        self.replay = replay
+        self.replay_ratio = replay_ratio
+        self.holdout = holdout
+        self.holdout_size = holdout_size
+        self.max_regression = max_regression
+        self.on_checkpoint = on_checkpoint
+        self.last_results = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _replay_dataset(self):
+        if callable(self.replay):
+            try:
+                self.replay = self.replay()
+            except Exception as e:
+                logger.warning("⚠️ Sin datos de repaso para el reentrenamiento: %s", e)
+                self.replay = None
+        return self.replay
+
+    def _holdout_dataset(self):
+        if callable(self.holdout):
+            try:
+                self.holdout = self.holdout()
+            except Exception as e:
+                logger.warning("⚠️ Sin conjunto de validación para el reentrenamiento: %s", e)
+                self.holdout = None
+        return self.holdout
+
+    def published_path(self, path: str) -> str:
+        """
+        Ruta donde se publica el modelo reentrenado a partir del original `path`.
+        """
+        return os.path.join(self.publish_dir, os.path.basename(path))
+
+    def served_path(self, path: str) -> str:
+        published = self.published_path(path)
+        return published if os.path.exists(published) else path
+
+    def _meta_key(self, name: str) -> str:
+        return f'finetune:{name}:last_id'
+
+    def run_once(self) -> dict:
+        """
+        Una ronda de reentrenamiento para todos los modelos. Devuelve un resumen por modelo.
+        """
+        results = {}
+        for name, path in self.models.items():
+            try:
+                results[name] = self._train_model(name, path)
+            except Exception as e:
+                logger.exception("⚠️ Falló el reentrenamiento de %s", name)
+                results[name] = {'error': str(e)}
+        self.last_results = results
+        return results
+
+    def _train_model(self, name: str, path: str) -> dict:
+        after_id = int(self.store.get_meta(self._meta_key(name), 0))
+        until_id = self.store.last_labelled_id()
+        pending = self.store.count_labelled(after_id) - self.store.count_labelled(until_id)
+        source = self.served_path(path)
+        if pending < self.min_samples or not os.path.exists(source):
+            return {'trained': False, 'pending': pending}
+        holdout = self._holdout_dataset()
+        if holdout is None or not len(holdout):
+            # Sin validación no hay forma de saber si las muestras empeoran el modelo
+            return {'trained': False, 'pending': pending, 'error': 'sin conjunto de validación'}
+
+        tf = _tf()
+        started = time.perf_counter()
+        model = tf.keras.models.load_model(source, compile=False)
+        model.compile(optimizer=tf.keras.optimizers.Adam(self.learning_rate),
+                      loss='categorical_crossentropy', metrics=['accuracy'])
+        flat = len(model.input_shape) == 2
+        baseline = evaluate_accuracy(model, holdout, self.holdout_size, flat=flat)
+        replay = self._replay_dataset()
+        batches = labelled_batches(self.store, after_id, until_id, self.batch_size,
+                                   replay=replay, replay_ratio=self.replay_ratio, flat=flat)
+        n_replay = int(round(self.batch_size * self.replay_ratio)) if replay is not None and len(replay) else 0
+        steps = -(-pending // max(1, self.batch_size - n_replay))
+        history = incremental_train_stream(model, batches, steps_per_epoch=steps, epochs=self.epochs)
+        accuracy = evaluate_accuracy(model, holdout, self.holdout_size, flat=flat)
+
+        result = {
+            'trained': True,
+            'samples': pending,
+            'until_id': until_id,
+            'train_accuracy': round(float(history.history['accuracy'][-1]), 4),
+            'holdout_accuracy_before': round(baseline, 4),
+            'holdout_accuracy': round(accuracy, 4),
+            'published': accuracy >= baseline - self.max_regression,
+        }
+        if result['published']:
+            stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S')
+            checkpoint = os.path.join(self.checkpoint_dir, f'{name}-{stamp}-{until_id}.keras')
+            save_model(model, checkpoint)
+            publish_checkpoint(checkpoint, self.published_path(path))
+            result['checkpoint'] = checkpoint
+        self.store.set_meta(self._meta_key(name), until_id)
+        result['seconds'] = round(time.perf_counter() - started, 2)
+        if not result['published']:
+            logger.warning("⚠️ Reentrenamiento de %s descartado: exactitud en validación %.4f -> %.4f (%d muestras)",
+                           name, baseline, accuracy, pending)
+            return result
+        if self.on_checkpoint is not None:
+            self.on_checkpoint(name)
+        logger.info("✅ Modelo %s reentrenado con %d muestras nuevas en %ss (validación %.4f -> %.4f)",
+                    name, pending, result['seconds'], baseline, accuracy)
+        return result
+
+    def start(self):
+        """
+        Lanza el bucle en un hilo de fondo (una ronda cada `interval` segundos).
+        """
+        def loop():
+            while not self._stop.wait(self.interval):
+                self.run_once()
+
+        self._thread = threading.Thread(target=loop, name='fine-tuner', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self) -> dict:
+        return {
+            name: {
+                'last_trained_id': int(self.store.get_meta(self._meta_key(name), 0)),
+                'served_path': self.served_path(path),
+                'pending': self.store.count_labelled(int(self.store.get_meta(self._meta_key(name), 0))),
+                'last_run': self.last_results.get(name),
+            }
+            for name, path in self.models.items()
+        }
@@ -0,0 +1,329 @@
+# utils/user_store.py
+import os
+import json
+import time
+import sqlite3
+import secrets
+import threading
+from datetime import datetime, timezone
+from collections import OrderedDict
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin, SecureCookieSessionInterface
+from itsdangerous import BadSignature
+from werkzeug.datastructures import CallbackDict
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Método de hash de contraseñas de werkzeug, con su coste: 'scrypt:32768:8:1', 'pbkdf2:sha256:600000', ...
+DEFAULT_HASH_METHOD = 'scrypt'
+
+# Mismo formato que la cookie de sesión de Flask (JSON con etiquetas para bytes, fechas, ...)
+_session_serializer = TaggedJSONSerializer()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username      TEXT PRIMARY KEY,
+    password_hash TEXT NOT NULL,
+    created_at    TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    sid        TEXT PRIMARY KEY,
+    data       TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at);
+CREATE TABLE IF NOT EXISTS user_meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class UserStore:
+    """
+    Cuentas de usuario y sesiones de servidor sobre SQLite en modo WAL, compartidas por
+    todos los workers.
+
+    Cada alta es un único INSERT (la clave primaria resuelve las carreras entre procesos,
+    sin leer y reescribir un fichero entero). Los hashes de contraseña leídos se guardan
+    en un LRU en memoria; como las cuentas no se borran, una entrada cacheada solo puede
+    quedar desfasada por un rehash, y el hash anterior sigue validando la misma contraseña.
+    """
+
+    def __init__(self, db_path: str, hash_method: str = DEFAULT_HASH_METHOD, cache_size: int = 10000):
+        """
+        Params:
+        - hash_method: método de werkzeug con su coste; al cambiarlo, cada cuenta se
+          rehashea con el nuevo en su siguiente login correcto
+        - cache_size: hashes de contraseña que se guardan en memoria
+        """
+        self.db_path = db_path
+        self.hash_method = hash_method
+        # Prefijo que deja el método en el hash ('scrypt' -> 'scrypt:32768:8:1')
+        self._hash_prefix = generate_password_hash('', hash_method).split('$', 1)[0]
+        self.cache_size = int(cache_size)
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._connect().executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Devuelve la conexión del hilo actual (una por hilo y por proceso).
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    # ---------------- Usuarios ----------------
+    def _cache_put(self, username: str, password_hash: str):
+        if self.cache_size <= 0:
+            return
+        with self._cache_lock:
+            self._cache[username] = password_hash
+            self._cache.move_to_end(username)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _password_hash(self, username: str):
+        with self._cache_lock:
+            password_hash = self._cache.get(username)
+        if password_hash is not None:
+            return password_hash
+        row = self._connect().execute('SELECT password_hash FROM users WHERE username = ?', (username,)).fetchone()
+        if row is None:
+            return None
+        self._cache_put(username, row[0])
+        return row[0]
+
+    def exists(self, username: str) -> bool:
+        return self._password_hash(username) is not None
+
+    def create_user(self, username: str, password: str) -> bool:
+        """
+        Da de alta un usuario; devuelve False si ya existía.
+        """
+        password_hash = generate_password_hash(password, self.hash_method)
+        try:
+            self._connect().execute(
+                'INSERT INTO users (username, password_hash, created_at) VALUES (?, ?, ?)',
+                (username, password_hash, datetime.utcnow().isoformat()),
+            )
+        except sqlite3.IntegrityError:
+            return False
+        self._cache_put(username, password_hash)
+        return True
+
+    def verify(self, username: str, password: str) -> bool:
+        """
+        Comprueba la contraseña; si el hash se hizo con otro método/coste, lo actualiza.
+        """
+        password_hash = self._password_hash(username)
+        if password_hash is None or not check_password_hash(password_hash, password):
+            return False
+        if password_hash.split('$', 1)[0] != self._hash_prefix:
+            password_hash = generate_password_hash(password, self.hash_method)
+            self._connect().execute('UPDATE users SET password_hash = ? WHERE username = ?', (password_hash, username))
+            self._cache_put(username, password_hash)
+        return True
+
+    def count(self) -> int:
+        return self._connect().execute('SELECT COUNT(*) FROM users').fetchone()[0]
+
+    def migrate_from_json(self, json_path: str) -> int:
+        """
+        Importa una sola vez las cuentas del antiguo users.json de app/auth.py
+        ({usuario: hash de werkzeug}). Devuelve cuántas se añadieron.
+        """
+        conn = self._connect()
+        if conn.execute("SELECT 1 FROM user_meta WHERE key = 'users_json'").fetchone() or not os.path.exists(json_path):
+            return 0
+        with open(json_path, 'r', encoding='utf-8') as f:
+            users = json.load(f)
+        now = datetime.utcnow().isoformat()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            before = conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+            conn.executemany('INSERT OR IGNORE INTO users (username, password_hash, created_at) VALUES (?, ?, ?)',
+                             [(name, password_hash, now) for name, password_hash in users.items()])
+            added = conn.execute('SELECT COUNT(*) FROM users').fetchone()[0] - before
+            conn.execute("INSERT INTO user_meta (key, value) VALUES ('users_json', ?)", (now,))
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        return added
+
+    # ---------------- Sesiones ----------------
+    def load_session(self, sid: str):
+        row = self._connect().execute('SELECT data, expires_at FROM sessions WHERE sid = ?', (sid,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return _session_serializer.loads(row[0]), row[1]
+
+    def save_session(self, sid: str, data: dict, expires_at: float):
+        self._connect().execute(
+            'INSERT INTO sessions (sid, data, expires_at) VALUES (?, ?, ?) '
+            'ON CONFLICT (sid) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at',
+            (sid, _session_serializer.dumps(data), expires_at),
+        )
+
+    def delete_session(self, sid: str):
+        self._connect().execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+
+    def purge_sessions(self, require_key: str = None) -> int:
+        """
+        Borra las sesiones caducadas (y, con `require_key`, las que no tienen esa clave,
+        p. ej. las anónimas) y devuelve cuántas eran.
+        """
+        sql = 'DELETE FROM sessions WHERE expires_at < ?'
+        params = [time.time()]
+        if require_key is not None:
+            sql += ' OR json_extract(data, ?) IS NULL'
+            params.append(f'$.{require_key}')
+        return self._connect().execute(sql, params).rowcount
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """
+    Sesión de SqliteSessionInterface. `sid` es el id de su fila en la tabla `sessions`,
+    o None mientras es anónima y viaja en la cookie firmada.
+    """
+
+    def __init__(self, initial=None, sid=None, expires_at=None, new=False, signed_at=None):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.expires_at = expires_at
+        self.signed_at = signed_at
+        self.new = new
+        self.modified = False
+        self.previous_sid = None
+
+    def regenerate(self):
+        """
+        Cambia el id de la sesión conservando sus datos; la fila del id anterior se
+        borra al guardarla.
+        """
+        if self.previous_sid is None and self.sid is not None:
+            self.previous_sid = self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.modified = True
+
+
+def regenerate_session(app, session):
+    """
+    Da a la sesión un id nuevo cuando cambia la identidad del usuario (login, registro),
+    para que un id fijado de antemano por otro no quede autenticado (fijación de sesión).
+    La cookie firmada de Flask no lleva id: cambia entera con su contenido.
+    """
+    if isinstance(session, ServerSession):
+        session.regenerate()
+    elif hasattr(app.session_interface, 'regenerate'):
+        # flask-session >= 0.6
+        app.session_interface.regenerate(session)
+
+
+class SqliteSessionInterface(SessionInterface):
+    """
+    Sesiones de servidor en la tabla `sessions` de UserStore para los usuarios con
+    sesión iniciada: la cookie solo lleva un id aleatorio y los datos se comparten
+    entre workers.
+
+    Las sesiones anónimas (sin `auth_key`, p. ej. el uuid de historial de un visitante)
+    no crean fila: viajan en una cookie firmada, como la sesión por defecto de Flask,
+    así los bots y clientes sin cookies no llenan la tabla. Al iniciar sesión se crea
+    la fila con un id nuevo; al cerrarla se borra.
+
+    Solo se escribe si la sesión cambió, o para alargar la caducidad cuando ha pasado más
+    de la mitad de su vida; una sesión vacía no se guarda ni envía cookie (y si existía,
+    se borra). Tras `regenerate_session` se guarda con el id nuevo y se borra el anterior.
+    """
+
+    purge_every = 1000  # cada cuántas escrituras se borran las sesiones caducadas
+
+    def __init__(self, store: UserStore, auth_key: str = 'user'):
+        self.store = store
+        self.auth_key = auth_key
+        self._writes = 0
+        self._signer = SecureCookieSessionInterface()
+        # Caducadas y filas anónimas de versiones anteriores (ya no se guardan en el servidor)
+        self.store.purge_sessions(require_key=auth_key)
+
+    def open_session(self, app, request):
+        value = request.cookies.get(self.get_cookie_name(app))
+        if value and '.' in value:
+            # Cookie firmada (anónima); los ids de sesión de servidor no llevan '.'
+            serializer = self._signer.get_signing_serializer(app)
+            if serializer is not None:
+                lifetime = int(app.permanent_session_lifetime.total_seconds())
+                try:
+                    data, signed_at = serializer.loads(value, max_age=lifetime, return_timestamp=True)
+                    return ServerSession(data, signed_at=signed_at.timestamp())
+                except BadSignature:
+                    pass
+        elif value:
+            loaded = self.store.load_session(value)
+            if loaded is not None:
+                data, expires_at = loaded
+                return ServerSession(data, sid=value, expires_at=expires_at)
+        return ServerSession(new=True)
+
+    def _set_cookie(self, app, response, value, expires_at):
+        response.set_cookie(
+            self.get_cookie_name(app), value,
+            expires=datetime.fromtimestamp(expires_at, timezone.utc) if expires_at is not None else None,
+            httponly=self.get_cookie_httponly(app), domain=self.get_cookie_domain(app),
+            path=self.get_cookie_path(app), secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+    def save_session(self, app, session, response):
+        if session.previous_sid is not None:
+            self.store.delete_session(session.previous_sid)
+            session.previous_sid = None
+        if not session:
+            if session.sid is not None:
+                self.store.delete_session(session.sid)
+            if not session.new:
+                response.delete_cookie(self.get_cookie_name(app), domain=self.get_cookie_domain(app),
+                                       path=self.get_cookie_path(app))
+            return
+
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        now = time.time()
+        if self.auth_key not in session:
+            # Anónima: cookie firmada; si venía de una fila del servidor, la fila se borra
+            moved = session.sid is not None
+            if moved:
+                self.store.delete_session(session.sid)
+                session.sid = None
+            stale = session.signed_at is not None and now - session.signed_at > lifetime / 2
+            serializer = self._signer.get_signing_serializer(app)
+            if serializer is None or not (session.modified or moved or stale):
+                return
+            self._set_cookie(app, response, serializer.dumps(dict(session)),
+                             now + lifetime if session.permanent else None)
+            return
+
+        if session.sid is None:
+            # Primera petición con sesión iniciada: la fila se crea con un id nuevo
+            session.sid = secrets.token_urlsafe(32)
+            session.modified = True
+        stale = session.expires_at is not None and session.expires_at - now < lifetime / 2
+        if not (session.modified or session.expires_at is None or stale):
+            return
+        expires_at = now + lifetime
+        self.store.save_session(session.sid, dict(session), expires_at)
+        self._writes += 1
+        if self._writes % self.purge_every == 0:
+            self.store.purge_sessions()
+        self._set_cookie(app, response, session.sid, expires_at if session.permanent else None)